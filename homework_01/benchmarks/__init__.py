@@ -0,0 +1,3 @@
+"""
+Benchmarks for log_analyzer
+"""
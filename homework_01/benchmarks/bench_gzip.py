@@ -0,0 +1,83 @@
+"""
+Benchmark for gzip log ingestion
+
+Run from the homework_01 folder on a real log:
+    python -m benchmarks.bench_gzip --log /path/to/nginx-access-ui.log-20170630.gz
+or on a generated one:
+    python -m benchmarks.bench_gzip --lines 2000000
+"""
+
+import argparse
+import gzip
+import os
+import pathlib
+import tempfile
+import time
+from typing import Callable
+
+from benchmarks.generate_log import write_log
+from src.aggregation import LogAggregator
+from src.log_analyzer import ParseSettings, parse_lines, parse_logs
+from src.readers import find_gzip_pipe
+
+
+def legacy_parse_gzip(log_file: pathlib.Path) -> LogAggregator:
+    """
+    Text mode gzip reading line by line, kept as a baseline
+    :param log_file: Path to gzip log file
+    :return: Aggregate of the log
+    """
+    with gzip.open(log_file, mode="rt") as logfile_content:
+        return parse_lines(logfile_content, LogAggregator())
+
+
+def bench(name: str, func: Callable[[], LogAggregator], compressed_size: int) -> None:
+    """
+    Time single ingestion variant and print throughput
+    :param name: Variant name
+    :param func: Function parsing the log
+    :param compressed_size: Size of compressed log in bytes
+    :return: None
+    """
+    start = time.perf_counter()
+    aggregator = func()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<32} {elapsed:>8.2f} s {compressed_size / elapsed / 2**20:>8.1f} MB/s (compressed) "
+        f"{aggregator.lines_count / elapsed:>12,.0f} lines/sec"
+    )
+
+
+def main() -> None:
+    """
+    Run every gzip ingestion variant on the same log
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Gzip ingestion benchmark")
+    parser.add_argument("--log", type=pathlib.Path, default=None, help="Gzip log to use, generated if not set")
+    parser.add_argument("--lines", type=int, default=2_000_000, help="Number of lines of generated log")
+    parser.add_argument("--urls", type=int, default=10_000, help="Number of distinct URLs of generated log")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of generated log")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = args.log
+        if log_file is None:
+            log_file = pathlib.Path(tmp_dir) / "nginx-access-ui.log-20170630.gz"
+            write_log(log_file, args.lines, args.urls, seed=args.seed)
+        compressed_size = os.path.getsize(log_file)
+        print(f"log: {log_file}, {compressed_size / 2**20:.1f} MB compressed")
+
+        bench("gzip.open(mode='rt') (legacy)", lambda: legacy_parse_gzip(log_file), compressed_size)
+        bench("bulk zlib chunks", lambda: parse_logs(log_file), compressed_size)
+        for command in ("pigz", "zcat"):
+            if find_gzip_pipe(command):
+                bench(
+                    f"{command} pipe",
+                    lambda: parse_logs(log_file, settings=ParseSettings(gzip_pipe=command)),
+                    compressed_size,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Microbenchmark for log line parsers
+
+Run from the homework_01 folder:
+    python -m benchmarks.bench_parser --lines 200000
+"""
+
+import argparse
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+
+from src.aggregation import LogAggregator
+from src.log_analyzer import parse_byte_lines, parse_log_line, parse_log_record
+
+SAMPLE_LINES = [
+    '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" '
+    '"Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5" "-" "1498697422-2190034393-4708-9752759" '
+    '"dc7161be3" 0.390\n',
+    '1.99.174.176 3b81f63526fa8  - [29/Jun/2017:03:50:22 +0300] "GET /api/1/photogenic_banners/list/?server_name=WIN7RB4 '
+    'HTTP/1.1" 200 12 "-" "Python-urllib/2.7" "-" "1498697422-32900793-4708-9752770" "-" 0.133\n',
+    '1.169.137.128 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/v2/banner/16852664 HTTP/1.1" 200 19415 "-" '
+    '"Slotovod" "-" "1498697422-2118016444-4708-9752769" "712e90144abee9" 0.199\n',
+    '1.194.135.240 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/v2/group/7786679/statistic/sites/?date_type=day'
+    '&date_from=2017-06-28&date_to=2017-06-28 HTTP/1.1" 200 22 "-" "python-requests/2.13.0" "-" '
+    '"1498697422-3979856266-4708-9752772" "8a7741a54297568b" 0.067\n',
+]
+
+
+def legacy_parse_log_line(line: str = "") -> Tuple[str | None, float]:
+    """
+    Parser implementation before the precompiled matchers, kept as a baseline
+    :param line: Single line from log file
+    :return: Extracted URL and corresponded request time
+    """
+    re_result = re.search("(?:GET|POST|HEAD|OPTIONS|PUT)(.+?)HTTP", line)
+    url = None
+    if re_result:
+        url = re_result.group(1).strip()
+    request_time = float(re.findall(r"\d+\.\d+", line.split(" ")[-1].strip())[0])
+    return url, request_time
+
+
+def bench(parser: Callable, lines: List[str], repeat: int) -> float:
+    """
+    Run parser over all lines several times
+    :param parser: Parser function to measure
+    :param lines: Log lines to parse
+    :param repeat: Number of runs, the best one is reported
+    :return: Lines per second for the best run
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parser(line)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def bench_aggregation(lines: List[bytes], repeat: int, variants: Dict[str, Callable[[], LogAggregator]]) -> Dict:
+    """
+    Parse raw lines into aggregators of every variant, runs are interleaved
+    so that load changes on the machine affect all variants alike
+    :param lines: Log lines as bytes
+    :param repeat: Number of runs, the best one is reported
+    :param variants: Variant name to factory of an empty aggregator
+    :return: Variant name to lines per second for the best run
+    """
+    best = dict.fromkeys(variants, float("inf"))
+    for _ in range(repeat):
+        for name, new_aggregator in variants.items():
+            start = time.perf_counter()
+            parse_byte_lines(lines, new_aggregator())
+            best[name] = min(best[name], time.perf_counter() - start)
+    return {name: len(lines) / elapsed for name, elapsed in best.items()}
+
+
+def main() -> None:
+    """
+    Run benchmark for every parser variant and print lines/sec
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Log parser microbenchmark")
+    parser.add_argument("--lines", type=int, default=200_000, help="Number of lines per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per parser")
+    args = parser.parse_args()
+
+    lines = [SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(args.lines)]
+    variants = {
+        "legacy (re.search + split + re.findall)": legacy_parse_log_line,
+        "parse_log_record (full, precompiled)": parse_log_record,
+        "parse_log_line (url + request_time)": parse_log_line,
+    }
+    for name, func in variants.items():
+        print(f"{name:<45} {bench(func, lines, args.repeat):>12,.0f} lines/sec")
+
+    byte_lines = [line.rstrip("\n").encode() for line in lines]
+    aggregations = bench_aggregation(
+        byte_lines,
+        args.repeat,
+        {
+            "parse_byte_lines + aggregate": LogAggregator,
+            "parse_byte_lines + aggregate + histogram": lambda: LogAggregator(histogram=True),
+            "parse_byte_lines + aggregate + 5 min timeline": lambda: LogAggregator(time_bucket=5),
+        },
+    )
+    plain = aggregations["parse_byte_lines + aggregate"]
+    for name, lines_per_second in aggregations.items():
+        overhead = f"{100 * (plain / lines_per_second - 1):+.1f}%" if lines_per_second != plain else ""
+        print(f"{name:<45} {lines_per_second:>12,.0f} lines/sec {overhead}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+End-to-end benchmark of the report pipeline: parse_logs -> create_log_stats -> generate_report
+on a deterministic synthetic log. Results are saved as JSON to compare them between commits:
+
+Run from the homework_01 folder:
+    python -m benchmarks.bench_pipeline --lines 1000000 --output before.json
+    git checkout <other commit>
+    python -m benchmarks.bench_pipeline --lines 1000000 --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+from benchmarks.generate_log import write_log
+from src.log_analyzer import ParseSettings, create_log_stats, generate_report, parse_logs
+
+PHASES = ("parse", "stats", "render")
+
+
+def git_commit() -> str | None:
+    """
+    Commit the benchmark is run on
+    :return: Commit hash, None outside of git checkout
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def bench_pipeline(log_file: pathlib.Path, report_dir: pathlib.Path, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the pipeline several times and keep the best time of every phase
+    :param log_file: Log to parse
+    :param report_dir: Folder to write reports to
+    :param args: Command line arguments
+    :return: Best seconds per phase and lines counters of the last run
+    """
+    settings = ParseSettings(
+        relative_accuracy=args.relative_accuracy, histogram=bool(args.percentiles), pipeline=args.pipeline
+    )
+    best = dict.fromkeys(PHASES, float("inf"))
+    lines_read = lines_failed = urls = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        log_data = parse_logs(log_file, args.workers, settings)
+        best["parse"] = min(best["parse"], time.perf_counter() - start)
+
+        start = time.perf_counter()
+        log_stats = create_log_stats(log_data, args.report_size, args.percentiles)
+        best["stats"] = min(best["stats"], time.perf_counter() - start)
+
+        start = time.perf_counter()
+        generate_report(report_dir, "2017.06.30", log_stats, args.report_format)
+        best["render"] = min(best["render"], time.perf_counter() - start)
+
+        lines_read, lines_failed, urls = log_data.lines_count, log_data.failed_line_count, len(log_data)
+    return {
+        "phase_seconds": {phase: round(seconds, 6) for phase, seconds in best.items()},
+        "total_seconds": round(sum(best.values()), 6),
+        "lines_per_second": round(lines_read / best["parse"], 1),
+        "lines_read": lines_read,
+        "lines_failed": lines_failed,
+        "urls": urls,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """
+    Print per-phase change against baseline results
+    :param results: Results of this run
+    :param baseline: Results saved by a previous run
+    :param threshold: Relative slowdown reported as a regression
+    :return: True if no phase regressed
+    """
+    if baseline["params"] != results["params"]:
+        print("warning: baseline was measured with different parameters")
+    ok = True
+    for phase in (*PHASES, "total"):
+        before = baseline["total_seconds"] if phase == "total" else baseline["phase_seconds"][phase]
+        after = results["total_seconds"] if phase == "total" else results["phase_seconds"][phase]
+        change = after / before - 1 if before else 0.0
+        regressed = change > threshold
+        ok = ok and not regressed
+        mark = "  REGRESSION" if regressed else ""
+        print(f"{phase:<8} {before:>10.3f} s -> {after:>10.3f} s {100 * change:+7.1f}%{mark}")
+    return ok
+
+
+def main() -> None:
+    """
+    Generate log, run the pipeline, save and compare results
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Report pipeline benchmark")
+    parser.add_argument("--log", type=pathlib.Path, default=None, help="Log to use, generated if not set")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Number of lines of generated log")
+    parser.add_argument("--urls", type=int, default=10_000, help="Number of distinct URLs of generated log")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of URL popularity")
+    parser.add_argument("--malformed-rate", type=float, default=0.001, help="Share of malformed lines")
+    parser.add_argument("--gzip", action="store_true", help="Generate gzip compressed log")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of generated log")
+    parser.add_argument("--workers", type=int, default=1, help="Number of parse workers")
+    parser.add_argument("--pipeline", action="store_true", help="PARSE_PIPELINE: read and decompress in threads")
+    parser.add_argument("--relative-accuracy", type=float, default=None, help="MEDIAN_ACCURACY: approximate medians, exact if not set")
+    parser.add_argument("--percentiles", type=float, nargs="*", default=[], help="PERCENTILES")
+    parser.add_argument("--report-size", type=int, default=1000, help="REPORT_SIZE")
+    parser.add_argument("--report-format", default="rows", help="REPORT_FORMAT")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the best time of every phase is kept")
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="JSON file to save results to")
+    parser.add_argument("--compare", type=pathlib.Path, default=None, help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown treated as regression")
+    args = parser.parse_args()
+
+    params = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("log", "repeat", "output", "compare", "threshold")
+    }
+    params["log"] = str(args.log) if args.log else None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = args.log
+        if log_file is None:
+            log_file = pathlib.Path(tmp_dir) / f"nginx-access-ui.log-20170630{'.gz' if args.gzip else ''}"
+            write_log(log_file, args.lines, args.urls, args.skew, args.malformed_rate, args.seed)
+        results = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "params": params,
+            **bench_pipeline(log_file, pathlib.Path(tmp_dir) / "reports", args),
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n", encoding="UTF-8")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="UTF-8"))
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark for the stats phase (create_log_stats) on many distinct URLs
+
+Run from the homework_01 folder:
+    python -m benchmarks.bench_stats --urls 5000000
+"""
+
+import argparse
+import math
+import random
+import time
+from statistics import mean, median
+from typing import Dict, List
+
+from src.aggregation import LogAggregator
+from src.log_analyzer import create_log_stats
+
+
+def legacy_create_log_stats(log_data: Dict, report_size: int = 0) -> List[Dict]:
+    """
+    Stats implementation over dict of request time lists with full sort, kept as a baseline.
+    Only the URL sums (math.fsum) and the tie order follow the current ones, so that both select the same URLs
+    :param log_data: Dictionary of parsed data
+    :param report_size: The max number of requests to report about
+    :return: Dictionary with log statistics
+    """
+    url_count = []
+    total_time = 0
+    total_count = 0
+    for url, data in log_data.items():
+        url_count.append((url, math.fsum(data)))
+        total_time += sum(data)
+        total_count += len(data)
+    # URLs with the same total time are ordered by URL, as create_log_stats does
+    url_count = sorted(url_count, key=lambda x: (-x[1], x[0]))
+    log_stats = []
+    for url, time_sum in url_count[:report_size]:
+        url_data = sorted(log_data[url])
+        log_stats.append(
+            {
+                "count": len(url_data),
+                "time_avg": f"{mean(url_data):.3f}",
+                "time_max": f"{max(url_data):.3f}",
+                "time_sum": f"{time_sum:.3f}",
+                "url": url,
+                "time_med": f"{median(url_data):.3f}",
+                "time_perc": f"{100*time_sum / total_time:.3f}",
+                "count_perc": f"{100*len(url_data) / total_count:.3f}",
+            }
+        )
+    return log_stats
+
+
+def main() -> None:
+    """
+    Build synthetic per-URL data and time both stats implementations
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Stats phase benchmark")
+    parser.add_argument("--urls", type=int, default=5_000_000, help="Number of distinct URLs")
+    parser.add_argument("--report-size", type=int, default=1000, help="REPORT_SIZE")
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    legacy_data: Dict[str, List[float]] = {}
+    aggregator = LogAggregator()
+    for i in range(args.urls):
+        url = f"/api/v2/banner/{i}/?page={i % 7}"
+        times = [round(rnd.lognormvariate(-2, 1), 3) for _ in range(1 + i % 3)]
+        legacy_data[url] = times
+        for request_time in times:
+            aggregator.add(url, request_time)
+
+    start = time.perf_counter()
+    before = legacy_create_log_stats(legacy_data, args.report_size)
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    after = create_log_stats(aggregator, args.report_size)
+    elapsed = time.perf_counter() - start
+
+    assert [row["url"] for row in before] == [row["url"] for row in after]
+    print(f"urls: {args.urls:,}, report size: {args.report_size}")
+    print(f"before (sum lists + full sort) {legacy_elapsed:>8.3f} s")
+    print(f"after  (aggregator + top-K)    {elapsed:>8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
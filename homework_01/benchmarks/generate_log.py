@@ -0,0 +1,130 @@
+"""
+Deterministic synthetic nginx log in ui_short format
+
+Run from the homework_01 folder:
+    python -m benchmarks.generate_log /tmp/log/nginx-access-ui.log-20170630.gz --lines 1000000 --urls 50000
+"""
+
+import argparse
+import datetime
+import gzip
+import itertools
+import pathlib
+import random
+from typing import Iterator, List, TextIO
+
+LOG_LINE = (
+    '{remote_addr} -  - [{time_local}] "GET {url} HTTP/1.1" 200 {body_bytes_sent} "-" '
+    '"Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5" "-" "1498697422-2190034393-4708-9752759" '
+    '"dc7161be3" {request_time}\n'
+)
+URL_TEMPLATES = (
+    "/api/v2/banner/{id}",
+    "/api/v2/group/{id}/statistic/sites/?date_type=day&date_from=2017-06-28&date_to=2017-06-28",
+    "/api/1/photogenic_banners/list/?server_name=WIN7RB{id}",
+    "/api/v2/slot/{id}/groups",
+    "/export/appinstall_raw/2017-06-{id}/",
+)
+MALFORMED_LINES = (
+    '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] "0" 400 166 "-" "-" "-" "-" "-" 0.000\n',
+    '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/v2/banner/1 HTTP/1.1" 200 927 "-" "-" "-" "-" "-" -\n',
+    "truncated line without request time\n",
+)
+DAY_START = datetime.datetime(2017, 6, 29, tzinfo=datetime.timezone(datetime.timedelta(hours=3)))
+SECONDS_PER_DAY = 24 * 60 * 60
+BLOCK_SIZE = 10_000
+
+
+def zipf_weights(urls: int, skew: float) -> List[float]:
+    """
+    Cumulative weights of URL ranks, rank k is requested proportionally to 1 / k**skew
+    :param urls: Number of distinct URLs
+    :param skew: Zipf exponent, 0 for uniform distribution
+    :return: Cumulative weights for random.choices
+    """
+    return list(itertools.accumulate(1 / rank**skew for rank in range(1, urls + 1)))
+
+
+def generate_log_lines(
+    lines: int, urls: int = 10_000, skew: float = 1.1, malformed_rate: float = 0.0, seed: int = 42
+) -> Iterator[str]:
+    """
+    Generate log lines of a single day, the same arguments always give the same lines
+    :param lines: Number of lines
+    :param urls: Number of distinct URLs
+    :param skew: Zipf exponent of URL popularity
+    :param malformed_rate: Share of lines the parser cannot match
+    :param seed: Random seed
+    :return: Iterator over lines with line separators
+    """
+    rnd = random.Random(seed)
+    cum_weights = zipf_weights(urls, skew)
+    # the slowest URLs are not necessarily the most popular ones
+    url_speed = [rnd.uniform(-3.5, -0.5) for _ in range(urls)]
+    last_second = -1
+    time_local = ""
+    for start in range(0, lines, BLOCK_SIZE):
+        count = min(BLOCK_SIZE, lines - start)
+        for i, rank in enumerate(rnd.choices(range(urls), cum_weights=cum_weights, k=count), start):
+            if malformed_rate and rnd.random() < malformed_rate:
+                yield MALFORMED_LINES[i % len(MALFORMED_LINES)]
+                continue
+            second = i * SECONDS_PER_DAY // lines
+            if second != last_second:
+                last_second = second
+                time_local = (DAY_START + datetime.timedelta(seconds=second)).strftime("%d/%b/%Y:%H:%M:%S %z")
+            yield LOG_LINE.format(
+                remote_addr=f"1.{rank % 200}.{i % 250}.{rnd.randrange(256)}",
+                time_local=time_local,
+                url=URL_TEMPLATES[rank % len(URL_TEMPLATES)].format(id=rank),
+                body_bytes_sent=rnd.randrange(100, 30000),
+                request_time=f"{rnd.lognormvariate(url_speed[rank], 1):.3f}",
+            )
+
+
+def write_log(
+    log_file: pathlib.Path,
+    lines: int,
+    urls: int = 10_000,
+    skew: float = 1.1,
+    malformed_rate: float = 0.0,
+    seed: int = 42,
+) -> None:
+    """
+    Write synthetic log, gzip compressed if the file name ends with .gz
+    :param log_file: Path to write the log to
+    :param lines: Number of lines
+    :param urls: Number of distinct URLs
+    :param skew: Zipf exponent of URL popularity
+    :param malformed_rate: Share of lines the parser cannot match
+    :param seed: Random seed
+    :return: None
+    """
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    file: TextIO
+    if log_file.suffix == ".gz":
+        file = gzip.open(log_file, "wt", compresslevel=6, encoding="UTF-8")  # pylint: disable=consider-using-with
+    else:
+        file = open(log_file, "w", encoding="UTF-8")  # pylint: disable=consider-using-with
+    with file:
+        file.writelines(generate_log_lines(lines, urls, skew, malformed_rate, seed))
+
+
+def main() -> None:
+    """
+    Write synthetic log with parameters from command line
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Synthetic ui_short log generator")
+    parser.add_argument("log_file", type=pathlib.Path, help="Path to write the log to, .gz for gzip output")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Number of lines")
+    parser.add_argument("--urls", type=int, default=10_000, help="Number of distinct URLs")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of URL popularity, 0 for uniform")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of malformed lines")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+    write_log(args.log_file, args.lines, args.urls, args.skew, args.malformed_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
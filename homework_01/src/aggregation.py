@@ -0,0 +1,838 @@
+"""
+Streaming aggregation of request times per URL
+"""
+
+import heapq
+import itertools
+import math
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack
+from statistics import mean, median
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple, TypeAlias
+
+from .errors import ParseErrors
+
+# URLs are kept as raw bytes from the log, str keys are supported for convenience
+Url: TypeAlias = bytes | str
+
+# binary format of a serialized aggregate: header, flags (since version 2), time bucket (since version 3),
+# URL settings size and URL settings (since version 4), then
+# URL header + URL + median state (+ latency histogram) (+ timeline size and timeline) for every URL
+AGGREGATE_MAGIC = b"LAGG"
+AGGREGATE_VERSION = 4
+AGGREGATE_HEADER = struct.Struct("<4sBdQQQdQ")
+AGGREGATE_FLAGS = struct.Struct("<B")
+AGGREGATE_TIME_BUCKET = struct.Struct("<H")
+AGGREGATE_URL_SETTINGS = struct.Struct("<I")
+FLAG_HISTOGRAM = 1
+URL_HEADER = struct.Struct("<IQddQI")
+TIMELINE_HEADER = struct.Struct("<I")
+
+# latency histogram: the first bucket counts times up to HISTOGRAM_MIN, then HISTOGRAM_STEPS buckets
+# per doubling up to HISTOGRAM_MIN * 2**HISTOGRAM_DOUBLINGS, the last bucket counts everything slower
+HISTOGRAM_MIN = 0.001
+HISTOGRAM_STEPS = 4
+HISTOGRAM_DOUBLINGS = 17
+HISTOGRAM_BOUNDS = tuple(
+    HISTOGRAM_MIN * 2 ** (i / HISTOGRAM_STEPS) for i in range(HISTOGRAM_STEPS * HISTOGRAM_DOUBLINGS + 1)
+)
+HISTOGRAM_SIZE = len(HISTOGRAM_BOUNDS) + 1
+
+# fsum(times) / count is within two ulps of statistics.mean(times): only averages that close
+# to a rounding tie are rounded from the exact mean
+MEAN_TIE_TOLERANCE = 2.0**-48
+
+# estimated memory of aggregates, measured with tracemalloc on CPython 3.11: a URL (key, table entry, UrlStats)
+# and every request on top of it. Sketch and timeline requests are upper bounds, they stop growing
+# once every sketch bucket or time bucket of the URL is taken
+URL_BYTES = 350
+EXACT_REQUEST_BYTES = 34
+SKETCH_URL_BYTES = 300
+SKETCH_REQUEST_BYTES = 43
+HISTOGRAM_BYTES = 8 * HISTOGRAM_SIZE + 60
+TIMELINE_REQUEST_BYTES = 140
+SPILL_RUN_BUFFER = 1024 * 1024
+
+
+def dump_array(file: BinaryIO, values: array) -> None:
+    """
+    Write array in little-endian byte order
+    :param file: File opened for binary writing
+    :param values: Array to write
+    :return: None
+    """
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    file.write(values.tobytes())
+
+
+def load_array(file: BinaryIO, typecode: str, size: int) -> array:
+    """
+    Read array written by dump_array
+    :param file: File opened for binary reading
+    :param typecode: Array type code
+    :param size: Number of items
+    :return: Array
+    """
+    values = array(typecode)
+    values.frombytes(file.read(size * values.itemsize))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def decode_url(url: Url) -> str:
+    """
+    URL as text for reports
+    :param url: URL bytes from the log or str
+    :return: URL with invalid UTF-8 sequences replaced
+    """
+    return url.decode("UTF-8", "replace") if isinstance(url, bytes) else url
+
+
+def encode_url(url: Url) -> bytes:
+    """
+    URL as bytes, the order of URLs in reports and spilled runs
+    :param url: URL bytes from the log or str
+    :return: URL bytes
+    """
+    return url if isinstance(url, bytes) else url.encode("UTF-8")
+
+
+def _url_order(item: Tuple[Url, Any]) -> bytes:
+    """
+    Sort key of spilled URL stats: URLs are read back from runs as bytes
+    :param item: URL and its stats
+    :return: URL bytes
+    """
+    return encode_url(item[0])
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy guarantee (DDSketch style).
+    Values are counted in logarithmic buckets, so any quantile is reported with relative
+    error not greater than `relative_accuracy`, and memory depends only on the value range.
+    """
+
+    __slots__ = ("relative_accuracy", "gamma", "_multiplier", "buckets", "zero_count", "count")
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"Relative accuracy must be in (0, 1), got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        """
+        Add value to the sketch
+        :param value: Non-negative value
+        :return: None
+        """
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) * self._multiplier)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def update(self, values: Iterable[float]) -> None:
+        """
+        Add many values to the sketch. Request times are logged with millisecond precision and repeat a lot,
+        so the bucket of every distinct value is computed once
+        :param values: Non-negative values
+        :return: None
+        """
+        buckets = self.buckets
+        for value, count in Counter(values).items():
+            self.count += count
+            if value <= 0:
+                self.zero_count += count
+                continue
+            key = math.ceil(math.log(value) * self._multiplier)
+            buckets[key] = buckets.get(key, 0) + count
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """
+        Merge another sketch with the same accuracy into this one
+        :param other: Sketch to merge
+        :return: None
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate quantile of added values
+        :param q: Quantile in [0, 1]
+        :return: Estimated value, 0 for an empty sketch
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma**key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize sketch to JSON compatible dictionary
+        :return: Dictionary with sketch state
+        """
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "buckets": [[key, count] for key, count in self.buckets.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        """
+        Restore sketch serialized with to_dict
+        :param data: Dictionary with sketch state
+        :return: Sketch
+        """
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {key: count for key, count in data["buckets"]}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+
+def new_histogram() -> List[int]:
+    """
+    Create empty latency histogram. A list is as compact as array("Q") while counters are small
+    (small ints are shared objects) and is incremented about twice as fast, which matters per log line
+    :return: List of HISTOGRAM_SIZE zero counters
+    """
+    return [0] * HISTOGRAM_SIZE
+
+
+def histogram_quantile(histogram: List[int], q: float, time_max: float) -> float:
+    """
+    Estimate quantile from latency histogram: geometric middle of the bucket holding the quantile
+    :param histogram: Bucket counters
+    :param q: Quantile in [0, 1]
+    :param time_max: Max request time, the estimate never exceeds it
+    :return: Estimated value, 0 for an empty histogram
+    """
+    rank = q * (sum(histogram) - 1)
+    if rank < 0:
+        return 0.0
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if rank < seen:
+            break
+    if bucket == 0:
+        estimate = HISTOGRAM_MIN / 2
+    elif bucket == len(HISTOGRAM_BOUNDS):
+        estimate = time_max
+    else:
+        estimate = math.sqrt(HISTOGRAM_BOUNDS[bucket - 1] * HISTOGRAM_BOUNDS[bucket])
+    return min(estimate, time_max)
+
+
+class UrlStats:
+    """
+    Aggregated request times for a single URL: exact count, sum and max,
+    plus either every request time (exact median) or a quantile sketch,
+    and optionally a fixed latency histogram for percentiles and
+    a timeline: [count, time_sum] per time bucket of the day, only buckets with requests are kept
+    """
+
+    __slots__ = ("count", "_time_sum", "time_max", "times", "sketch", "histogram", "timeline")
+
+    def __init__(self, relative_accuracy: float | None = None, histogram: bool = False, timeline: bool = False):
+        self.count = 0
+        # running sum, used only with a sketch: kept request times are summed up on demand
+        self._time_sum = 0.0
+        self.time_max = 0.0
+        self.times: List[float] | None = [] if relative_accuracy is None else None
+        self.sketch: QuantileSketch | None = None if relative_accuracy is None else QuantileSketch(relative_accuracy)
+        self.histogram: List[int] | None = new_histogram() if histogram else None
+        self.timeline: Dict[int, List[Any]] | None = {} if timeline else None
+
+    def add(self, request_time: float, time_bucket: int | None = None) -> None:
+        """
+        Add single request time
+        :param request_time: Request time
+        :param time_bucket: Time bucket of the request, accounted only when timeline is collected
+        :return: None
+        """
+        self.count += 1
+        if request_time > self.time_max:
+            self.time_max = request_time
+        if self.times is not None:
+            self.times.append(request_time)
+        else:
+            self._time_sum += request_time
+            self.sketch.add(request_time)  # type: ignore[union-attr]
+        if self.histogram is not None:
+            self.histogram[bisect_left(HISTOGRAM_BOUNDS, request_time)] += 1
+        if self.timeline is not None and time_bucket is not None:
+            bucket = self.timeline.get(time_bucket)
+            if bucket is None:
+                self.timeline[time_bucket] = [1, request_time]
+            else:
+                bucket[0] += 1
+                bucket[1] += request_time
+
+    def merge(self, other: "UrlStats") -> None:
+        """
+        Merge stats of the same URL from another part of the log
+        :param other: Stats to merge
+        :return: None
+        """
+        self.count += other.count
+        self._time_sum += other._time_sum
+        self.time_max = max(self.time_max, other.time_max)
+        if self.times is not None and other.times is not None:
+            self.times.extend(other.times)
+        elif self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        else:
+            raise ValueError("Cannot merge exact and approximate URL stats")
+        if self.histogram is not None and other.histogram is not None:
+            for bucket, count in enumerate(other.histogram):
+                if count:
+                    self.histogram[bucket] += count
+        elif self.histogram is not None or other.histogram is not None:
+            raise ValueError("Cannot merge URL stats with and without histogram")
+        if self.timeline is not None and other.timeline is not None:
+            for time_bucket, (count, time_sum) in other.timeline.items():
+                totals = self.timeline.get(time_bucket)
+                if totals is None:
+                    self.timeline[time_bucket] = [count, time_sum]
+                else:
+                    totals[0] += count
+                    totals[1] += time_sum
+        elif self.timeline is not None or other.timeline is not None:
+            raise ValueError("Cannot merge URL stats with and without timeline")
+
+    def to_sketch(self, relative_accuracy: float) -> "UrlStats":
+        """
+        The same stats with request times replaced by a quantile sketch, memory is bounded again.
+        Histogram and timeline are shared with these stats
+        :param relative_accuracy: Relative accuracy of the sketch
+        :return: Stats with a sketch, these stats if they already have one
+        """
+        if self.times is None:
+            return self
+        stats = UrlStats(relative_accuracy)
+        stats.count = self.count
+        stats._time_sum = self.time_sum
+        stats.time_max = self.time_max
+        stats.sketch.update(self.times)  # type: ignore[union-attr]
+        stats.histogram = self.histogram
+        stats.timeline = self.timeline
+        return stats
+
+    def to_list(self) -> List[Any]:
+        """
+        Serialize stats to JSON compatible list
+        :return: [count, time_sum, time_max, request times or sketch(, histogram or None(, timeline))]
+        """
+        median_state = self.times if self.times is not None else self.sketch.to_dict()  # type: ignore[union-attr]
+        data = [self.count, self.time_sum, self.time_max, median_state]
+        if self.timeline is not None:
+            timeline = [[time_bucket, count, time_sum] for time_bucket, (count, time_sum) in self.timeline.items()]
+            data.extend([self.histogram, timeline])
+        elif self.histogram is not None:
+            data.append(self.histogram)
+        return data
+
+    @classmethod
+    def from_list(cls, data: List[Any]) -> "UrlStats":
+        """
+        Restore stats serialized with to_list
+        :param data: Serialized stats
+        :return: URL stats
+        """
+        stats = cls()
+        stats.count, stats.time_sum, stats.time_max, median_state = data[:4]
+        if len(data) > 4:
+            stats.histogram = data[4]
+        if len(data) > 5:
+            stats.timeline = {time_bucket: [count, time_sum] for time_bucket, count, time_sum in data[5]}
+        if isinstance(median_state, dict):
+            stats.times = None
+            stats.sketch = QuantileSketch.from_dict(median_state)
+        else:
+            stats.times = median_state
+        return stats
+
+    @property
+    def time_sum(self) -> float:
+        """
+        Total request time. With kept request times it is their correctly rounded sum (math.fsum): it does not
+        depend on how the log was split between workers and the order the parts were merged in
+        """
+        if self.times is not None:
+            return math.fsum(self.times)
+        return self._time_sum
+
+    @time_sum.setter
+    def time_sum(self, value: float) -> None:
+        self._time_sum = value
+
+    @property
+    def time_avg(self) -> float:
+        """
+        Average request time, exact (statistics.mean) with kept request times
+        """
+        if self.times is not None:
+            return mean(self.times) if self.times else 0.0
+        return self.time_sum / self.count if self.count else 0.0
+
+    def round_time_avg(self, ndigits: int = 3) -> float:
+        """
+        Round average request time the same as round(time_avg, ndigits), the exact mean is only computed
+        for averages close to a rounding tie: statistics.mean is about 20 times slower than math.fsum
+        :param ndigits: Number of decimal digits
+        :return: Rounded average
+        """
+        if not self.times:
+            return round(self.time_avg, ndigits)
+        time_avg = self.time_sum / len(self.times)
+        scaled = time_avg * 10**ndigits
+        if abs(scaled - math.floor(scaled) - 0.5) > scaled * MEAN_TIE_TOLERANCE:
+            return round(time_avg, ndigits)
+        return round(self.time_avg, ndigits)
+
+    @property
+    def time_med(self) -> float:
+        """
+        Median request time, exact or estimated by the sketch
+        """
+        if self.times is not None:
+            return median(self.times) if self.times else 0.0
+        return self.sketch.quantile(0.5)  # type: ignore[union-attr]
+
+    def time_quantile(self, q: float) -> float:
+        """
+        Request time quantile estimated by the latency histogram
+        :param q: Quantile in [0, 1]
+        :return: Estimated value
+        """
+        if self.histogram is None:
+            raise ValueError("Latency histogram is not collected")
+        return histogram_quantile(self.histogram, q, self.time_max)
+
+
+class LogAggregator:
+    """
+    Per-URL aggregate of a log together with parse counters.
+    With `relative_accuracy` set to None medians are exact and every request time is kept,
+    otherwise memory per URL is bounded by the quantile sketch size.
+    With `histogram` set every URL also counts request times in a fixed latency histogram.
+    With `time_bucket` (minutes) set every URL also keeps a timeline of requests over the day.
+    `url_settings` identifies how URLs were taken from the log (LOG_FORMAT and URL normalization),
+    empty for raw URLs of ui_short lines.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float | None = None,
+        histogram: bool = False,
+        time_bucket: int = 0,
+        url_settings: str = "",
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.histogram = histogram
+        self.time_bucket = time_bucket
+        self.url_settings = url_settings
+        self.urls: Dict[Url, UrlStats] = {}
+        self.lines_count = 0
+        self.failed_line_count = 0
+        self.total_count = 0
+        self.total_time = 0.0
+        # not serialized: failed lines are reported once by the run that parsed them
+        self.errors = ParseErrors()
+        # estimated size of URL stats in bytes to spill them to disk at, 0 for no limit
+        self.memory_limit = 0
+        self.spill_dir: str | None = None
+        self.spilled: SpilledRuns | None = None
+        self.spilled_count = 0
+        self._url_bytes = URL_BYTES + (SKETCH_URL_BYTES if relative_accuracy is not None else 0)
+        self._url_bytes += HISTOGRAM_BYTES if histogram else 0
+        self._request_bytes = EXACT_REQUEST_BYTES if relative_accuracy is None else SKETCH_REQUEST_BYTES
+        self._request_bytes += TIMELINE_REQUEST_BYTES if time_bucket else 0
+
+    def __len__(self) -> int:
+        if self.spilled is None:
+            return len(self.urls)
+        return sum(1 for _ in self.items())
+
+    def __bool__(self) -> bool:
+        return bool(self.urls) or self.spilled is not None
+
+    def estimated_size(self) -> int:
+        """
+        Estimate memory taken by URL stats kept in memory, in O(1)
+        :return: Size in bytes
+        """
+        return len(self.urls) * self._url_bytes + (self.total_count - self.spilled_count) * self._request_bytes
+
+    def check_memory(self) -> None:
+        """
+        Spill URL stats to disk if their estimated size exceeds memory_limit. Called between blocks of lines,
+        not per request
+        :return: None
+        """
+        if self.memory_limit and self.urls and self.estimated_size() > self.memory_limit:
+            self.spill()
+
+    def spill(self) -> None:
+        """
+        Write URL stats kept in memory to a sorted run on disk and forget them
+        :return: None
+        """
+        if self.spilled is None:
+            self.spilled = SpilledRuns(self.spill_dir)
+        run = LogAggregator(self.relative_accuracy, self.histogram, self.time_bucket)
+        run.urls = dict(sorted(self.urls.items(), key=_url_order))
+        self.spilled.write(run)
+        self.urls = {}
+        self.spilled_count = self.total_count
+
+    def add(self, url: Url, request_time: float, time_bucket: int | None = None) -> None:
+        """
+        Add request time of the URL
+        :param url: Requested URL
+        :param request_time: Request time
+        :param time_bucket: Number of `time_bucket` minutes interval of the day the request was made in
+        :return: None
+        """
+        stats = self.urls.get(url)
+        if stats is None:
+            stats = self.urls[url] = UrlStats(self.relative_accuracy, self.histogram, self.time_bucket > 0)
+        stats.add(request_time, time_bucket)
+        self.total_count += 1
+        self.total_time += request_time
+
+    def same_settings(self, other: "LogAggregator") -> bool:
+        """
+        Check aggregates are built with the same median, histogram, timeline and URL settings and can be merged
+        :param other: Another aggregate
+        :return: True if settings are the same
+        """
+        return (
+            self.relative_accuracy == other.relative_accuracy
+            and self.histogram == other.histogram
+            and self.time_bucket == other.time_bucket
+            and self.url_settings == other.url_settings
+        )
+
+    def merge(self, other: "LogAggregator") -> None:
+        """
+        Merge aggregate of another part of the log. Parts must be merged in the order
+        of the log to keep URL order the same as in a single-process run
+        :param other: Aggregate to merge
+        :return: None
+        """
+        for url, other_stats in other.items():
+            stats = self.urls.get(url)
+            if stats is None:
+                self.urls[url] = other_stats
+            else:
+                stats.merge(other_stats)
+        self.lines_count += other.lines_count
+        self.failed_line_count += other.failed_line_count
+        self.total_count += other.total_count
+        self.total_time += other.total_time
+        self.errors.merge(other.errors)
+        self.check_memory()
+
+    def to_sketch(self, relative_accuracy: float) -> "LogAggregator":
+        """
+        The same aggregate with request times of every URL replaced by a quantile sketch: count, sum and max
+        stay exact, medians become approximate
+        :param relative_accuracy: Relative accuracy of the sketches
+        :return: Aggregate with sketches, this aggregate if medians are already approximate
+        """
+        if self.relative_accuracy is not None:
+            return self
+        aggregator = LogAggregator(relative_accuracy, self.histogram, self.time_bucket, self.url_settings)
+        aggregator.urls = {url: stats.to_sketch(relative_accuracy) for url, stats in self.items()}
+        aggregator.lines_count = self.lines_count
+        aggregator.failed_line_count = self.failed_line_count
+        aggregator.total_count = self.total_count
+        aggregator.total_time = self.total_time
+        return aggregator
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize aggregate to JSON compatible dictionary
+        :return: Dictionary with aggregate state
+        """
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "histogram": self.histogram,
+            "time_bucket": self.time_bucket,
+            "url_settings": self.url_settings,
+            "lines_count": self.lines_count,
+            "failed_line_count": self.failed_line_count,
+            "total_count": self.total_count,
+            "total_time": self.total_time,
+            "urls": {
+                url.decode("UTF-8", "surrogateescape") if isinstance(url, bytes) else url: stats.to_list()
+                for url, stats in self.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LogAggregator":
+        """
+        Restore aggregate serialized with to_dict
+        :param data: Dictionary with aggregate state
+        :return: Aggregate keyed by URL bytes
+        """
+        aggregator = cls(
+            data["relative_accuracy"],
+            data.get("histogram", False),
+            data.get("time_bucket", 0),
+            data.get("url_settings", ""),
+        )
+        aggregator.lines_count = data["lines_count"]
+        aggregator.failed_line_count = data["failed_line_count"]
+        aggregator.total_count = data["total_count"]
+        aggregator.total_time = data["total_time"]
+        aggregator.urls = {
+            url.encode("UTF-8", "surrogateescape"): UrlStats.from_list(stats) for url, stats in data["urls"].items()
+        }
+        return aggregator
+
+    def items(self) -> Iterator[Tuple[Url, UrlStats]]:
+        """
+        Iterate over URLs and their stats. Once stats are spilled, they are merged from disk runs and memory
+        in URL order, only one URL at a time is loaded
+        :return: Iterator of (url, stats)
+        """
+        if self.spilled is None:
+            return iter(self.urls.items())
+        return self.spilled.merge(sorted(self.urls.items(), key=_url_order))
+
+    def dump(self, file: BinaryIO) -> None:
+        """
+        Write aggregate in compact binary format. Spilled aggregates are merged twice: to count URLs and to write them
+        :param file: File opened for binary writing
+        :return: None
+        """
+        file.write(
+            AGGREGATE_HEADER.pack(
+                AGGREGATE_MAGIC,
+                AGGREGATE_VERSION,
+                self.relative_accuracy or 0.0,
+                self.lines_count,
+                self.failed_line_count,
+                self.total_count,
+                self.total_time,
+                len(self),
+            )
+        )
+        file.write(AGGREGATE_FLAGS.pack(FLAG_HISTOGRAM if self.histogram else 0))
+        file.write(AGGREGATE_TIME_BUCKET.pack(self.time_bucket))
+        url_settings = self.url_settings.encode()
+        file.write(AGGREGATE_URL_SETTINGS.pack(len(url_settings)) + url_settings)
+        for url, stats in self.items():
+            encoded_url = url if isinstance(url, bytes) else url.encode("UTF-8")
+            if stats.times is not None:
+                file.write(
+                    URL_HEADER.pack(len(encoded_url), stats.count, stats.time_sum, stats.time_max, 0, len(stats.times))
+                )
+                file.write(encoded_url)
+                dump_array(file, array("d", stats.times))
+            else:
+                sketch: QuantileSketch = stats.sketch  # type: ignore[assignment]
+                file.write(
+                    URL_HEADER.pack(
+                        len(encoded_url),
+                        stats.count,
+                        stats.time_sum,
+                        stats.time_max,
+                        sketch.zero_count,
+                        len(sketch.buckets),
+                    )
+                )
+                file.write(encoded_url)
+                dump_array(file, array("q", sketch.buckets.keys()))
+                dump_array(file, array("Q", sketch.buckets.values()))
+            if stats.histogram is not None:
+                dump_array(file, array("Q", stats.histogram))
+            if stats.timeline is not None:
+                file.write(TIMELINE_HEADER.pack(len(stats.timeline)))
+                dump_array(file, array("H", stats.timeline.keys()))
+                dump_array(file, array("Q", (count for count, _ in stats.timeline.values())))
+                dump_array(file, array("d", (time_sum for _, time_sum in stats.timeline.values())))
+
+    @classmethod
+    def load(cls, file: BinaryIO) -> "LogAggregator":
+        """
+        Read aggregate written by dump
+        :param file: File opened for binary reading
+        :return: Aggregate keyed by URL bytes
+        """
+        aggregator, urls = cls.load_stream(file)
+        aggregator.urls = dict(urls)
+        return aggregator
+
+    @classmethod
+    def load_stream(cls, file: BinaryIO) -> Tuple["LogAggregator", Iterator[Tuple[bytes, UrlStats]]]:
+        """
+        Read header of aggregate written by dump, URL stats are read lazily
+        :param file: File opened for binary reading
+        :return: Aggregate with counters but without URLs, iterator over URLs and their stats in dump order
+        """
+        header = file.read(AGGREGATE_HEADER.size)
+        if len(header) != AGGREGATE_HEADER.size:
+            raise ValueError("Truncated aggregate header")
+        magic, version, relative_accuracy, lines_count, failed_line_count, total_count, total_time, url_count = (
+            AGGREGATE_HEADER.unpack(header)
+        )
+        if magic != AGGREGATE_MAGIC or not 1 <= version <= AGGREGATE_VERSION:
+            raise ValueError("Unknown aggregate format")
+        flags = 0
+        if version >= 2:
+            flags_data = file.read(AGGREGATE_FLAGS.size)
+            if len(flags_data) != AGGREGATE_FLAGS.size:
+                raise ValueError("Truncated aggregate header")
+            (flags,) = AGGREGATE_FLAGS.unpack(flags_data)
+        time_bucket = 0
+        if version >= 3:
+            time_bucket_data = file.read(AGGREGATE_TIME_BUCKET.size)
+            if len(time_bucket_data) != AGGREGATE_TIME_BUCKET.size:
+                raise ValueError("Truncated aggregate header")
+            (time_bucket,) = AGGREGATE_TIME_BUCKET.unpack(time_bucket_data)
+        url_settings = ""
+        if version >= 4:
+            size_data = file.read(AGGREGATE_URL_SETTINGS.size)
+            if len(size_data) != AGGREGATE_URL_SETTINGS.size:
+                raise ValueError("Truncated aggregate header")
+            (size,) = AGGREGATE_URL_SETTINGS.unpack(size_data)
+            url_settings_data = file.read(size)
+            if len(url_settings_data) != size:
+                raise ValueError("Truncated aggregate header")
+            url_settings = url_settings_data.decode()
+        aggregator = cls(relative_accuracy or None, bool(flags & FLAG_HISTOGRAM), time_bucket, url_settings)
+        aggregator.lines_count = lines_count
+        aggregator.failed_line_count = failed_line_count
+        aggregator.total_count = total_count
+        aggregator.total_time = total_time
+        return aggregator, aggregator._load_urls(file, url_count)
+
+    def _load_urls(self, file: BinaryIO, url_count: int) -> Iterator[Tuple[bytes, UrlStats]]:
+        """
+        Read URL stats written by dump
+        :param file: File opened for binary reading, positioned after the header
+        :param url_count: Number of URLs in the file
+        :return: Iterator over URLs and their stats
+        """
+        for _ in range(url_count):
+            url_header = file.read(URL_HEADER.size)
+            if len(url_header) != URL_HEADER.size:
+                raise ValueError("Truncated aggregate")
+            url_size, count, time_sum, time_max, zero_count, size = URL_HEADER.unpack(url_header)
+            url = file.read(url_size)
+            stats = UrlStats()
+            stats.count, stats.time_sum, stats.time_max = count, time_sum, time_max
+            if self.relative_accuracy is None:
+                stats.times = load_array(file, "d", size).tolist()
+            else:
+                sketch = QuantileSketch(self.relative_accuracy)
+                keys = load_array(file, "q", size)
+                counts = load_array(file, "Q", size)
+                sketch.buckets = dict(zip(keys, counts))
+                sketch.zero_count = zero_count
+                sketch.count = count
+                stats.times = None
+                stats.sketch = sketch
+            if self.histogram:
+                stats.histogram = load_array(file, "Q", HISTOGRAM_SIZE).tolist()
+            if self.time_bucket:
+                timeline_header = file.read(TIMELINE_HEADER.size)
+                if len(timeline_header) != TIMELINE_HEADER.size:
+                    raise ValueError("Truncated aggregate")
+                (size,) = TIMELINE_HEADER.unpack(timeline_header)
+                time_buckets = load_array(file, "H", size)
+                counts = load_array(file, "Q", size)
+                time_sums = load_array(file, "d", size)
+                stats.timeline = {
+                    time_bucket: [count, time_sum]
+                    for time_bucket, count, time_sum in zip(time_buckets, counts, time_sums)
+                }
+            yield url, stats
+
+
+class SpilledRuns:
+    """
+    URL stats spilled to disk: every run is an aggregate dump sorted by URL, runs are merged like in external sort.
+    The folder is removed with the object
+    """
+
+    def __init__(self, spill_dir: str | None = None):
+        self.path = tempfile.mkdtemp(prefix="log-analyzer-spill-", dir=spill_dir)
+        self.runs: List[str] = []
+        self.bytes_written = 0
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+
+    def write(self, run: "LogAggregator") -> None:
+        """
+        Write a run
+        :param run: Aggregate with URLs in sorted order
+        :return: None
+        """
+        run_file = os.path.join(self.path, f"run-{len(self.runs):05d}.agg")
+        with open(run_file, "wb", buffering=SPILL_RUN_BUFFER) as file:
+            run.dump(file)
+            self.bytes_written += file.tell()
+        self.runs.append(run_file)
+
+    def merge(self, in_memory: List[Tuple[Url, UrlStats]]) -> Iterator[Tuple[Url, UrlStats]]:
+        """
+        Merge runs with URL stats still in memory, stats of the same URL are merged into one
+        :param in_memory: URL stats kept in memory, sorted by URL
+        :return: Iterator over URLs and their stats in URL order
+        """
+        with ExitStack() as stack:
+            streams: List[Iterator[Tuple[Url, UrlStats]]] = []
+            for run_file in self.runs:
+                file = stack.enter_context(open(run_file, "rb", buffering=SPILL_RUN_BUFFER))
+                streams.append(LogAggregator.load_stream(file)[1])
+            # memory goes last: equal URLs come in stream order, so stats kept in memory are only merged into
+            # stats loaded from a run and stay intact for the next merge
+            streams.append(iter(in_memory))
+            for _, group in itertools.groupby(heapq.merge(*streams, key=_url_order), key=_url_order):
+                url, stats = next(group)
+                for _, other_stats in group:
+                    stats.merge(other_stats)
+                yield url, stats
+
+    def close(self) -> None:
+        """
+        Remove spilled runs
+        :return: None
+        """
+        self._finalizer()
@@ -0,0 +1,180 @@
+"""
+Checkpoints of partially parsed log files
+"""
+
+import json
+import os
+import pathlib
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Tuple, Type, TypeVar
+
+from .aggregation import LogAggregator
+
+CheckpointType = TypeVar("CheckpointType", "Checkpoint", "ParseCheckpoint")
+
+
+@dataclass
+class Checkpoint:
+    """
+    Position in a log file together with the aggregate of everything before it
+    """
+
+    log_file: str
+    inode: int
+    offset: int
+    log_date: str
+    aggregator: LogAggregator
+
+    def matches(
+        self,
+        log_file: os.PathLike[str],
+        relative_accuracy: float | None,
+        histogram: bool = False,
+        time_bucket: int = 0,
+        url_settings: str = "",
+    ) -> bool:
+        """
+        Check the checkpoint can be continued for the log file: it is the same file (not rotated or truncated since)
+        and the aggregate was built with the same median, histogram, timeline and URL settings
+        :param log_file: Path to log file
+        :param relative_accuracy: Median accuracy, None for exact medians
+        :param histogram: Whether latency histograms are collected
+        :param time_bucket: Timeline bucket size in minutes, 0 if timelines are not collected
+        :param url_settings: LOG_FORMAT and URL normalization, see ParseSettings.url_settings
+        :return: True if parsing can continue from the checkpoint offset
+        """
+        try:
+            stat = os.stat(log_file)
+        except OSError:
+            return False
+        return (
+            self.log_file == str(log_file)
+            and self.inode == stat.st_ino
+            and self.offset <= stat.st_size
+            and self.aggregator.relative_accuracy == relative_accuracy
+            and self.aggregator.histogram == histogram
+            and self.aggregator.time_bucket == time_bucket
+            and self.aggregator.url_settings == url_settings
+        )
+
+
+def load_checkpoint(checkpoint_file: pathlib.Path) -> Checkpoint | None:
+    """
+    Load checkpoint: a JSON header line followed by the binary aggregate
+    :param checkpoint_file: Path to checkpoint file
+    :return: Checkpoint, None if there is no valid checkpoint
+    """
+    return _load_with_header(checkpoint_file, Checkpoint)
+
+
+def save_checkpoint(checkpoint_file: pathlib.Path, checkpoint: Checkpoint) -> None:
+    """
+    Atomically save checkpoint to file. The aggregate is written in the binary format of LogAggregator.dump
+    without compression: the checkpoint is rewritten by every incremental run
+    :param checkpoint_file: Path to checkpoint file
+    :param checkpoint: Checkpoint to save
+    :return: None
+    """
+    _save_with_header(checkpoint_file, checkpoint)
+
+
+@dataclass
+class ParseCheckpoint:
+    """
+    Progress of parsing a rotated log file: offset of the first line not parsed yet (in decompressed data
+    for gzip files) together with the aggregate of everything before it
+    """
+
+    log_file: str
+    inode: int
+    size: int
+    mtime_ns: int
+    settings_key: str
+    offset: int
+    aggregator: LogAggregator
+
+    @staticmethod
+    def file_identity(log_file: os.PathLike[str]) -> Tuple[int, int, int]:
+        """
+        Identity of a log file to check the checkpoint was made for the same file
+        :param log_file: Path to log file
+        :return: Inode, size and mtime in nanoseconds
+        """
+        stat = os.stat(log_file)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def matches(self, log_file: os.PathLike[str], settings_key: str) -> bool:
+        """
+        Check parsing of the log file can be resumed from the checkpoint: it is the same unchanged file
+        and the aggregate was built with the same parse settings
+        :param log_file: Path to log file
+        :param settings_key: Parse settings, see ParseSettings.checkpoint_key
+        :return: True if parsing can be resumed
+        """
+        try:
+            identity = self.file_identity(log_file)
+        except OSError:
+            return False
+        return (
+            self.log_file == str(log_file)
+            and (self.inode, self.size, self.mtime_ns) == identity
+            and self.settings_key == settings_key
+        )
+
+
+def load_parse_checkpoint(checkpoint_file: pathlib.Path) -> ParseCheckpoint | None:
+    """
+    Load parse checkpoint: a JSON header line followed by the binary aggregate
+    :param checkpoint_file: Path to checkpoint file
+    :return: Checkpoint, None if there is no valid checkpoint
+    """
+    return _load_with_header(checkpoint_file, ParseCheckpoint)
+
+
+def save_parse_checkpoint(checkpoint_file: pathlib.Path, checkpoint: ParseCheckpoint) -> None:
+    """
+    Atomically save parse checkpoint to file. The aggregate is not compressed: it is saved every few minutes
+    during a long parse and compression would take longer than the write
+    :param checkpoint_file: Path to checkpoint file
+    :param checkpoint: Checkpoint to save
+    :return: None
+    """
+    _save_with_header(checkpoint_file, checkpoint)
+
+
+def _load_with_header(checkpoint_file: pathlib.Path, checkpoint_type: Type[CheckpointType]) -> CheckpointType | None:
+    """
+    Load checkpoint of the given type: a JSON header line with every field but the aggregate,
+    followed by the binary aggregate
+    :param checkpoint_file: Path to checkpoint file
+    :param checkpoint_type: Checkpoint or ParseCheckpoint
+    :return: Checkpoint, None if there is no valid checkpoint
+    """
+    try:
+        with open(checkpoint_file, "rb") as file:
+            header = json.loads(file.readline())
+            aggregator = LogAggregator.load(file)
+        return checkpoint_type(**header, aggregator=aggregator)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_with_header(checkpoint_file: pathlib.Path, checkpoint: "Checkpoint | ParseCheckpoint") -> None:
+    """
+    Atomically save checkpoint to file: a JSON header line with every field but the aggregate,
+    followed by the aggregate in the binary format of LogAggregator.dump
+    :param checkpoint_file: Path to checkpoint file
+    :param checkpoint: Checkpoint to save
+    :return: None
+    """
+    header: Dict[str, Any] = {
+        field.name: getattr(checkpoint, field.name) for field in fields(checkpoint) if field.name != "aggregator"
+    }
+    os.makedirs(checkpoint_file.parent, exist_ok=True)
+    tmp_file = checkpoint_file.with_name(checkpoint_file.name + ".tmp")
+    with open(tmp_file, "wb") as file:
+        file.write(json.dumps(header).encode() + b"\n")
+        checkpoint.aggregator.dump(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_file, checkpoint_file)
@@ -0,0 +1,195 @@
+"""
+Columnar on-disk format of parsed log records
+
+File layout: header (magic, version, log date), then batches. Every batch starts with a header
+(number of rows and of new dictionary entries), then new URL and remote address dictionary
+entries (length-prefixed), then one little-endian array per column. URLs and remote addresses
+are dictionary encoded: a column holds codes, the dictionaries grow batch by batch, so a file
+is written and read in a single streaming pass with memory bounded by the batch size.
+"""
+
+import struct
+from array import array
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, List
+
+from .aggregation import dump_array, load_array
+
+COLUMNAR_MAGIC = b"LCOL"
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct("<4sB10s")
+BATCH_HEADER = struct.Struct("<III")
+ENTRY_HEADER = struct.Struct("<I")
+BATCH_SIZE = 65536
+
+# column name, array type code
+COLUMNS = (
+    ("timestamp", "q"),  # seconds since epoch
+    ("utc_offset", "h"),  # minutes, $time_local offset
+    ("url", "I"),  # code in URL dictionary
+    ("status", "H"),
+    ("body_bytes_sent", "Q"),
+    ("request_time", "d"),
+    ("remote_addr", "I"),  # code in remote address dictionary
+)
+
+
+@dataclass
+class ColumnarBatch:
+    """
+    Batch of records as columns, dictionaries are shared by all batches of a file
+    """
+
+    columns: Dict[str, array]
+    urls: List[bytes]
+    remote_addrs: List[bytes]
+
+    def __len__(self) -> int:
+        return len(self.columns["url"])
+
+
+def _new_columns() -> Dict[str, array]:
+    """
+    Create empty columns
+    :return: Column name to empty array
+    """
+    return {name: array(typecode) for name, typecode in COLUMNS}
+
+
+def _write_entries(file: BinaryIO, entries: List[bytes]) -> None:
+    """
+    Write length-prefixed dictionary entries
+    :param file: File opened for binary writing
+    :param entries: Entries to write
+    :return: None
+    """
+    for entry in entries:
+        file.write(ENTRY_HEADER.pack(len(entry)))
+        file.write(entry)
+
+
+def _read_entries(file: BinaryIO, count: int) -> List[bytes]:
+    """
+    Read entries written by _write_entries
+    :param file: File opened for binary reading
+    :param count: Number of entries
+    :return: Entries
+    """
+    entries = []
+    for _ in range(count):
+        header = file.read(ENTRY_HEADER.size)
+        if len(header) != ENTRY_HEADER.size:
+            raise ValueError("Truncated columnar file")
+        (size,) = ENTRY_HEADER.unpack(header)
+        entries.append(file.read(size))
+    return entries
+
+
+class ColumnarWriter:
+    """
+    Writes records in batches of `batch_size` rows
+    """
+
+    def __init__(self, file: BinaryIO, log_date: str, batch_size: int = BATCH_SIZE):
+        self.file = file
+        self.batch_size = batch_size
+        self._columns = _new_columns()
+        self._url_codes: Dict[bytes, int] = {}
+        self._addr_codes: Dict[bytes, int] = {}
+        self._new_urls: List[bytes] = []
+        self._new_addrs: List[bytes] = []
+        file.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, log_date.encode()))
+
+    def add(
+        self,
+        timestamp: int,
+        utc_offset: int,
+        url: bytes,
+        status: int,
+        body_bytes_sent: int,
+        request_time: float,
+        remote_addr: bytes,
+    ) -> None:
+        """
+        Add a record
+        :param timestamp: Request time as seconds since epoch
+        :param utc_offset: UTC offset of $time_local in minutes
+        :param url: Requested URL
+        :param status: Response status
+        :param body_bytes_sent: Response body size
+        :param request_time: Request time
+        :param remote_addr: Client address
+        :return: None
+        """
+        url_code = self._url_codes.get(url)
+        if url_code is None:
+            url_code = self._url_codes[url] = len(self._url_codes)
+            self._new_urls.append(url)
+        addr_code = self._addr_codes.get(remote_addr)
+        if addr_code is None:
+            addr_code = self._addr_codes[remote_addr] = len(self._addr_codes)
+            self._new_addrs.append(remote_addr)
+        columns = self._columns
+        columns["timestamp"].append(timestamp)
+        columns["utc_offset"].append(utc_offset)
+        columns["url"].append(url_code)
+        columns["status"].append(status)
+        columns["body_bytes_sent"].append(body_bytes_sent)
+        columns["request_time"].append(request_time)
+        columns["remote_addr"].append(addr_code)
+        if len(columns["url"]) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write buffered records as a batch
+        :return: None
+        """
+        rows = len(self._columns["url"])
+        if not rows:
+            return
+        self.file.write(BATCH_HEADER.pack(rows, len(self._new_urls), len(self._new_addrs)))
+        _write_entries(self.file, self._new_urls)
+        _write_entries(self.file, self._new_addrs)
+        for name, _ in COLUMNS:
+            dump_array(self.file, self._columns[name])
+        self._columns = _new_columns()
+        self._new_urls, self._new_addrs = [], []
+
+
+def read_columnar_header(file: BinaryIO) -> str:
+    """
+    Read file header
+    :param file: File opened for binary reading
+    :return: Log date the records are from
+    """
+    header = file.read(COLUMNAR_HEADER.size)
+    if len(header) != COLUMNAR_HEADER.size:
+        raise ValueError("Truncated columnar file header")
+    magic, version, log_date = COLUMNAR_HEADER.unpack(header)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError("Unknown columnar file format")
+    return str(log_date, "UTF-8")
+
+
+def iter_columnar_batches(file: BinaryIO) -> Iterator[ColumnarBatch]:
+    """
+    Read batches of a file positioned right after the header
+    :param file: File opened for binary reading
+    :return: Iterator over batches, dictionaries are the same lists growing with every batch
+    """
+    urls: List[bytes] = []
+    remote_addrs: List[bytes] = []
+    while True:
+        header = file.read(BATCH_HEADER.size)
+        if not header:
+            return
+        if len(header) != BATCH_HEADER.size:
+            raise ValueError("Truncated columnar batch")
+        rows, new_urls, new_addrs = BATCH_HEADER.unpack(header)
+        urls.extend(_read_entries(file, new_urls))
+        remote_addrs.extend(_read_entries(file, new_addrs))
+        columns = {name: load_array(file, typecode, rows) for name, typecode in COLUMNS}
+        if any(len(column) != rows for column in columns.values()):
+            raise ValueError("Truncated columnar batch")
+        yield ColumnarBatch(columns, urls, remote_addrs)
@@ -0,0 +1,87 @@
+"""
+Accounting of log lines that cannot be parsed: counts per failure kind and a bounded sample of the lines
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+ERROR_SAMPLE_SIZE = 10
+# sampled lines are cut, a broken log may have lines of any length
+MAX_SAMPLE_LINE = 1000
+
+
+class ParseErrors:
+    """
+    Failed lines counted by kind with a uniform reservoir sample of `sample_size` lines.
+    Memory does not depend on the number of failed lines, nothing is logged per line
+    """
+
+    def __init__(self, sample_size: int = ERROR_SAMPLE_SIZE, seed: int | None = None):
+        self.sample_size = sample_size
+        self.kinds: Dict[str, int] = {}
+        self.count = 0
+        self.sample: List[Tuple[str, str]] = []
+        self._random = random.Random(seed)
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def add(self, kind: str, line: bytes | str) -> None:
+        """
+        Account failed line
+        :param kind: Failure kind
+        :param line: The line, decoded and cut only if it gets into the sample
+        :return: None
+        """
+        self.count += 1
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append((kind, self._sample_line(line)))
+            return
+        # reservoir sampling: the line replaces a sampled one with probability sample_size / count
+        position = int(self._random.random() * self.count)
+        if position < self.sample_size:
+            self.sample[position] = (kind, self._sample_line(line))
+
+    @staticmethod
+    def _sample_line(line: bytes | str) -> str:
+        """
+        Prepare line for the sample
+        :param line: Failed line
+        :return: Decoded line cut to MAX_SAMPLE_LINE characters
+        """
+        if isinstance(line, bytes):
+            line = line[:MAX_SAMPLE_LINE].decode("UTF-8", "replace")
+        return line[:MAX_SAMPLE_LINE].rstrip("\n")
+
+    def merge(self, other: "ParseErrors") -> None:
+        """
+        Merge errors of another part of the log. Sampled lines are drawn from both samples
+        in proportion to the number of failed lines they represent
+        :param other: Errors to merge
+        :return: None
+        """
+        for kind, count in other.kinds.items():
+            self.kinds[kind] = self.kinds.get(kind, 0) + count
+        left, right = self.count, other.count
+        left_sample, right_sample = list(self.sample), list(other.sample)
+        self._random.shuffle(left_sample)
+        self._random.shuffle(right_sample)
+        self.sample = []
+        while len(self.sample) < self.sample_size and (left_sample or right_sample):
+            if right_sample and (not left_sample or self._random.random() * (left + right) >= left):
+                self.sample.append(right_sample.pop())
+                right -= 1
+            else:
+                self.sample.append(left_sample.pop())
+                left -= 1
+        self.count += other.count
+
+    def clear(self) -> None:
+        """
+        Forget accounted lines, e.g. once they are reported
+        :return: None
+        """
+        self.kinds = {}
+        self.count = 0
+        self.sample = []
@@ -0,0 +1,161 @@
+"""
+Following the live log: reading appended lines, rotation detection and waiting for changes
+"""
+
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import sys
+import time
+from typing import BinaryIO, Iterator, List
+
+from .readers import CHUNK_SIZE
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class LogFollower:
+    """
+    Open handle of the live log reading lines as they are appended. The handle is kept across
+    rotation, so lines written to the rotated file before it was noticed are not lost
+    """
+
+    def __init__(self, log_file: pathlib.Path, offset: int = 0, chunk_size: int = CHUNK_SIZE):
+        self.log_file = log_file
+        self.chunk_size = chunk_size
+        self.file: BinaryIO = open(log_file, "rb")  # pylint: disable=consider-using-with
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.file.seek(offset)
+        self._tail = b""
+
+    @property
+    def offset(self) -> int:
+        """
+        Offset right after the last complete line read
+        """
+        return self.file.tell() - len(self._tail)
+
+    def read_line_blocks(self) -> Iterator[List[bytes]]:
+        """
+        Read lines appended since the previous call, the last line is kept until it is terminated
+        :return: Iterator over blocks of lines (without line separators)
+        """
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                return
+            lines = (self._tail + chunk if self._tail else chunk).split(b"\n")
+            self._tail = lines.pop()
+            if lines:
+                yield lines
+
+    def rotated(self) -> bool:
+        """
+        Check the live log was rotated (path points to another file) or truncated
+        :return: True if the follower has to be reopened
+        """
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            return True
+        return stat.st_ino != self.inode or stat.st_size < self.offset
+
+    def close(self) -> None:
+        """
+        Close log file
+        :return: None
+        """
+        self.file.close()
+
+
+class PollingWatcher:
+    """
+    Waits for log changes by sleeping for the poll interval
+    """
+
+    def __init__(self, poll_interval: float = 1.0):
+        self.poll_interval = poll_interval
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for changes
+        :param timeout: Max time to wait in seconds
+        :return: Always False: changes are not detected, the caller just reads again
+        """
+        time.sleep(max(0.0, min(timeout, self.poll_interval)))
+        return False
+
+    def close(self) -> None:
+        """
+        Nothing to release
+        :return: None
+        """
+
+
+class InotifyWatcher:
+    """
+    Waits for changes in the log folder with Linux inotify: writes to the log, its rotation and
+    creation of the new log wake the watcher immediately
+    """
+
+    def __init__(self, log_dir: pathlib.Path, poll_interval: float = 1.0):
+        self.poll_interval = poll_interval
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        if libc.inotify_add_watch(self.fd, os.fsencode(log_dir), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {log_dir}: {os.strerror(errno)}")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for changes. The wait is capped by the poll interval, so the caller gets control
+        back regularly (e.g. to stop on a signal)
+        :param timeout: Max time to wait in seconds
+        :return: True if there were changes in the log folder
+        """
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, min(timeout, self.poll_interval)))
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        """
+        Release inotify descriptor
+        :return: None
+        """
+        os.close(self.fd)
+
+
+def create_watcher(
+    log_dir: pathlib.Path, poll_interval: float = 1.0, use_inotify: bool = True
+) -> InotifyWatcher | PollingWatcher:
+    """
+    Create watcher of the log folder: inotify on Linux, polling elsewhere or if inotify is not available
+    :param log_dir: Path to folder with the live log
+    :param poll_interval: Polling interval, also the longest single wait of inotify watcher
+    :param use_inotify: Try inotify first
+    :return: Watcher
+    """
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(log_dir, poll_interval)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(poll_interval)
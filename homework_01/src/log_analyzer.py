@@ -9,18 +9,95 @@ Log Parser
 #    '$request_time';
 
 import argparse
+import datetime
 import gzip
+import heapq
+import itertools
 import json
+import math
 import os
 import pathlib
 import re
 import shutil
-from statistics import mean, median
-from typing import Dict, List, TextIO, Tuple
+import signal
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple
 
 import structlog
 
-config = {"REPORT_SIZE": 1000, "REPORT_DIR": "./reports", "LOG_DIR": "./log"}
+from .aggregation import LogAggregator, Url, UrlStats, decode_url, encode_url
+from .checkpoint import (
+    Checkpoint,
+    ParseCheckpoint,
+    load_checkpoint,
+    load_parse_checkpoint,
+    save_checkpoint,
+    save_parse_checkpoint,
+)
+from .columnar import ColumnarWriter, iter_columnar_batches, read_columnar_header
+from .errors import ERROR_SAMPLE_SIZE
+from .follow import LogFollower, create_watcher
+from .log_format import LogFormat
+from .log_index import LogIndex
+from .memory import MemoryProfile
+from .metrics import RunMetrics
+from .normalize import UrlNormalizer
+from .pipeline import Pipeline
+from .readers import (
+    iter_file_chunks,
+    iter_line_blocks,
+    iter_log_line_blocks,
+    iter_log_line_blocks_from,
+    iter_mmap_line_blocks,
+)
+from .vectorized import AUTO_MIN_URLS, numpy_available, report_columns
+
+config = {
+    "REPORT_SIZE": 1000,
+    "REPORT_DIR": "./reports",
+    "LOG_DIR": "./log",
+    "MEDIAN": "exact",
+    "MEDIAN_ACCURACY": 0.01,
+    "GZIP_PIPE": None,
+    "MMAP": True,
+    "URL_NORMALIZATION": None,
+    "METRICS_FILE": None,
+    "REPORT_FORMAT": "rows",
+    "REPORT_PAGE_SIZE": 1000,
+    "PERCENTILES": [],
+    "TIME_BUCKET_MINUTES": 0,
+    "ERROR_SAMPLE_SIZE": 10,
+    "LOG_FORMAT": None,
+    "LOG_INDEX_FILE": None,
+    "PARSE_CHECKPOINT_INTERVAL": 300,
+    "PARSE_PIPELINE": True,
+    "MAX_MEMORY_MB": 0,
+    "SPILL_DIR": None,
+    "WATCH_REPORT_INTERVAL": 60,
+    "WATCH_POLL_INTERVAL": 1.0,
+    "WATCH_INOTIFY": True,
+}
+
+LIVE_LOG_NAME = "nginx-access-ui.log"
+CHECKPOINT_NAME = ".incremental-checkpoint"
+LOG_INDEX_NAME = ".log-index.json"
+PARSE_CHECKPOINT_PREFIX = ".parse-checkpoint-"
+# with checkpoints or a memory limit on, plain files are split into more ranges than workers: a checkpoint
+# is saved and the memory limit is checked after each range, and parts sent back by workers stay small
+RANGES_PER_WORKER = 8
+SIDECAR_SUFFIX = ".agg.gz"
+METRICS_NAME = "log_analyzer.prom"
+TIME_SERIES_SUFFIX = ".timeseries.json"
+# HH:MM of $time_local starts right after "[dd/Mon/yyyy:"
+TIME_OF_DAY_OFFSET = len("[dd/Mon/yyyy:")
+MINUTES_PER_DAY = 24 * 60
+TABLE_PLACEHOLDER = "$table_json"
 
 
 def configure_logger(log_file: str = ""):
@@ -65,6 +142,56 @@ def parse_args():
         default="unknown",
         help="Path to configuration file (JSON formatted)",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of processes to parse the log file with",
+    )
+    parser.add_argument(
+        "--range",
+        type=parse_date_range,
+        required=False,
+        default=None,
+        dest="date_range",
+        help="Generate report for days range YYYY.MM.DD:YYYY.MM.DD from saved day aggregates",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Parse only new lines of the live log since the previous run and regenerate its report",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Generate reports for every rotated log without one, --workers files at a time",
+    )
+    parser.add_argument(
+        "--export-columnar",
+        type=pathlib.Path,
+        required=False,
+        default=None,
+        help="Export parsed records of the latest log to columnar file for further analysis",
+    )
+    parser.add_argument(
+        "--columnar",
+        type=pathlib.Path,
+        required=False,
+        default=None,
+        help="Generate report from columnar file written by --export-columnar instead of the raw log",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Run as a daemon following the live log and rewriting its report on a fixed interval",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Trace memory and log its peak per phase and the structures of the largest aggregate (slow)",
+    )
     return parser.parse_args()
 
 
@@ -93,129 +220,955 @@ def update_config(default_config: Dict, config_path: pathlib.Path) -> Dict:
     return updated_config
 
 
-def get_log_file_and_date(log_dir: pathlib.Path) -> Tuple[pathlib.Path, str]:
+def refresh_log_index(log_index: LogIndex) -> None:
+    """
+    Refresh index of the log folder and warn about files that look like logs but have no valid date
+    :param log_index: Index to refresh
+    :return: None
+    """
+    for name in log_index.refresh():
+        logger.warning("Skipping %s: no valid YYYYMMDD date in the file name", name)
+
+
+def open_log_index(updated_config: Dict) -> LogIndex:
+    """
+    Load index of LOG_DIR saved by the previous run (LOG_INDEX_FILE, by default in REPORT_DIR), refresh and save it.
+    Logs are marked as processed if and only if their report exists
+    :param updated_config: Script config
+    :return: Refreshed index
+    """
+    report_dir = pathlib.Path(updated_config["REPORT_DIR"])
+    index_file = pathlib.Path(updated_config.get("LOG_INDEX_FILE") or report_dir / LOG_INDEX_NAME)
+    log_index = LogIndex.load(pathlib.Path(updated_config["LOG_DIR"]), index_file)
+    refresh_log_index(log_index)
+    # a report deleted since the previous run makes its log unprocessed again
+    for entry in log_index.entries.values():
+        entry.processed = report_file_exists(report_dir, entry.log_date)
+    save_log_index(log_index)
+    return log_index
+
+
+def save_log_index(log_index: LogIndex) -> None:
+    """
+    Save index, failure to save it only makes the next run scan the folder again
+    :param log_index: Index to save
+    :return: None
+    """
+    try:
+        log_index.save()
+    except OSError as e:
+        logger.warning("Failed to save log index, exception: %s", str(e))
+
+
+def get_log_file_and_date(log_dir: pathlib.Path, log_index: LogIndex | None = None) -> Tuple[pathlib.Path, str]:
     """
     Obtain log file path and date it was created
     :param log_dir: Path to folder with log files
+    :param log_index: Refreshed index of the folder, the folder is scanned if not set
     :return: Path to the latest log file and its date
     """
-    log_starts_with = "nginx-access-ui.log-"
-    parse_log_name = ""
-    if not os.path.isdir(log_dir):
+    if log_index is None:
+        log_index = LogIndex(log_dir)
+        refresh_log_index(log_index)
+    entry = log_index.latest()
+    if entry is None:
         return (pathlib.Path("not_found"), "")
-    for fname in os.listdir(log_dir):
-        if fname.startswith(log_starts_with) and parse_log_name < fname:
-            parse_log_name = fname
-    if not parse_log_name:
-        return (pathlib.Path("not_found"), "")
-    logfile_path = log_dir / parse_log_name
+    logfile_path = log_index.path(entry)
     logger.info("Found log file %s for parsing", str(logfile_path))
-    log_date = re.findall(r"\d+", parse_log_name)[0]
-    if len(log_date) != 8:
-        logger.warning("warning")
-    log_date = f"{log_date[:4]}.{log_date[4:6]}.{log_date[6:8]}"
+    return logfile_path, entry.log_date
+
+
+# Full `ui_short` matcher: every field of the line is extracted in a single pass.
+# The tail of the line (forwarded-for, request id, user) is matched loosely since
+# those fields are frequently mangled by clients.
+LOG_LINE_RE = re.compile(
+    r"^(?P<remote_addr>\S+)\s+(?P<remote_user>\S+)\s+(?P<http_x_real_ip>\S+)\s+"
+    r"\[(?P<time_local>[^\]]+)\]\s+"
+    r'"(?:(?P<method>[A-Z]+)\s+(?P<url>.+?)\s+(?P<protocol>HTTP/[\d.]+)|[^"]*)"\s+'
+    r"(?P<status>\d{3})\s+(?P<body_bytes_sent>\d+|-)\s+"
+    r'"(?P<http_referer>[^"]*)"\s+"(?P<http_user_agent>[^"]*)"\s+'
+    r'"(?P<http_x_forwarded_for>[^"]*)"\s+"(?P<http_x_request_id>[^"]*)"\s+'
+    r"(?P<http_x_rb_user>\S*)\s+"
+    r"(?P<request_time>\d+(?:\.\d+)?)\s*$"
+)
 
-    return logfile_path, log_date
+# Fast path matcher: only the URL is captured, request time is sliced from the end of the line
+URL_RE = re.compile(r'"(?:GET|POST|HEAD|OPTIONS|PUT|PATCH|DELETE) (.+?) HTTP/')
+URL_BYTES_RE = re.compile(URL_RE.pattern.encode())
+LOG_LINE_BYTES_RE = re.compile(LOG_LINE_RE.pattern.encode())
 
 
-def parse_log_line(line: str = ""):
+def parse_log_record(line: str = "") -> Dict[str, str] | None:
     """
-    Parse logic for single line from log file
+    Parse all fields of a single `ui_short` line from log file
     :param line: Single line from log file
-    :return: Extracted URL and corresponded request time
+    :return: Dictionary with field name as a key and its raw value, None if line doesn't match the format
     """
-    re_result = re.search("(?:GET|POST|HEAD|OPTIONS|PUT)(.+?)HTTP", line)
-    url = None
-    if re_result:
-        url = re_result.group(1).strip()
-    else:
-        logger.error("Need to adjust search criteria for line %s", line)
+    re_result = LOG_LINE_RE.match(line)
+    if re_result is None:
+        return None
+    return re_result.groupdict()
+
 
-    request_time = float(re.findall(r"\d+\.\d+", line.split(" ")[-1].strip())[0])
-    return url, request_time
+def parse_log_line(line: str = "") -> Tuple[str | None, float | None]:
+    """
+    Parse logic for single line from log file. Only URL and request time are extracted
+    :param line: Single line from log file
+    :return: Extracted URL and corresponded request time, (None, None) if line doesn't match
+    """
+    re_result = URL_RE.search(line)
+    if re_result is not None:
+        line = line.rstrip()
+        try:
+            return re_result.group(1), float(line[line.rfind(" ") + 1 :])
+        except ValueError:
+            pass
+    return None, None
 
 
-def parse_logs(log_file: os.PathLike[str]) -> Dict:
+def parse_log_line_bytes(line: bytes = b"") -> Tuple[bytes | None, float | None]:
     """
-    Main function for log parsing
-    :param log_file: Path to log file to parse
-    :return: Dictionary with URL as a key, and list of requested time as value for the key
+    Same as parse_log_line for a raw line. The URL is not decoded: aggregates are keyed by
+    URL bytes and only reported URLs are decoded
+    :param line: Single line from log file as bytes
+    :return: Extracted URL and corresponded request time, (None, None) if line doesn't match
     """
-    # find the latest log file in log dir
-    if not log_file:
-        return {}
+    re_result = URL_BYTES_RE.search(line)
+    if re_result is not None:
+        line = line.rstrip()
+        try:
+            return re_result.group(1), float(line[line.rfind(b" ") + 1 :])
+        except ValueError:
+            pass
+    return None, None
+
+
+def classify_failed_line(line: bytes | str) -> str:
+    """
+    Get failure kind of a line the parser could not match, called for failed lines only
+    :param line: Single line from log file
+    :return: "empty", "unsupported_request" (no method, URL and protocol) or "bad_request_time"
+    """
+    if not line.strip():
+        return "empty"
+    url_re = URL_BYTES_RE if isinstance(line, bytes) else URL_RE
+    if url_re.search(line) is None:  # type: ignore[arg-type]
+        return "unsupported_request"
+    return "bad_request_time"
+
+
+def log_parse_errors(aggregator: LogAggregator) -> None:
+    """
+    Write failed lines accounted since the previous call as a single record and forget them
+    :param aggregator: Aggregator with accounted failed lines
+    :return: None
+    """
+    errors = aggregator.errors
+    if not errors:
+        return
+    logger.error(
+        "Failed to parse %d lines, need to adjust search criteria",
+        errors.count,
+        kinds=errors.kinds,
+        sample=[{"kind": kind, "line": line} for kind, line in errors.sample],
+    )
+    errors.clear()
 
+
+def parse_time_bucket(time_of_day: bytes, time_bucket: int) -> int | None:
+    """
+    Get time bucket of the request
+    :param time_of_day: HH:MM from $time_local
+    :param time_bucket: Bucket size in minutes
+    :return: Number of the bucket within the day, None if the time can't be parsed
+    """
     try:
-        # pylint: disable=consider-using-with
-        logfile_content: TextIO = (
-            gzip.open(log_file, mode="rt")
-            if pathlib.Path(log_file).suffix == ".gz"
-            else open(log_file, encoding="UTF-8")
-        )
-    except OSError:
-        logger.error("Cannot open/read file %s", str(log_file))
-        return {}
+        return (int(time_of_day[:2]) * 60 + int(time_of_day[3:5])) // time_bucket
+    except ValueError:
+        return None
 
-    data = {}
+
+def parse_byte_lines(
+    lines: Iterable[bytes],
+    aggregator: LogAggregator,
+    normalizer: UrlNormalizer | None = None,
+    log_format: LogFormat | None = None,
+) -> LogAggregator:
+    """
+    Same as parse_lines for raw lines. Time buckets of requests are parsed only if the aggregator keeps timelines
+    :param lines: Log lines as bytes
+    :param aggregator: Aggregator to add request times and parse counters to
+    :param normalizer: URL normalization applied before aggregation
+    :param log_format: Compiled LOG_FORMAT, lines are in ui_short format if not set
+    :return: The same aggregator
+    """
+    if log_format is not None:
+        return parse_byte_lines_with_format(lines, aggregator, log_format, normalizer)
+    add = aggregator.add
+    add_error = aggregator.errors.add
+    time_bucket = aggregator.time_bucket
+    time_buckets: Dict[bytes, int | None] = {}
     lines_count = 0
     failed_line_count = 0
-    for line in logfile_content:
+    for line in lines:
         lines_count += 1
-        url, request_time = parse_log_line(str(line))
+        url, request_time = parse_log_line_bytes(line)
         if url is None:
             failed_line_count += 1
-        if url not in data:
-            data[url] = [request_time]
+            add_error(classify_failed_line(line), line)
+            continue
+        if normalizer is not None:
+            url = normalizer(url)
+        if time_bucket:
+            # HH:MM of $time_local is at a fixed offset after '[', e.g. [29/Jun/2017:03:50:22 +0300]. Lines of the same
+            # minute are adjacent in a log, so each HH:MM is parsed once
+            start = line.find(b"[") + TIME_OF_DAY_OFFSET
+            time_of_day = line[start : start + 5] if start >= TIME_OF_DAY_OFFSET else b""
+            bucket = time_buckets.get(time_of_day, -1)
+            if bucket == -1:
+                bucket = time_buckets[time_of_day] = parse_time_bucket(time_of_day, time_bucket)
+            add(url, request_time, bucket)  # type: ignore[arg-type]
+        else:
+            add(url, request_time)  # type: ignore[arg-type]
+    aggregator.lines_count += lines_count
+    aggregator.failed_line_count += failed_line_count
+    return aggregator
+
+
+def parse_byte_lines_with_format(
+    lines: Iterable[bytes], aggregator: LogAggregator, log_format: LogFormat, normalizer: UrlNormalizer | None = None
+) -> LogAggregator:
+    """
+    Same as parse_byte_lines for lines in a custom log format
+    :param lines: Log lines as bytes
+    :param aggregator: Aggregator to add request times and parse counters to
+    :param log_format: Compiled log format, it extracts time of day only if the aggregator keeps timelines
+    :param normalizer: URL normalization applied before aggregation
+    :return: The same aggregator
+    """
+    add = aggregator.add
+    add_error = aggregator.errors.add
+    parse = log_format.parse
+    time_bucket = aggregator.time_bucket
+    time_buckets: Dict[bytes, int | None] = {}
+    lines_count = 0
+    failed_line_count = 0
+    for line in lines:
+        lines_count += 1
+        url, request_time, time_of_day = parse(line)
+        if url is None:
+            failed_line_count += 1
+            add_error(log_format.classify(line), line)
+            continue
+        if normalizer is not None:
+            url = normalizer(url)
+        if time_bucket:
+            bucket = time_buckets.get(time_of_day, -1)
+            if bucket == -1:
+                bucket = time_buckets[time_of_day] = parse_time_bucket(time_of_day, time_bucket)
+            add(url, request_time, bucket)  # type: ignore[arg-type]
+        else:
+            add(url, request_time)  # type: ignore[arg-type]
+    aggregator.lines_count += lines_count
+    aggregator.failed_line_count += failed_line_count
+    return aggregator
+
+
+def parse_lines(lines: Iterable[str], aggregator: LogAggregator) -> LogAggregator:
+    """
+    Aggregate request times per URL for a sequence of log lines
+    :param lines: Log lines to parse
+    :param aggregator: Aggregator to add request times and parse counters to
+    :return: The same aggregator
+    """
+    add = aggregator.add
+    add_error = aggregator.errors.add
+    lines_count = 0
+    failed_line_count = 0
+    for line in lines:
+        lines_count += 1
+        url, request_time = parse_log_line(line)
+        if url is None:
+            failed_line_count += 1
+            add_error(classify_failed_line(line), line)
+            continue
+        add(url, request_time)  # type: ignore[arg-type]
+    aggregator.lines_count += lines_count
+    aggregator.failed_line_count += failed_line_count
+    return aggregator
+
+
+@dataclass
+class ParseSettings:
+    """
+    Settings of log parsing shared by the main process and parse workers
+    """
+
+    relative_accuracy: float | None = None
+    gzip_pipe: str | None = None
+    use_mmap: bool = True
+    normalizer: UrlNormalizer | None = None
+    histogram: bool = False
+    time_bucket: int = 0
+    error_sample_size: int = ERROR_SAMPLE_SIZE
+    log_format: LogFormat | None = None
+    checkpoint_interval: float = 0
+    pipeline: bool = False
+    max_memory_mb: float = 0
+    spill_dir: str | None = None
+
+    @classmethod
+    def from_config(cls, updated_config: Dict) -> "ParseSettings":
+        """
+        Create parse settings from script config
+        :param updated_config: Script config
+        :return: Parse settings
+        :raises ValueError: Invalid setting, the message names it: LOG_FORMAT lacks fields the report needs,
+            MEDIAN_ACCURACY is out of range, a pattern of URL_NORMALIZATION.TEMPLATES does not compile
+        """
+        time_bucket = int(updated_config.get("TIME_BUCKET_MINUTES") or 0)
+        log_format = updated_config.get("LOG_FORMAT")
+        try:
+            parsed_format = LogFormat(log_format, time_of_day=time_bucket > 0) if log_format else None
+        except ValueError as e:
+            raise ValueError(f"Invalid LOG_FORMAT '{log_format}': {e}") from e
+        # sketches of day aggregates are kept even with exact medians, so the accuracy is validated in any mode
+        get_rollup_accuracy(updated_config)
+        return cls(
+            relative_accuracy=get_relative_accuracy(updated_config),
+            gzip_pipe=updated_config.get("GZIP_PIPE"),
+            use_mmap=updated_config.get("MMAP", True),
+            normalizer=UrlNormalizer.from_config(updated_config.get("URL_NORMALIZATION")),
+            histogram=bool(updated_config.get("PERCENTILES")),
+            time_bucket=time_bucket,
+            error_sample_size=int(updated_config.get("ERROR_SAMPLE_SIZE", ERROR_SAMPLE_SIZE)),
+            log_format=parsed_format,
+            checkpoint_interval=float(updated_config.get("PARSE_CHECKPOINT_INTERVAL") or 0),
+            pipeline=bool(updated_config.get("PARSE_PIPELINE", False)),
+            max_memory_mb=float(updated_config.get("MAX_MEMORY_MB") or 0),
+            spill_dir=updated_config.get("SPILL_DIR"),
+        )
+
+    def url_settings(self) -> str:
+        """
+        Settings URLs of an aggregate depend on: aggregates with other URL settings must not be merged
+        :return: LOG_FORMAT and URL normalization as JSON string, empty for raw URLs of ui_short lines
+        """
+        normalizer = self.normalizer
+        if self.log_format is None and normalizer is None:
+            return ""
+        return json.dumps(
+            [
+                self.log_format.log_format if self.log_format else None,
+                normalizer
+                and [
+                    normalizer.strip_query,
+                    normalizer.replace_ids,
+                    [[pattern.pattern.decode(), replacement.decode()] for pattern, replacement in normalizer.templates],
+                ],
+            ]
+        )
+
+    def checkpoint_key(self) -> str:
+        """
+        Settings an aggregate depends on: parsing can be resumed from a checkpoint only if they are the same
+        :return: Settings as JSON string
+        """
+        return json.dumps([self.relative_accuracy, self.histogram, self.time_bucket, self.url_settings()])
+
+    def new_aggregator(self, spill: bool = True) -> LogAggregator:
+        """
+        Create empty aggregator for these settings
+        :param spill: Whether URL stats are spilled to disk above max_memory_mb. Parts of a log parsed
+            by worker processes are not spilled, they are sent back to the main process whole
+        :return: Aggregator
+        """
+        aggregator = LogAggregator(self.relative_accuracy, self.histogram, self.time_bucket, self.url_settings())
+        aggregator.errors.sample_size = self.error_sample_size
+        if spill:
+            self.limit_memory(aggregator)
+        return aggregator
+
+    def limit_memory(self, aggregator: LogAggregator) -> None:
+        """
+        Apply memory limit to aggregator, e.g. to one loaded from a checkpoint
+        :param aggregator: Aggregator
+        :return: None
+        """
+        aggregator.memory_limit = int(self.max_memory_mb * 1024 * 1024)
+        aggregator.spill_dir = self.spill_dir
+
+    def parse_blocks(self, blocks: Iterable[List[bytes]], aggregator: LogAggregator) -> LogAggregator:
+        """
+        Parse blocks of raw lines into aggregator
+        :param blocks: Blocks of log lines as bytes
+        :param aggregator: Aggregator to add parsed lines to
+        :return: The same aggregator
+        """
+        for block in blocks:
+            parse_byte_lines(block, aggregator, self.normalizer, self.log_format)
+            aggregator.check_memory()
+        return aggregator
+
+
+def split_file_ranges(log_file: os.PathLike[str], parts: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split plain text file into byte ranges aligned to line boundaries
+    :param log_file: Path to log file
+    :param parts: Desired number of ranges
+    :param start: Offset of the first line to split from
+    :return: List of (start, end) byte offsets
+    """
+    file_size = os.path.getsize(log_file)
+    boundaries = [start]
+    with open(log_file, "rb") as file:
+        for i in range(1, parts):
+            offset = max(start + (file_size - start) * i // parts, boundaries[-1])
+            if offset >= file_size:
+                break
+            file.seek(offset)
+            file.readline()
+            boundaries.append(min(file.tell(), file_size))
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def _parse_file_range(log_file: os.PathLike[str], start: int, end: int, settings: ParseSettings) -> LogAggregator:
+    """
+    Worker: parse lines of a plain text log file in [start, end) byte range
+    :param log_file: Path to log file
+    :param start: Offset of the first line in the range
+    :param end: Offset right after the last line in the range
+    :param settings: Parse settings
+    :return: Aggregate of the range
+    """
+    blocks = (
+        iter_mmap_line_blocks(log_file, start, end)
+        if settings.use_mmap
+        else iter_line_blocks(iter_file_chunks(log_file, start, end))
+    )
+    return settings.parse_blocks(blocks, settings.new_aggregator(spill=False))
+
+
+def _parse_lines_block(lines: List[bytes], settings: ParseSettings) -> LogAggregator:
+    """
+    Worker: parse block of raw log lines
+    :param lines: Log lines as bytes
+    :param settings: Parse settings
+    :return: Aggregate of the block
+    """
+    return settings.parse_blocks([lines], settings.new_aggregator(spill=False))
+
+
+def _parse_parallel(
+    log_file: os.PathLike[str],
+    workers: int,
+    settings: ParseSettings,
+    aggregator: LogAggregator,
+    offset: int = 0,
+    progress: "ParseProgress | None" = None,
+    pipeline: Pipeline | None = None,
+) -> LogAggregator:
+    """
+    Parse log file on a process pool. Plain text files are split into byte ranges which workers read
+    on their own; gzip files are decompressed once here and line blocks are fanned out to workers.
+    Partial aggregates are merged in log order.
+    :param log_file: Path to log file
+    :param workers: Number of worker processes
+    :param settings: Parse settings
+    :param aggregator: Aggregate of the log before the offset to merge parts into
+    :param offset: Offset of the first line to parse
+    :param progress: Checkpoints to save after merged parts, None to parse without checkpoints
+    :param pipeline: Pipeline to read and decompress gzip files in threads while blocks are dispatched
+    :return: The same aggregator
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if pipeline is not None:
+            # workers are forked before pipeline threads start: forking a multi-threaded process may deadlock
+            executor.submit(int).result()
+        parts: Iterator[Tuple[int, Future]]
+        if pathlib.Path(log_file).suffix != ".gz":
+            range_count = workers if progress is None and not aggregator.memory_limit else workers * RANGES_PER_WORKER
+            ranges = split_file_ranges(log_file, range_count, offset)
+            parts = ((end, executor.submit(_parse_file_range, log_file, start, end, settings)) for start, end in ranges)
         else:
-            data[url].append(request_time)
+            parts = (
+                (end, executor.submit(_parse_lines_block, block, settings))
+                for end, block in iter_log_line_blocks_from(log_file, offset, settings.gzip_pipe, pipeline=pipeline)
+            )
+
+        def merge_next() -> None:
+            end, future = in_flight.popleft()
+            aggregator.merge(future.result())
+            if progress is not None:
+                progress(end, aggregator)
+
+        # keep a bounded number of parts in flight
+        in_flight: Deque[Tuple[int, Future]] = deque()
+        for part in parts:
+            in_flight.append(part)
+            if len(in_flight) >= 2 * workers:
+                merge_next()
+        while in_flight:
+            merge_next()
+    return aggregator
+
+
+class ParseProgress:
+    """
+    Periodic checkpoints of a parse, so that a killed run resumes from the last one instead of the start of the log
+    """
+
+    def __init__(self, log_file: os.PathLike[str], checkpoint_file: pathlib.Path, settings: ParseSettings):
+        self.log_file = log_file
+        self.checkpoint_file = checkpoint_file
+        self.interval = settings.checkpoint_interval
+        self.settings_key = settings.checkpoint_key()
+        self.saved_at = time.monotonic()
+
+    def resume(self) -> Tuple[int, LogAggregator | None]:
+        """
+        Load checkpoint saved by a previous run for the same log file and settings
+        :return: Offset to resume from and aggregate before it, (0, None) if there is nothing to resume
+        """
+        checkpoint = load_parse_checkpoint(self.checkpoint_file)
+        if checkpoint is None or not checkpoint.matches(self.log_file, self.settings_key):
+            return 0, None
+        logger.info("Resuming parsing of %s from offset %s", str(self.log_file), checkpoint.offset)
+        return checkpoint.offset, checkpoint.aggregator
+
+    def __call__(self, offset: int, aggregator: LogAggregator) -> None:
+        """
+        Save checkpoint if the interval passed since the previous one
+        :param offset: Offset of the first line not parsed yet
+        :param aggregator: Aggregate of everything before the offset
+        :return: None
+        """
+        if time.monotonic() - self.saved_at < self.interval:
+            return
+        try:
+            inode, size, mtime_ns = ParseCheckpoint.file_identity(self.log_file)
+            save_parse_checkpoint(
+                self.checkpoint_file,
+                ParseCheckpoint(str(self.log_file), inode, size, mtime_ns, self.settings_key, offset, aggregator),
+            )
+        except OSError as e:
+            logger.warning("Cannot save checkpoint %s, exception: %s", str(self.checkpoint_file), str(e))
+        self.saved_at = time.monotonic()
 
-    if failed_line_count > 0.5 * lines_count:
+    def done(self) -> None:
+        """
+        Remove checkpoint once the whole log is parsed
+        :return: None
+        """
+        try:
+            os.remove(self.checkpoint_file)
+        except FileNotFoundError:
+            pass
+
+
+def parse_logs(
+    log_file: os.PathLike[str],
+    workers: int = 1,
+    settings: ParseSettings | None = None,
+    checkpoint_file: pathlib.Path | None = None,
+) -> LogAggregator:
+    """
+    Main function for log parsing
+    :param log_file: Path to log file to parse
+    :param workers: Number of processes to parse the log with
+    :param settings: Parse settings, defaults are used if not set
+    :param checkpoint_file: Path to save progress to every settings.checkpoint_interval seconds, parsing resumes
+        from it if it was left by a killed run. The file is removed once the log is parsed
+    :return: Aggregate with request time stats per URL, keyed by URL bytes
+    """
+    settings = settings or ParseSettings()
+    # find the latest log file in log dir
+    if not log_file:
+        return settings.new_aggregator()
+
+    progress = None
+    if checkpoint_file is not None and settings.checkpoint_interval > 0:
+        progress = ParseProgress(log_file, checkpoint_file, settings)
+    offset, aggregator = progress.resume() if progress is not None else (0, None)
+    if aggregator is None:
+        aggregator = settings.new_aggregator()
+    else:
+        aggregator.errors.sample_size = settings.error_sample_size
+        settings.limit_memory(aggregator)
+    pipeline = Pipeline() if settings.pipeline else None
+    try:
+        if workers > 1:
+            _parse_parallel(log_file, workers, settings, aggregator, offset, progress, pipeline)
+        else:
+            blocks = iter_log_line_blocks_from(log_file, offset, settings.gzip_pipe, settings.use_mmap, pipeline)
+            for offset, block in blocks:
+                settings.parse_blocks([block], aggregator)
+                if progress is not None:
+                    progress(offset, aggregator)
+    except (OSError, zlib.error):
+        logger.error("Cannot open/read file %s", str(log_file))
+        return settings.new_aggregator()
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+    if progress is not None:
+        progress.done()
+    if pipeline is not None and pipeline.stages:
+        logger.info("Parse pipeline stats", stages=pipeline.stats("parse" if workers == 1 else "dispatch"))
+    if aggregator.spilled is not None:
+        logger.warning(
+            "URL stats exceeded MAX_MEMORY_MB and were spilled to disk",
+            runs=len(aggregator.spilled.runs),
+            spilled_bytes=aggregator.spilled.bytes_written,
+        )
+
+    log_parse_errors(aggregator)
+    if aggregator.failed_line_count > 0.5 * aggregator.lines_count:
         logger.error(
             "Parser failed with more than 50% of log entities. Consider to update parse criteria"
         )
-    return data
+    return aggregator
+
+
+def parse_log_tail(
+    log_file: os.PathLike[str], offset: int, aggregator: LogAggregator, settings: ParseSettings | None = None
+) -> int:
+    """
+    Parse complete lines of a plain text log appended after the offset. The last line is left
+    for the next run if it is not terminated yet
+    :param log_file: Path to log file
+    :param offset: Offset to start parsing from
+    :param aggregator: Aggregator to add parsed lines to
+    :param settings: Parse settings, defaults are used if not set
+    :return: Offset right after the last parsed line
+    """
+
+    def new_lines() -> Iterator[bytes]:
+        nonlocal offset
+        with open(log_file, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                yield line
+
+    settings = settings or ParseSettings()
+    parse_byte_lines(new_lines(), aggregator, settings.normalizer, settings.log_format)
+    aggregator.check_memory()
+    return offset
+
+
+def parse_time_local(time_local: bytes) -> Tuple[int, int]:
+    """
+    Parse $time_local
+    :param time_local: Time like 29/Jun/2017:03:50:22 +0300
+    :return: Seconds since epoch and UTC offset in minutes
+    """
+    moment = datetime.datetime.strptime(time_local.decode("ascii"), "%d/%b/%Y:%H:%M:%S %z")
+    return int(moment.timestamp()), int(moment.utcoffset().total_seconds()) // 60  # type: ignore[union-attr]
+
+
+def export_columnar(
+    log_file: os.PathLike[str], columnar_file: pathlib.Path, log_date: str, settings: ParseSettings | None = None
+) -> Tuple[int, int]:
+    """
+    Parse all fields of log records and write them to columnar file (see columnar.py). URLs are written
+    as they are in the log, normalization is applied when the file is read. $time_local is parsed once per
+    distinct second
+    :param log_file: Path to log file
+    :param columnar_file: Path to columnar file, written atomically
+    :param log_date: Log date stored in the file header
+    :param settings: Parse settings, defaults are used if not set
+    :return: Number of lines read and of lines failed to parse
+    """
+    settings = settings or ParseSettings()
+    lines_count = 0
+    failed_line_count = 0
+    moments: Dict[bytes, Tuple[int, int]] = {}
+    os.makedirs(columnar_file.parent, exist_ok=True)
+    tmp_file = columnar_file.with_name(columnar_file.name + ".tmp")
+    with open(tmp_file, "wb") as file:
+        writer = ColumnarWriter(file, log_date)
+        add = writer.add
+        for block in iter_log_line_blocks(log_file, settings.gzip_pipe, settings.use_mmap):
+            for line in block:
+                lines_count += 1
+                record = LOG_LINE_BYTES_RE.match(line)
+                if record is None or record["url"] is None:
+                    failed_line_count += 1
+                    continue
+                time_local = record["time_local"]
+                moment = moments.get(time_local)
+                if moment is None:
+                    try:
+                        moment = moments[time_local] = parse_time_local(time_local)
+                    except ValueError:
+                        failed_line_count += 1
+                        continue
+                body_bytes_sent = record["body_bytes_sent"]
+                add(
+                    moment[0],
+                    moment[1],
+                    record["url"],
+                    int(record["status"]),
+                    0 if body_bytes_sent == b"-" else int(body_bytes_sent),
+                    float(record["request_time"]),
+                    record["remote_addr"],
+                )
+        writer.flush()
+    os.replace(tmp_file, columnar_file)
+    return lines_count, failed_line_count
+
+
+def parse_columnar(columnar_file: pathlib.Path, settings: ParseSettings | None = None) -> Tuple[str, LogAggregator]:
+    """
+    Aggregate records of columnar file written by export_columnar without the regex parser.
+    URL normalization is applied once per dictionary entry instead of once per record.
+    Only parsed records are stored, so the aggregate has no failed lines
+    :param columnar_file: Path to columnar file
+    :param settings: Parse settings, defaults are used if not set
+    :return: Log date and aggregate of the records
+    """
+    settings = settings or ParseSettings()
+    aggregator = settings.new_aggregator()
+    add = aggregator.add
+    time_bucket = aggregator.time_bucket
+    # aggregation key of every URL code
+    keys: List[bytes] = []
+    with open(columnar_file, "rb") as file:
+        log_date = read_columnar_header(file)
+        for batch in iter_columnar_batches(file):
+            for url in batch.urls[len(keys) :]:
+                keys.append(settings.normalizer(url) if settings.normalizer is not None else url)
+            columns = batch.columns
+            if time_bucket:
+                for url_code, request_time, timestamp, utc_offset in zip(
+                    columns["url"], columns["request_time"], columns["timestamp"], columns["utc_offset"]
+                ):
+                    minute_of_day = (timestamp // 60 + utc_offset) % MINUTES_PER_DAY
+                    add(keys[url_code], request_time, minute_of_day // time_bucket)
+            else:
+                for url_code, request_time in zip(columns["url"], columns["request_time"]):
+                    add(keys[url_code], request_time)
+            aggregator.lines_count += len(batch)
+            aggregator.check_memory()
+    return log_date, aggregator
 
 
-def create_log_stats(log_data: Dict, report_size: int = 0) -> List[Dict]:
+def get_rollup_accuracy(updated_config: Dict) -> float:
+    """
+    Get median accuracy of saved day aggregates and range reports, they keep quantile sketches even with exact medians
+    :param updated_config: Script config
+    :return: Relative accuracy of the sketches
+    :raises ValueError: MEDIAN_ACCURACY is not a number in (0, 1)
+    """
+    median_accuracy = updated_config.get("MEDIAN_ACCURACY", 0.01)
+    try:
+        relative_accuracy = float(median_accuracy)
+    except (TypeError, ValueError):
+        relative_accuracy = math.nan
+    if not 0 < relative_accuracy < 1:
+        raise ValueError(f"MEDIAN_ACCURACY must be a number in (0, 1), got {median_accuracy!r}")
+    return relative_accuracy
+
+
+def get_relative_accuracy(updated_config: Dict) -> float | None:
+    """
+    Get median accuracy from config
+    :param updated_config: Script config
+    :return: Relative accuracy for approximate medians, None for exact medians
+    :raises ValueError: MEDIAN_ACCURACY is not a number in (0, 1)
+    """
+    if updated_config.get("MEDIAN", "exact") == "exact":
+        return None
+    return get_rollup_accuracy(updated_config)
+
+
+def get_top_urls(
+    log_data: LogAggregator, report_size: int, time_sums: array | None = None
+) -> List[Tuple[Url, UrlStats]]:
+    """
+    Select URLs with the largest total request time
+    :param log_data: Aggregate of parsed data
+    :param report_size: The max number of URLs to select
+    :param time_sums: Array to collect total time of every URL into, to sum them up without another pass
+    :return: List of (url, stats) in descending order of total time, URLs with the same total time in URL order
+    """
+
+    def ranked() -> Iterator[Tuple[float, bytes, Url, UrlStats]]:
+        for url, url_stats in log_data.items():
+            time_sum = url_stats.time_sum
+            if time_sums is not None:
+                time_sums.append(time_sum)
+            yield -time_sum, encode_url(url), url, url_stats
+
+    # bounded selection instead of sorting the whole URL table. Ties are ordered by URL rather than by the order
+    # URLs were merged in, which differs for spilled aggregates
+    return [(url, url_stats) for _, _, url, url_stats in heapq.nsmallest(report_size, ranked())]
+
+
+def get_report_columns(
+    log_data: LogAggregator, report_size: int, engine: str = "auto"
+) -> Tuple[List[UrlStats], Dict[str, List]]:
+    """
+    Select URLs with the largest total request time and compute rounded report columns for them
+    :param log_data: Aggregate of parsed data
+    :param report_size: The max number of URLs to select
+    :param engine: "numpy" (vectorized), "python" or "auto": NumPy if it is installed and there are
+        at least AUTO_MIN_URLS URLs
+    :return: Stats of selected URLs in descending order of total time and report columns in the same order
+    """
+    # spilled stats are merged from disk one URL at a time, only the bounded selection below keeps memory bounded
+    if log_data.spilled is None and numpy_available():
+        if engine == "numpy" or (engine == "auto" and len(log_data.urls) >= AUTO_MIN_URLS):
+            return report_columns(log_data, report_size)
+    time_sums = array("d")
+    top_urls = get_top_urls(log_data, report_size, time_sums)
+    # unlike the running total of the aggregate, it does not depend on how the log was split between workers
+    total_time = math.fsum(time_sums)
+    total_count = log_data.total_count
+    stats = [url_stats for _, url_stats in top_urls]
+    return stats, {
+        "url": [decode_url(url) for url, _ in top_urls],
+        "count": [url_stats.count for url_stats in stats],
+        "time_avg": [url_stats.round_time_avg() for url_stats in stats],
+        "time_max": [round(url_stats.time_max, 3) for url_stats in stats],
+        "time_sum": [round(url_stats.time_sum, 3) for url_stats in stats],
+        "time_med": [round(url_stats.time_med, 3) for url_stats in stats],
+        "time_perc": [round(100 * url_stats.time_sum / total_time, 3) for url_stats in stats],
+        "count_perc": [round(100 * url_stats.count / total_count, 3) for url_stats in stats],
+    }
+
+
+def create_log_stats(
+    log_data: LogAggregator, report_size: int = 0, percentiles: Sequence[float] = (), engine: str = "auto"
+) -> List[Dict]:
     """
     Generate lag statistics to populate the outcome report
-    :param log_data: Dictionary of parsed data
+    :param log_data: Aggregate of parsed data
     :param report_size: The max number of requests to report about
-    :return: Dictionary with log statistics
+    :param percentiles: Percentiles to report as time_p<N> columns, the aggregate must collect histograms
+    :param engine: Engine computing the columns: "auto", "numpy" or "python", all give the same result
+    :return: Dictionary with log statistics, times and percents are rounded to 3 digits.
+        With histograms collected time_hist column holds latency histogram counts,
+        with timelines collected time_trend column holds average request time per time bucket of the day
     """
     if not log_data:
         return []
-    url_count = []
-    total_time = 0
-    total_count = 0
-    for url, data in log_data.items():
-        url_count.append((url, sum(data)))
-        total_time += sum(data)
-        total_count += len(data)
-    url_count = sorted(url_count, key=lambda x: x[1], reverse=True)
-    log_stats = []
-    for url, time_sum in url_count[:report_size]:
-        url_data = sorted(log_data[url])
-        report_entity = {
-            "count": len(url_data),
-            "time_avg": f"{mean(url_data):.3f}",
-            "time_max": f"{max(url_data):.3f}",
-            "time_sum": f"{time_sum:.3f}",
+    stats, columns = get_report_columns(log_data, report_size, engine)
+    log_stats = [
+        {
+            "count": count,
+            "time_avg": time_avg,
+            "time_max": time_max,
+            "time_sum": time_sum,
             "url": url,
-            "time_med": f"{median(url_data):.3f}",
-            "time_perc": f"{100*time_sum / total_time:.3f}",
-            "count_perc": f"{100*len(url_data) / total_count:.3f}",
+            "time_med": time_med,
+            "time_perc": time_perc,
+            "count_perc": count_perc,
         }
-        log_stats.append(report_entity)
+        for url, count, time_avg, time_max, time_sum, time_med, time_perc, count_perc in zip(
+            columns["url"],
+            columns["count"],
+            columns["time_avg"],
+            columns["time_max"],
+            columns["time_sum"],
+            columns["time_med"],
+            columns["time_perc"],
+            columns["count_perc"],
+        )
+    ]
+    if not percentiles and not log_data.histogram and not log_data.time_bucket:
+        return log_stats
+    buckets_per_day = -(-MINUTES_PER_DAY // log_data.time_bucket) if log_data.time_bucket else 0
+    for report_entity, url_stats in zip(log_stats, stats):
+        for percentile in percentiles:
+            report_entity[f"time_p{percentile:g}"] = round(url_stats.time_quantile(percentile / 100), 3)
+        if url_stats.histogram is not None:
+            report_entity["time_hist"] = url_stats.histogram
+        if url_stats.timeline is not None:
+            time_trend = [0.0] * buckets_per_day
+            for time_bucket, (count, time_sum) in url_stats.timeline.items():
+                if 0 <= time_bucket < buckets_per_day:
+                    time_trend[time_bucket] = round(time_sum / count, 3)
+            report_entity["time_trend"] = time_trend
     return log_stats
 
 
-def generate_report(report_dir, log_date, log_stats: List[Dict]) -> None:
+def _json_dumps(value: Any) -> str:
+    """
+    Compact JSON safe to embed into <script> tag
+    :param value: Value to serialize
+    :return: JSON string
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).replace("<", "\\u003c")
+
+
+def write_report_table(file: TextIO, log_stats: List[Dict], report_format: str = "rows") -> None:
     """
-    Generate report from log stats
+    Serialize log stats as JSON into opened file row by row (or column by column)
+    :param file: File to write to
+    :param log_stats: Log statistics
+    :param report_format: "rows" for array of objects, "columnar" for object of column arrays
+    :return: None
+    """
+    if report_format == "columnar":
+        columns = list(log_stats[0]) if log_stats else []
+        file.write('{"columns":')
+        file.write(_json_dumps(columns))
+        file.write(',"data":{')
+        for i, column in enumerate(columns):
+            file.write("," if i else "")
+            file.write(_json_dumps(column))
+            file.write(":[")
+            file.write(",".join(_json_dumps(row[column]) for row in log_stats))
+            file.write("]")
+        file.write("}}")
+        return
+    file.write("[")
+    for i, row in enumerate(log_stats):
+        file.write(",\n" if i else "")
+        file.write(_json_dumps(row))
+    file.write("]")
+
+
+def write_report_pages(pages_dir: pathlib.Path, log_stats: List[Dict], page_size: int) -> Dict[str, Any]:
+    """
+    Write log stats as chunks loaded by the paged report on demand. Every chunk is a script
+    calling reportPage(number, rows), so the report works when opened from disk as well
+    :param pages_dir: Folder to write chunks to
+    :param log_stats: Log statistics
+    :param page_size: Number of rows per chunk
+    :return: Report description to embed into the paged template
+    """
+    columns = list(log_stats[0])
+    pages = []
+    for page_number, start in enumerate(range(0, len(log_stats), page_size)):
+        page_fname = pages_dir / f"page-{page_number:05d}.js"
+        with open(page_fname, "w", encoding="UTF-8") as file:
+            file.write(f"reportPage({page_number},[")
+            for i, row in enumerate(log_stats[start : start + page_size]):
+                file.write(",\n" if i else "")
+                file.write(_json_dumps([row[column] for column in columns]))
+            file.write("]);\n")
+        pages.append(f"{pages_dir.name.removesuffix('.tmp')}/{page_fname.name}")
+    return {"columns": columns, "total": len(log_stats), "page_size": page_size, "pages": pages}
+
+
+def generate_report(
+    report_dir, log_date, log_stats: List[Dict], report_format: str = "rows", page_size: int = 1000
+) -> None:
+    """
+    Generate report from log stats. The template is streamed to the report with
+    stats serialized as JSON in place of $table_json placeholder. In "paged" format stats
+    are written as chunks into report-<date>.pages folder next to the report
     :param report_dir: Path to folder to save the report to
     :param log_date: Log date for report file name generation
     :param log_stats: Log statistics
+    :param report_format: Layout of JSON table: "rows", "columnar" or "paged"
+    :param page_size: Number of rows per chunk for "paged" format
     :return: None
     """
     if not log_date or not log_stats:
@@ -224,18 +1177,71 @@ def generate_report(report_dir, log_date, log_stats: List[Dict]) -> None:
         os.makedirs(report_dir, exist_ok=True)
     scrip_dir = pathlib.Path(os.path.dirname(os.path.relpath(__file__)))
     report_fname = report_dir / f"report-{log_date}.html.tmp"
-    shutil.copyfile(scrip_dir / "report-template.html", report_fname)
-    with open(report_fname, encoding="UTF-8") as file:
-        data = file.read()
-        data = data.replace("var table = $table_json;", f"var table = {log_stats!r};")
+    template_name = "report-template-paged.html" if report_format == "paged" else "report-template.html"
+    with open(scrip_dir / template_name, encoding="UTF-8") as template:
+        prefix, _, suffix = template.read().partition(TABLE_PLACEHOLDER)
+
+    if report_format == "paged":
+        pages_dir = report_dir / f"report-{log_date}.pages"
+        tmp_pages_dir = pages_dir.with_name(pages_dir.name + ".tmp")
+        shutil.rmtree(tmp_pages_dir, ignore_errors=True)
+        os.makedirs(tmp_pages_dir)
+        report_description = write_report_pages(tmp_pages_dir, log_stats, page_size)
+        shutil.rmtree(pages_dir, ignore_errors=True)
+        os.rename(tmp_pages_dir, pages_dir)
+
     with open(report_fname, "w", encoding="UTF-8") as file:
-        file.write(data)
+        file.write(prefix)
+        if report_format == "paged":
+            file.write(_json_dumps(report_description))
+        else:
+            write_report_table(file, log_stats, report_format)
+        file.write(suffix)
 
     final_report_fname = report_fname.parent / report_fname.stem
     os.rename(report_fname, final_report_fname)
     logger.info("Generated report: %s", str(final_report_fname))
 
 
+def save_time_series(report_dir: pathlib.Path, log_date: str, log_data: LogAggregator, report_size: int) -> None:
+    """
+    Atomically save timelines of reported URLs next to the report as compact JSON:
+    {"time_bucket": minutes, "urls": {url: {"bucket": [...], "count": [...], "time_sum": [...]}}},
+    only buckets with requests are listed
+    :param report_dir: Path to folder with reports
+    :param log_date: Log date for file name generation
+    :param log_data: Aggregate of parsed data with timelines
+    :param report_size: The max number of URLs to save
+    :return: None
+    """
+    if not log_date or not log_data or not log_data.time_bucket:
+        return
+    urls = {}
+    for url, url_stats in get_top_urls(log_data, report_size):
+        timeline = sorted(url_stats.timeline.items())  # type: ignore[union-attr]
+        urls[decode_url(url)] = {
+            "bucket": [time_bucket for time_bucket, _ in timeline],
+            "count": [count for _, (count, _) in timeline],
+            "time_sum": [round(time_sum, 3) for _, (_, time_sum) in timeline],
+        }
+    os.makedirs(report_dir, exist_ok=True)
+    final_fname = report_dir / f"report-{log_date}{TIME_SERIES_SUFFIX}"
+    tmp_fname = final_fname.with_name(final_fname.name + ".tmp")
+    with open(tmp_fname, "w", encoding="UTF-8") as file:
+        file.write(_json_dumps({"time_bucket": log_data.time_bucket, "urls": urls}))
+    os.replace(tmp_fname, final_fname)
+
+
+def parse_checkpoint_path(updated_config: Dict, log_file: pathlib.Path) -> pathlib.Path:
+    """
+    Path to the checkpoint of a log file parse
+    :param updated_config: Script config
+    :param log_file: Path to log file
+    :return: Path to checkpoint file in the report folder
+    """
+    return pathlib.Path(updated_config["REPORT_DIR"]) / f"{PARSE_CHECKPOINT_PREFIX}{log_file.name}"
+
+
 def report_file_exists(report_dir: pathlib.Path, log_date: str | None) -> bool:
     """
     Check if report file already exists
@@ -249,20 +1255,589 @@ def report_file_exists(report_dir: pathlib.Path, log_date: str | None) -> bool:
     return maybe_report_fname.exists()
 
 
-def main(default_config: Dict):
+def sidecar_path(report_dir: pathlib.Path, log_date: str) -> pathlib.Path:
     """
-    Main function to execute
-    :param default_config: Defatul config for the scrit
+    Path to the file with the day aggregate saved next to the day report
+    :param report_dir: Path to folder with reports
+    :param log_date: Log date
+    :return: Path to the aggregate file
+    """
+    return report_dir / f"report-{log_date}{SIDECAR_SUFFIX}"
+
+
+def save_day_aggregate(
+    report_dir: pathlib.Path, log_date: str, aggregator: LogAggregator, relative_accuracy: float
+) -> None:
+    """
+    Atomically save day aggregate next to the day report. Only count, sum, max and a quantile sketch of every URL
+    are saved, request times kept for exact medians are not: range reports have approximate medians
+    :param report_dir: Path to folder with reports
+    :param log_date: Log date
+    :param aggregator: Aggregate of the day log
+    :param relative_accuracy: Accuracy of the sketches, from get_rollup_accuracy
     :return: None
     """
-    args = parse_args()
-    updated_config = update_config(default_config, args.config)
-    # pylint: disable=global-statement
-    global logger
-    logger = configure_logger(updated_config.get("LOG_FILE", None))
-    log_file, log_date = get_log_file_and_date(
-        pathlib.Path(updated_config.get("LOG_DIR", None))
+    if not log_date or not aggregator:
+        return
+    os.makedirs(report_dir, exist_ok=True)
+    final_fname = sidecar_path(report_dir, log_date)
+    tmp_fname = final_fname.with_name(final_fname.name + ".tmp")
+    with gzip.open(tmp_fname, "wb", compresslevel=6) as file:
+        aggregator.to_sketch(relative_accuracy).dump(file)  # type: ignore[arg-type]
+    os.replace(tmp_fname, final_fname)
+
+
+def load_day_aggregate(report_dir: pathlib.Path, log_date: str) -> LogAggregator | None:
+    """
+    Load day aggregate saved by save_day_aggregate
+    :param report_dir: Path to folder with reports
+    :param log_date: Log date
+    :return: Aggregate of the day log, None if it wasn't saved or can't be read
+    """
+    fname = sidecar_path(report_dir, log_date)
+    if not fname.exists():
+        return None
+    try:
+        with gzip.open(fname, "rb") as file:
+            return LogAggregator.load(file)  # type: ignore[arg-type]
+    except (OSError, EOFError, ValueError) as e:
+        logger.warning("Cannot read aggregate %s, exception: %s", str(fname), str(e))
+        return None
+
+
+def find_log_file(log_dir: pathlib.Path, date: datetime.date, log_index: LogIndex | None = None) -> pathlib.Path | None:
+    """
+    Find rotated log file of the date
+    :param log_dir: Path to folder with log files
+    :param date: Log date
+    :param log_index: Refreshed index of the folder, file names are probed if not set
+    :return: Path to the log file, None if there is no log for the date
+    """
+    if log_index is not None:
+        entry = log_index.get(f"{date:%Y.%m.%d}")
+        return log_index.path(entry) if entry is not None else None
+    fname = log_dir / f"{LIVE_LOG_NAME}-{date:%Y%m%d}"
+    for candidate in (fname, fname.with_name(fname.name + ".gz")):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def parse_date_range(value: str) -> Tuple[datetime.date, datetime.date]:
+    """
+    Parse date range argument
+    :param value: Range in YYYY.MM.DD:YYYY.MM.DD format
+    :return: First and last dates of the range
+    """
+    try:
+        date_from, date_to = (datetime.datetime.strptime(date, "%Y.%m.%d").date() for date in value.split(":"))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"Expected YYYY.MM.DD:YYYY.MM.DD, got '{value}'") from e
+    if date_from > date_to:
+        raise argparse.ArgumentTypeError(f"Range start is after its end: '{value}'")
+    return date_from, date_to
+
+
+def run_range(
+    updated_config: Dict,
+    date_range: Tuple[datetime.date, datetime.date],
+    workers: int = 1,
+    metrics: RunMetrics | None = None,
+) -> None:
+    """
+    Generate report for a range of days. Saved day aggregates are reused, only days
+    without one are parsed (and their aggregates are saved for the next time). Medians are approximate
+    (MEDIAN_ACCURACY) even with exact ones configured, so memory does not grow with the number of requests
+    :param updated_config: Script config
+    :param date_range: First and last dates of the range
+    :param workers: Number of processes to parse a log file with
+    :param metrics: Run metrics to account parsed logs and phases in
+    :return: None
+    """
+    metrics = metrics or RunMetrics("range")
+    log_dir = pathlib.Path(updated_config["LOG_DIR"])
+    report_dir = pathlib.Path(updated_config["REPORT_DIR"])
+    rollup_accuracy = get_rollup_accuracy(updated_config)
+    settings = replace(ParseSettings.from_config(updated_config), relative_accuracy=rollup_accuracy)
+    date_from, date_to = date_range
+
+    aggregator = settings.new_aggregator()
+    with metrics.phase("discover"):
+        log_index = open_log_index(updated_config)
+    date = date_from
+    while date <= date_to:
+        log_date = f"{date:%Y.%m.%d}"
+        with metrics.phase("discover"):
+            day_aggregator = load_day_aggregate(report_dir, log_date)
+            if day_aggregator is not None and not day_aggregator.same_settings(aggregator):
+                logger.info("Aggregate for %s was built with other median, histogram or URL settings", log_date)
+                day_aggregator = None
+            log_file = find_log_file(log_dir, date, log_index) if day_aggregator is None else None
+        if day_aggregator is None:
+            if log_file is None:
+                logger.warning("No log file and no aggregate for %s, skipping the day", log_date)
+            else:
+                logger.info("Parsing log file %s", str(log_file))
+                with metrics.phase("parse"):
+                    day_aggregator = parse_logs(
+                        log_file, workers, settings, parse_checkpoint_path(updated_config, log_file)
+                    )
+                metrics.add_parsed(
+                    day_aggregator.lines_count, day_aggregator.failed_line_count, os.path.getsize(log_file)
+                )
+                metrics.observe_aggregate(day_aggregator)
+                with metrics.phase("render"):
+                    save_day_aggregate(report_dir, log_date, day_aggregator, rollup_accuracy)
+        if day_aggregator is not None:
+            with metrics.phase("aggregate"):
+                aggregator.merge(day_aggregator)
+        date += datetime.timedelta(days=1)
+
+    metrics.observe_aggregate(aggregator)
+    with metrics.phase("aggregate"):
+        log_stats = create_log_stats(aggregator, updated_config["REPORT_SIZE"], updated_config.get("PERCENTILES", []))
+    with metrics.phase("render"):
+        generate_report(
+            report_dir,
+            f"{date_from:%Y.%m.%d}-{date_to:%Y.%m.%d}",
+            log_stats,
+            updated_config.get("REPORT_FORMAT", "rows"),
+            updated_config.get("REPORT_PAGE_SIZE", 1000),
+        )
+        save_time_series(
+            report_dir, f"{date_from:%Y.%m.%d}-{date_to:%Y.%m.%d}", aggregator, updated_config["REPORT_SIZE"]
+        )
+
+
+def finish_rotated_log(
+    updated_config: Dict, checkpoint: Checkpoint, settings: ParseSettings, metrics: RunMetrics
+) -> None:
+    """
+    Parse the rest of the live log rotated since the previous incremental run and finalize its report, as run_watch
+    does with its open handle. The rotated file is found by the checkpoint inode among rotated logs, the newest first
+    :param updated_config: Script config
+    :param checkpoint: Checkpoint of the live log before the rotation, its offset is advanced
+    :param settings: Parse settings
+    :param metrics: Run metrics to account parsed lines and phases in
+    :return: None
+    """
+    with metrics.phase("discover"):
+        log_index = open_log_index(updated_config)
+        for entry in sorted(log_index.entries.values(), key=lambda entry: entry.name, reverse=True):
+            rotated_file = log_index.path(entry)
+            try:
+                stat = os.stat(rotated_file)
+            except OSError:
+                continue
+            if stat.st_ino == checkpoint.inode and stat.st_size >= checkpoint.offset:
+                break
+        else:
+            logger.warning(
+                "Rotated log %s is not found, report for %s misses lines written after the previous run",
+                checkpoint.log_file,
+                checkpoint.log_date,
+            )
+            return
+    start_offset = checkpoint.offset
+    lines_count, failed_line_count = checkpoint.aggregator.lines_count, checkpoint.aggregator.failed_line_count
+    with metrics.phase("parse"):
+        checkpoint.offset = parse_log_tail(rotated_file, start_offset, checkpoint.aggregator, settings)
+    log_parse_errors(checkpoint.aggregator)
+    metrics.observe_aggregate(checkpoint.aggregator)
+    metrics.add_parsed(
+        checkpoint.aggregator.lines_count - lines_count,
+        checkpoint.aggregator.failed_line_count - failed_line_count,
+        checkpoint.offset - start_offset,
+    )
+    logger.info("Log was rotated to %s, finalizing report for %s", str(rotated_file), checkpoint.log_date)
+    render_report(updated_config, checkpoint.log_date, checkpoint.aggregator, metrics)
+
+
+def run_incremental(updated_config: Dict, metrics: RunMetrics | None = None) -> None:
+    """
+    Parse bytes appended to the live log since the previous run and regenerate its report.
+    Aggregate and position in the log are kept in a checkpoint file between runs. If the log was rotated since then,
+    the rest of the rotated file is parsed and its report is finalized before the new log is parsed from the start
+    :param updated_config: Script config
+    :param metrics: Run metrics to account parsed lines and phases in
+    :return: None
+    """
+    metrics = metrics or RunMetrics("incremental")
+    log_file = pathlib.Path(updated_config["LOG_DIR"]) / LIVE_LOG_NAME
+    report_dir = pathlib.Path(updated_config["REPORT_DIR"])
+    checkpoint_file = pathlib.Path(updated_config.get("CHECKPOINT_FILE", report_dir / CHECKPOINT_NAME))
+    settings = ParseSettings.from_config(updated_config)
+    if not log_file.exists():
+        logger.error("Live log file %s does not exist", str(log_file))
+        return
+
+    with metrics.phase("discover"):
+        checkpoint = load_checkpoint(checkpoint_file)
+    if (
+        checkpoint is not None
+        and checkpoint.log_file == str(log_file)
+        and checkpoint.inode != os.stat(log_file).st_ino
+        and checkpoint.aggregator.same_settings(settings.new_aggregator(spill=False))
+    ):
+        finish_rotated_log(updated_config, checkpoint, settings, metrics)
+    if checkpoint is None or not checkpoint.matches(
+        log_file, settings.relative_accuracy, settings.histogram, settings.time_bucket, settings.url_settings()
+    ):
+        logger.info("No checkpoint for %s, parsing from the beginning", str(log_file))
+        checkpoint = Checkpoint(
+            log_file=str(log_file),
+            inode=os.stat(log_file).st_ino,
+            offset=0,
+            log_date=datetime.date.today().strftime("%Y.%m.%d"),
+            aggregator=settings.new_aggregator(),
+        )
+    settings.limit_memory(checkpoint.aggregator)
+
+    start_offset = checkpoint.offset
+    lines_count, failed_line_count = checkpoint.aggregator.lines_count, checkpoint.aggregator.failed_line_count
+    with metrics.phase("parse"):
+        checkpoint.offset = parse_log_tail(log_file, start_offset, checkpoint.aggregator, settings)
+    log_parse_errors(checkpoint.aggregator)
+    metrics.observe_aggregate(checkpoint.aggregator)
+    metrics.add_parsed(
+        checkpoint.aggregator.lines_count - lines_count,
+        checkpoint.aggregator.failed_line_count - failed_line_count,
+        checkpoint.offset - start_offset,
+    )
+    logger.info("Parsed %d new bytes of %s", checkpoint.offset - start_offset, str(log_file))
+    save_checkpoint(checkpoint_file, checkpoint)
+
+    render_report(updated_config, checkpoint.log_date, checkpoint.aggregator, metrics)
+
+
+def render_report(updated_config: Dict, log_date: str, aggregator: LogAggregator, metrics: RunMetrics) -> None:
+    """
+    Generate report and time series of the aggregate
+    :param updated_config: Script config
+    :param log_date: Log date for report file name generation
+    :param aggregator: Aggregate of parsed data
+    :param metrics: Run metrics to account phases in
+    :return: None
+    """
+    report_dir = pathlib.Path(updated_config["REPORT_DIR"])
+    with metrics.phase("aggregate"):
+        log_stats = create_log_stats(aggregator, updated_config["REPORT_SIZE"], updated_config.get("PERCENTILES", []))
+    with metrics.phase("render"):
+        generate_report(
+            report_dir,
+            log_date,
+            log_stats,
+            updated_config.get("REPORT_FORMAT", "rows"),
+            updated_config.get("REPORT_PAGE_SIZE", 1000),
+        )
+        save_time_series(report_dir, log_date, aggregator, updated_config["REPORT_SIZE"])
+
+
+def follow_live_log(
+    follower: LogFollower, checkpoint: Checkpoint, settings: ParseSettings, metrics: RunMetrics
+) -> None:
+    """
+    Parse lines appended to the followed log into the checkpoint aggregate
+    :param follower: Follower of the live log
+    :param checkpoint: Checkpoint of the followed log, its offset is advanced
+    :param settings: Parse settings
+    :param metrics: Run metrics to account parsed lines in
+    :return: None
+    """
+    aggregator = checkpoint.aggregator
+    start_offset = checkpoint.offset
+    lines_count, failed_line_count = aggregator.lines_count, aggregator.failed_line_count
+    with metrics.phase("parse"):
+        settings.parse_blocks(follower.read_line_blocks(), aggregator)
+    checkpoint.offset = follower.offset
+    metrics.add_parsed(
+        aggregator.lines_count - lines_count,
+        aggregator.failed_line_count - failed_line_count,
+        checkpoint.offset - start_offset,
+    )
+
+
+def run_watch(updated_config: Dict, metrics: RunMetrics | None = None, stop: threading.Event | None = None) -> None:
+    """
+    Follow the live log and rewrite its report every WATCH_REPORT_INTERVAL seconds. The aggregate stays
+    in memory and only appended lines are parsed. When the log is rotated (inode changed or file truncated)
+    the rest of the rotated file is parsed from the open handle, its report is finalized and the new log
+    is followed from the beginning. The checkpoint is saved with every report, so a restarted daemon
+    (or an --incremental run) continues where it stopped
+    :param updated_config: Script config
+    :param metrics: Run metrics to account parsed lines and phases in
+    :param stop: Event to stop following, the final report is written before returning
+    :return: None
+    """
+    metrics = metrics or RunMetrics("watch")
+    stop = stop or threading.Event()
+    log_dir = pathlib.Path(updated_config["LOG_DIR"])
+    log_file = log_dir / LIVE_LOG_NAME
+    report_dir = pathlib.Path(updated_config["REPORT_DIR"])
+    checkpoint_file = pathlib.Path(updated_config.get("CHECKPOINT_FILE", report_dir / CHECKPOINT_NAME))
+    settings = ParseSettings.from_config(updated_config)
+    report_interval = float(updated_config.get("WATCH_REPORT_INTERVAL", 60))
+    watcher = create_watcher(
+        log_dir, float(updated_config.get("WATCH_POLL_INTERVAL", 1.0)), updated_config.get("WATCH_INOTIFY", True)
+    )
+    logger.info("Following %s with %s", str(log_file), type(watcher).__name__)
+
+    def write_report(checkpoint: Checkpoint) -> None:
+        log_parse_errors(checkpoint.aggregator)
+        metrics.observe_aggregate(checkpoint.aggregator)
+        save_checkpoint(checkpoint_file, checkpoint)
+        render_report(updated_config, checkpoint.log_date, checkpoint.aggregator, metrics)
+        emit_run_metrics(updated_config, metrics)
+
+    checkpoint = load_checkpoint(checkpoint_file)
+    follower: LogFollower | None = None
+    next_report = time.monotonic() + report_interval
+    try:
+        while not stop.is_set():
+            if follower is None and log_file.exists():
+                if checkpoint is None or not checkpoint.matches(
+                    log_file,
+                    settings.relative_accuracy,
+                    settings.histogram,
+                    settings.time_bucket,
+                    settings.url_settings(),
+                ):
+                    checkpoint = Checkpoint(
+                        log_file=str(log_file),
+                        inode=0,
+                        offset=0,
+                        log_date=datetime.date.today().strftime("%Y.%m.%d"),
+                        aggregator=settings.new_aggregator(),
+                    )
+                follower = LogFollower(log_file, checkpoint.offset)
+                checkpoint.inode = follower.inode
+            if follower is not None and checkpoint is not None:
+                follow_live_log(follower, checkpoint, settings, metrics)
+                if follower.rotated():
+                    # lines written before the rotation was noticed are still readable from the open handle
+                    follow_live_log(follower, checkpoint, settings, metrics)
+                    logger.info("Log %s was rotated, finalizing report for %s", str(log_file), checkpoint.log_date)
+                    write_report(checkpoint)
+                    follower.close()
+                    follower, checkpoint = None, None
+                    continue
+            if time.monotonic() >= next_report:
+                if follower is not None and checkpoint is not None:
+                    write_report(checkpoint)
+                next_report = time.monotonic() + report_interval
+            watcher.wait(next_report - time.monotonic())
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    finally:
+        if follower is not None and checkpoint is not None:
+            follow_live_log(follower, checkpoint, settings, metrics)
+            write_report(checkpoint)
+            follower.close()
+        watcher.close()
+
+
+@dataclass
+class BackfillResult:
+    """
+    Outcome of processing a single log file of the backlog
+    """
+
+    log_file: str
+    log_date: str
+    lines_read: int
+    lines_failed: int
+    bytes_read: int
+    seconds: float
+
+    @property
+    def lines_per_second(self) -> float:
+        """
+        Parse and render throughput
+        """
+        return self.lines_read / self.seconds if self.seconds else 0.0
+
+
+def find_backlog(
+    log_dir: pathlib.Path, report_dir: pathlib.Path, log_index: LogIndex | None = None
+) -> List[Tuple[pathlib.Path, str]]:
+    """
+    Find every rotated log file without a report
+    :param log_dir: Path to folder with log files
+    :param report_dir: Path to folder with reports
+    :param log_index: Refreshed index of the folder, the folder is scanned if not set
+    :return: List of (log file, log date) ordered by date
+    """
+    if log_index is None:
+        log_index = LogIndex(log_dir)
+        refresh_log_index(log_index)
+    return [
+        (log_index.path(entry), entry.log_date)
+        for entry in log_index.unprocessed()
+        if not report_file_exists(report_dir, entry.log_date)
+    ]
+
+
+def _backfill_day(log_file: pathlib.Path, log_date: str, updated_config: Dict) -> BackfillResult:
+    """
+    Parse a log file of the backlog, save its day aggregate and render its report. Runs in a worker process,
+    so only the small result is sent back, not the aggregate
+    :param log_file: Path to log file
+    :param log_date: Log date
+    :param updated_config: Script config
+    :return: Processing result
+    """
+    start = time.perf_counter()
+    log_data = parse_logs(
+        log_file,
+        1,
+        ParseSettings.from_config(updated_config),
+        parse_checkpoint_path(updated_config, log_file),
+    )
+    save_day_aggregate(
+        pathlib.Path(updated_config["REPORT_DIR"]), log_date, log_data, get_rollup_accuracy(updated_config)
+    )
+    render_report(updated_config, log_date, log_data, RunMetrics("backfill"))
+    return BackfillResult(
+        log_file=str(log_file),
+        log_date=log_date,
+        lines_read=log_data.lines_count,
+        lines_failed=log_data.failed_line_count,
+        bytes_read=os.path.getsize(log_file),
+        seconds=time.perf_counter() - start,
     )
+
+
+def print_backfill_summary(results: List[BackfillResult], wall_seconds: float) -> None:
+    """
+    Print throughput per processed file
+    :param results: Processing results
+    :param wall_seconds: Wall time of the whole backfill
+    :return: None
+    """
+    print(f"{'log file':<40} {'lines':>12} {'failed':>8} {'MB':>10} {'seconds':>9} {'lines/sec':>12}")
+    for result in sorted(results, key=lambda x: x.log_date):
+        print(
+            f"{os.path.basename(result.log_file):<40} {result.lines_read:>12,} {result.lines_failed:>8,} "
+            f"{result.bytes_read / 2**20:>10.1f} {result.seconds:>9.2f} {result.lines_per_second:>12,.0f}"
+        )
+    lines_read = sum(result.lines_read for result in results)
+    print(
+        f"{'total':<40} {lines_read:>12,} {sum(result.lines_failed for result in results):>8,} "
+        f"{sum(result.bytes_read for result in results) / 2**20:>10.1f} {wall_seconds:>9.2f} "
+        f"{lines_read / wall_seconds if wall_seconds else 0.0:>12,.0f}"
+    )
+
+
+def run_backfill(updated_config: Dict, workers: int = 1, metrics: RunMetrics | None = None) -> List[BackfillResult]:
+    """
+    Generate reports for every rotated log without one. Log files are processed concurrently, one per
+    worker process; no more than `workers` files are in flight, so at most that many day aggregates are in memory
+    :param updated_config: Script config
+    :param workers: Number of processes
+    :param metrics: Run metrics to account parsed logs and phases in
+    :return: Processing results in order of completion
+    """
+    metrics = metrics or RunMetrics("backfill")
+    with metrics.phase("discover"):
+        log_index = open_log_index(updated_config)
+        backlog = find_backlog(log_index.log_dir, pathlib.Path(updated_config["REPORT_DIR"]), log_index)
+    logger.info("Found %d log files without reports", len(backlog))
+    results: List[BackfillResult] = []
+    start = time.perf_counter()
+    with metrics.phase("parse"):
+        if workers <= 1:
+            for log_file, log_date in backlog:
+                try:
+                    results.append(_backfill_day(log_file, log_date, updated_config))
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    logger.error("Failed to process log file %s, exception: %s", str(log_file), str(e))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = iter(backlog)
+                in_flight: Dict[Future, pathlib.Path] = {}
+                while True:
+                    for log_file, log_date in itertools.islice(pending, workers - len(in_flight)):
+                        in_flight[executor.submit(_backfill_day, log_file, log_date, updated_config)] = log_file
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        log_file = in_flight.pop(future)
+                        try:
+                            results.append(future.result())
+                        except Exception as e:  # pylint: disable=broad-exception-caught
+                            logger.error("Failed to process log file %s, exception: %s", str(log_file), str(e))
+    for result in results:
+        metrics.add_parsed(result.lines_read, result.lines_failed, result.bytes_read)
+        log_index.mark_processed(result.log_date)
+        logger.info("Processed log file", **asdict(result))
+    save_log_index(log_index)
+    print_backfill_summary(results, time.perf_counter() - start)
+    return results
+
+
+def run_export_columnar(updated_config: Dict, columnar_file: pathlib.Path, metrics: RunMetrics | None = None) -> None:
+    """
+    Export records of the latest rotated log to columnar file
+    :param updated_config: Script config
+    :param columnar_file: Path to columnar file
+    :param metrics: Run metrics to account parsed lines and phases in
+    :return: None
+    """
+    metrics = metrics or RunMetrics("export")
+    if updated_config.get("LOG_FORMAT"):
+        # columnar files keep all ui_short fields, a custom format may not have them
+        logger.error("Columnar export supports ui_short logs only, LOG_FORMAT must not be set")
+        return
+    with metrics.phase("discover"):
+        log_index = open_log_index(updated_config)
+        log_file, log_date = get_log_file_and_date(log_index.log_dir, log_index)
+    if not log_date or not log_file.exists():
+        logger.error("The log dir '%s' does not contain any log file", updated_config["LOG_DIR"])
+        return
+    with metrics.phase("parse"):
+        lines_count, failed_line_count = export_columnar(
+            log_file, columnar_file, log_date, ParseSettings.from_config(updated_config)
+        )
+    metrics.add_parsed(lines_count, failed_line_count, os.path.getsize(log_file))
+    logger.info("Exported %s to %s", str(log_file), str(columnar_file))
+
+
+def run_columnar_report(updated_config: Dict, columnar_file: pathlib.Path, metrics: RunMetrics | None = None) -> None:
+    """
+    Generate report from columnar file instead of the raw log
+    :param updated_config: Script config
+    :param columnar_file: Path to columnar file written by --export-columnar
+    :param metrics: Run metrics to account parsed records and phases in
+    :return: None
+    """
+    metrics = metrics or RunMetrics("columnar")
+    with metrics.phase("parse"):
+        try:
+            log_date, log_data = parse_columnar(columnar_file, ParseSettings.from_config(updated_config))
+        except (OSError, ValueError) as e:
+            logger.error("Cannot read columnar file %s, exception: %s", str(columnar_file), str(e))
+            return
+    metrics.add_parsed(log_data.lines_count, 0, os.path.getsize(columnar_file))
+    metrics.observe_aggregate(log_data)
+    render_report(updated_config, log_date, log_data, metrics)
+    save_day_aggregate(
+        pathlib.Path(updated_config["REPORT_DIR"]), log_date, log_data, get_rollup_accuracy(updated_config)
+    )
+
+
+def run_daily(updated_config: Dict, workers: int = 1, metrics: RunMetrics | None = None) -> None:
+    """
+    Generate report for the latest rotated log unless it was already generated
+    :param updated_config: Script config
+    :param workers: Number of processes to parse the log file with
+    :param metrics: Run metrics to account parsed lines and phases in
+    :return: None
+    """
+    metrics = metrics or RunMetrics("daily")
+    with metrics.phase("discover"):
+        log_index = open_log_index(updated_config)
+        log_file, log_date = get_log_file_and_date(pathlib.Path(updated_config.get("LOG_DIR", None)), log_index)
     if not log_date or not log_file.exists():
         logger.error(
             "The log dir '%s' does not exist or does not contain any log file",
@@ -274,9 +1849,105 @@ def main(default_config: Dict):
     ):
         logger.info("Log file %s was already parsed. Nothing to do", str(log_file))
         return
-    log_data = parse_logs(log_file)
-    log_stats = create_log_stats(log_data, updated_config["REPORT_SIZE"])
-    generate_report(pathlib.Path(updated_config["REPORT_DIR"]), log_date, log_stats)
+    with metrics.phase("parse"):
+        log_data = parse_logs(
+            log_file,
+            workers,
+            ParseSettings.from_config(updated_config),
+            parse_checkpoint_path(updated_config, log_file),
+        )
+    metrics.add_parsed(log_data.lines_count, log_data.failed_line_count, os.path.getsize(log_file))
+    metrics.observe_aggregate(log_data)
+    with metrics.phase("aggregate"):
+        log_stats = create_log_stats(log_data, updated_config["REPORT_SIZE"], updated_config.get("PERCENTILES", []))
+    with metrics.phase("render"):
+        save_day_aggregate(
+            pathlib.Path(updated_config["REPORT_DIR"]), log_date, log_data, get_rollup_accuracy(updated_config)
+        )
+        generate_report(
+            pathlib.Path(updated_config["REPORT_DIR"]),
+            log_date,
+            log_stats,
+            updated_config.get("REPORT_FORMAT", "rows"),
+            updated_config.get("REPORT_PAGE_SIZE", 1000),
+        )
+        save_time_series(pathlib.Path(updated_config["REPORT_DIR"]), log_date, log_data, updated_config["REPORT_SIZE"])
+    log_index.mark_processed(log_date)
+    save_log_index(log_index)
+
+
+def emit_run_metrics(updated_config: Dict, metrics: RunMetrics) -> None:
+    """
+    Log run summary and write it for Prometheus node_exporter textfile collector
+    :param updated_config: Script config
+    :param metrics: Run metrics
+    :return: None
+    """
+    logger.info("Run summary", **metrics.as_dict())
+    if metrics.memory_profile is not None:
+        logger.info("Memory profile", **metrics.memory_profile.summary())
+    metrics_file = updated_config.get("METRICS_FILE") or pathlib.Path(updated_config["REPORT_DIR"]) / METRICS_NAME
+    try:
+        metrics.write_prometheus(pathlib.Path(metrics_file))
+    except OSError as e:
+        logger.error("Failed to write metrics file %s, exception: %s", str(metrics_file), str(e))
+
+
+def main(default_config: Dict):
+    """
+    Main function to execute
+    :param default_config: Defatul config for the scrit
+    :return: None
+    """
+    args = parse_args()
+    updated_config = update_config(default_config, args.config)
+    # pylint: disable=global-statement
+    global logger
+    logger = configure_logger(updated_config.get("LOG_FILE", None))
+    try:
+        ParseSettings.from_config(updated_config)
+    except (ValueError, re.error) as e:
+        logger.error("Invalid config: %s", str(e))
+        return
+    # the first flag set wins, the run is dispatched by the mode so that metrics are labeled with the mode that ran
+    mode = "daily"
+    for flag, flag_mode in (
+        (args.watch, "watch"),
+        (args.export_columnar, "export"),
+        (args.columnar, "columnar"),
+        (args.incremental, "incremental"),
+        (args.backfill, "backfill"),
+        (args.date_range, "range"),
+    ):
+        if flag:
+            mode = flag_mode
+            break
+    metrics = RunMetrics(mode)
+    if args.profile_memory:
+        metrics.memory_profile = MemoryProfile()
+    try:
+        if mode == "watch":
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            # metrics are emitted with every report
+            run_watch(updated_config, metrics, stop)
+        elif mode == "export":
+            run_export_columnar(updated_config, args.export_columnar, metrics)
+        elif mode == "columnar":
+            run_columnar_report(updated_config, args.columnar, metrics)
+        elif mode == "incremental":
+            run_incremental(updated_config, metrics)
+        elif mode == "backfill":
+            run_backfill(updated_config, args.workers, metrics)
+        elif mode == "range":
+            run_range(updated_config, args.date_range, args.workers, metrics)
+        else:
+            run_daily(updated_config, args.workers, metrics)
+    finally:
+        if mode != "watch":
+            emit_run_metrics(updated_config, metrics)
+        if metrics.memory_profile is not None:
+            metrics.memory_profile.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""
+Log lines in any nginx log_format: the format is compiled once into a regex capturing only the fields the report needs
+"""
+
+import re
+from typing import List, Tuple
+
+VARIABLE_RE = re.compile(r"\$(?:\{(\w+)\}|(\w+))")
+METHODS = rb"(?:GET|POST|HEAD|OPTIONS|PUT|PATCH|DELETE)"
+URL_VARIABLES = ("request", "request_uri", "uri")
+# offset of HH:MM in the value of a time variable
+TIME_OF_DAY_OFFSETS = {
+    "time_local": len("dd/Mon/yyyy:"),
+    "time_iso8601": len("yyyy-mm-ddT"),
+}
+
+
+def split_log_format(log_format: str) -> List[Tuple[str, str]]:
+    """
+    Split nginx log_format string into literals and variables
+    :param log_format: Format like '$remote_addr - [$time_local] "$request" $request_time'
+    :return: List of ("literal", text) and ("variable", name) in order
+    """
+    segments: List[Tuple[str, str]] = []
+    position = 0
+    for match in VARIABLE_RE.finditer(log_format):
+        if match.start() > position:
+            segments.append(("literal", log_format[position : match.start()]))
+        segments.append(("variable", (match.group(1) or match.group(2)).lower()))
+        position = match.end()
+    if position < len(log_format):
+        segments.append(("literal", log_format[position:]))
+    return segments
+
+
+def _literal_pattern(text: str) -> bytes:
+    """
+    Pattern of a literal, runs of spaces match any number of spaces: nginx configs and comments are often off by one
+    :param text: Literal text
+    :return: Regex pattern
+    """
+    return b" +".join(re.escape(part.encode()) for part in re.split(" +", text))
+
+
+class LogFormat:
+    """
+    Compiled nginx log_format. The regex has capture groups only for the URL, the request time and,
+    if time of day is needed, for the time variable; other variables are skipped up to the next delimiter
+    """
+
+    def __init__(self, log_format: str, time_of_day: bool = False):
+        self.log_format = log_format
+        segments = split_log_format(log_format)
+        variables = [name for kind, name in segments if kind == "variable"]
+        url_variable = next((name for name in URL_VARIABLES if name in variables), None)
+        if url_variable is None:
+            raise ValueError("log_format must contain $request, $request_uri or $uri")
+        if "request_time" not in variables:
+            raise ValueError("log_format must contain $request_time")
+        time_variable = next((name for name in TIME_OF_DAY_OFFSETS if name in variables), None)
+        if time_of_day and time_variable is None:
+            raise ValueError("log_format must contain $time_local or $time_iso8601 for time buckets")
+        self.time_of_day_offset = TIME_OF_DAY_OFFSETS[time_variable] if time_of_day and time_variable else -1
+
+        exact: List[bytes] = []
+        loose: List[bytes] = []
+        groups = 0
+        self.url_group = self.request_time_group = self.time_group = 0
+        for i, (kind, name) in enumerate(segments):
+            if kind == "literal":
+                exact.append(_literal_pattern(name))
+                loose.append(_literal_pattern(name))
+                continue
+            following = segments[i + 1] if i + 1 < len(segments) else None
+            delimiter = following[1][0].encode() if following and following[0] == "literal" else b""
+            value = b"[^" + re.escape(delimiter) + b"]*" if delimiter else (b".*?" if following else b".*")
+            if name == url_variable and not self.url_group:
+                groups += 1
+                self.url_group = groups
+                loose.append(b"(" + value + b")")
+                # the URL is the middle part of "$request", the protocol is skipped like any other variable
+                exact.append(METHODS + b" (.+?) HTTP/" + value if name == "request" else b"(" + value + b")")
+                continue
+            loose.append(value)
+            if name == "request_time" and not self.request_time_group:
+                groups += 1
+                self.request_time_group = groups
+                exact.append(rb"(\d+(?:\.\d+)?)")
+            elif self.time_of_day_offset >= 0 and name == time_variable and not self.time_group:
+                groups += 1
+                self.time_group = groups
+                exact.append(b"(" + value + b")")
+            else:
+                exact.append(value)
+        self.regex = re.compile(b"".join(exact) + rb"\s*$")
+        self.loose_regex = re.compile(b"".join(loose) + rb"\s*$")
+        self.url_variable = url_variable
+
+    def __reduce__(self) -> Tuple:
+        # workers compile the format again instead of receiving regex internals
+        return LogFormat, (self.log_format, self.time_of_day_offset >= 0)
+
+    def parse(self, line: bytes) -> Tuple[bytes | None, float | None, bytes]:
+        """
+        Extract fields of a single line
+        :param line: Single line from log file as bytes
+        :return: URL, request time and HH:MM (empty if not needed), (None, None, b"") if the line doesn't match
+        """
+        match = self.regex.match(line)
+        if match is None:
+            return None, None, b""
+        time_of_day = b""
+        if self.time_group:
+            start = self.time_of_day_offset
+            time_of_day = match.group(self.time_group)[start : start + 5]
+        return match.group(self.url_group), float(match.group(self.request_time_group)), time_of_day
+
+    def classify(self, line: bytes) -> str:
+        """
+        Get failure kind of a line the format could not match, called for failed lines only
+        :param line: Single line from log file as bytes
+        :return: "empty", "format_mismatch", "unsupported_request" or "bad_request_time"
+        """
+        if not line.strip():
+            return "empty"
+        match = self.loose_regex.match(line)
+        if match is None:
+            return "format_mismatch"
+        if self.url_variable == "request" and re.match(METHODS + b" .+? HTTP/", match.group(1)) is None:
+            return "unsupported_request"
+        return "bad_request_time"
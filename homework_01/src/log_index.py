@@ -0,0 +1,196 @@
+"""
+Persistent index of rotated log files, so that runs do not list the whole log folder every time
+"""
+
+import datetime
+import json
+import os
+import pathlib
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+ROTATED_LOG_PREFIX = "nginx-access-ui.log-"
+ROTATED_LOG_RE = re.compile(r"^nginx-access-ui\.log-(\d{8})(?:\.gz)?$")
+LOG_INDEX_VERSION = 1
+# folder mtime is trusted only if it is older than that at scan time: a file created in the same clock tick
+# as the previous scan would not change it
+MTIME_SLACK_SECONDS = 2.0
+
+
+@dataclass
+class LogEntry:
+    """
+    Rotated log file known to the index
+    """
+
+    name: str
+    log_date: str
+    size: int
+    mtime: float
+    processed: bool = False
+
+
+def parse_log_name(name: str) -> str | None:
+    """
+    Get date of a rotated log from its file name
+    :param name: File name like nginx-access-ui.log-20170630[.gz]
+    :return: Log date as YYYY.MM.DD, None if the name is not a rotated log or the date is not valid
+    """
+    match = ROTATED_LOG_RE.match(name)
+    if match is None:
+        return None
+    try:
+        date = datetime.datetime.strptime(match.group(1), "%Y%m%d")
+    except ValueError:
+        return None
+    return f"{date:%Y.%m.%d}"
+
+
+class LogIndex:
+    """
+    Rotated log files of a folder by name. The folder is scanned again only if its mtime changed
+    (a file was added, removed or renamed), and only new files are stat'ed
+    """
+
+    def __init__(self, log_dir: pathlib.Path, index_file: pathlib.Path | None = None):
+        self.log_dir = log_dir
+        self.index_file = index_file
+        self.entries: Dict[str, LogEntry] = {}
+        self.dir_mtime_ns = 0
+        self.scanned_at = 0.0
+
+    @classmethod
+    def load(cls, log_dir: pathlib.Path, index_file: pathlib.Path | None = None) -> "LogIndex":
+        """
+        Load index saved by a previous run, an empty index is returned if there is no valid one for the folder
+        :param log_dir: Path to folder with log files
+        :param index_file: Path to index file, None for an index kept in memory only
+        :return: Index, not refreshed yet
+        """
+        index = cls(log_dir, index_file)
+        if index_file is None:
+            return index
+        try:
+            with open(index_file, encoding="UTF-8") as file:
+                data = json.load(file)
+            if data["version"] != LOG_INDEX_VERSION or data["log_dir"] != str(log_dir):
+                return index
+            index.entries = {entry["name"]: LogEntry(**entry) for entry in data["entries"]}
+            index.dir_mtime_ns = data["dir_mtime_ns"]
+            index.scanned_at = data["scanned_at"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls(log_dir, index_file)
+        return index
+
+    def save(self) -> None:
+        """
+        Atomically save index, nothing is done for an in-memory index
+        :return: None
+        """
+        if self.index_file is None:
+            return
+        os.makedirs(self.index_file.parent, exist_ok=True)
+        tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(tmp_file, "w", encoding="UTF-8") as file:
+            json.dump(
+                {
+                    "version": LOG_INDEX_VERSION,
+                    "log_dir": str(self.log_dir),
+                    "dir_mtime_ns": self.dir_mtime_ns,
+                    "scanned_at": self.scanned_at,
+                    "entries": [asdict(entry) for entry in self.entries.values()],
+                },
+                file,
+            )
+        os.replace(tmp_file, self.index_file)
+
+    def refresh(self) -> List[str]:
+        """
+        Bring the index up to date with the folder
+        :return: Names looking like rotated logs but without a valid date, empty if the folder was not scanned
+        """
+        try:
+            dir_mtime_ns = os.stat(self.log_dir).st_mtime_ns
+        except OSError:
+            self.entries = {}
+            return []
+        if dir_mtime_ns == self.dir_mtime_ns and dir_mtime_ns / 1e9 < self.scanned_at - MTIME_SLACK_SECONDS:
+            return []
+        scanned_at = time.time()
+        entries: Dict[str, LogEntry] = {}
+        rejected = []
+        with os.scandir(self.log_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                if not dir_entry.name.startswith(ROTATED_LOG_PREFIX):
+                    continue
+                known = self.entries.get(dir_entry.name)
+                if known is not None:
+                    # rotated files are not written anymore, a new name means a new file
+                    entries[dir_entry.name] = known
+                    continue
+                log_date = parse_log_name(dir_entry.name)
+                if log_date is None:
+                    rejected.append(dir_entry.name)
+                    continue
+                stat = dir_entry.stat()
+                entries[dir_entry.name] = LogEntry(dir_entry.name, log_date, stat.st_size, stat.st_mtime)
+        self.entries = entries
+        self.dir_mtime_ns = dir_mtime_ns
+        self.scanned_at = scanned_at
+        return sorted(rejected)
+
+    def _by_date(self) -> Dict[str, LogEntry]:
+        """
+        One entry per date: a plain file wins over its .gz twin
+        :return: Log date to entry
+        """
+        by_date: Dict[str, LogEntry] = {}
+        for name in sorted(self.entries):
+            entry = self.entries[name]
+            by_date.setdefault(entry.log_date, entry)
+        return by_date
+
+    def path(self, entry: LogEntry) -> pathlib.Path:
+        """
+        Path to the log file of an entry
+        :param entry: Index entry
+        :return: Path to log file
+        """
+        return self.log_dir / entry.name
+
+    def latest(self) -> LogEntry | None:
+        """
+        Log of the latest date
+        :return: Entry, None if there are no logs
+        """
+        by_date = self._by_date()
+        return by_date[max(by_date)] if by_date else None
+
+    def get(self, log_date: str) -> LogEntry | None:
+        """
+        Log of a specific date
+        :param log_date: Log date as YYYY.MM.DD
+        :return: Entry, None if there is no log for the date
+        """
+        return self._by_date().get(log_date)
+
+    def unprocessed(self) -> List[LogEntry]:
+        """
+        Logs not marked as processed
+        :return: Entries ordered by date
+        """
+        by_date = self._by_date()
+        return [by_date[log_date] for log_date in sorted(by_date) if not by_date[log_date].processed]
+
+    def mark_processed(self, log_date: str, processed: bool = True) -> None:
+        """
+        Mark every log file of the date as processed (or not)
+        :param log_date: Log date as YYYY.MM.DD
+        :param processed: Flag value
+        :return: None
+        """
+        for entry in self.entries.values():
+            if entry.log_date == log_date:
+                entry.processed = processed
@@ -0,0 +1,117 @@
+"""
+Memory profile of a run: traced peak per phase, the largest aggregate broken down by structure
+and the lines that allocated the most
+"""
+
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from .aggregation import LogAggregator
+
+TOP_ALLOCATIONS = 10
+AGGREGATE_PARTS = ("url_table", "urls", "url_stats", "times", "sketches", "histograms", "timelines")
+
+
+def aggregate_memory(aggregator: LogAggregator) -> Dict[str, int]:
+    """
+    Measure memory of URL stats kept in memory with sys.getsizeof, walks every URL once
+    :param aggregator: Aggregate
+    :return: Bytes per structure: URL table, URL keys, UrlStats objects, exact request times, quantile sketches,
+        latency histograms and timelines
+    """
+    sizes = dict.fromkeys(AGGREGATE_PARTS, 0)
+    sizes["url_table"] = sys.getsizeof(aggregator.urls)
+    float_size = sys.getsizeof(0.0)
+    for url, stats in aggregator.urls.items():
+        sizes["urls"] += sys.getsizeof(url)
+        sizes["url_stats"] += sys.getsizeof(stats)
+        if stats.times is not None:
+            sizes["times"] += sys.getsizeof(stats.times) + float_size * len(stats.times)
+        if stats.sketch is not None:
+            buckets = stats.sketch.buckets
+            sizes["sketches"] += sys.getsizeof(stats.sketch) + sys.getsizeof(buckets)
+            sizes["sketches"] += sum(sys.getsizeof(key) + sys.getsizeof(count) for key, count in buckets.items())
+        if stats.histogram is not None:
+            sizes["histograms"] += sys.getsizeof(stats.histogram)
+        if stats.timeline is not None:
+            sizes["timelines"] += sys.getsizeof(stats.timeline)
+            sizes["timelines"] += sum(sys.getsizeof(bucket) + float_size * 2 for bucket in stats.timeline.values())
+    return sizes
+
+
+class MemoryProfile:
+    """
+    Memory traced with tracemalloc during a run. Tracing slows the run down, it is meant for investigations
+    """
+
+    def __init__(self, top: int = TOP_ALLOCATIONS):
+        self.top = top
+        self.phase_peaks: Dict[str, int] = {}
+        self.aggregate: Dict[str, int] = {}
+        self.aggregate_estimate = 0
+        self.spilled_bytes = 0
+        self.top_allocations: List[Dict[str, Any]] = []
+        tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Trace peak memory of a run phase
+        :param name: Phase name
+        :return: Context manager
+        """
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.phase_peaks[name] = max(self.phase_peaks.get(name, 0), peak)
+
+    def observe_aggregate(self, aggregator: LogAggregator) -> None:
+        """
+        Break down the aggregate and take allocation statistics if it is the largest one seen in the run
+        :param aggregator: Aggregate right after parsing
+        :return: None
+        """
+        sizes = aggregate_memory(aggregator)
+        if sum(sizes.values()) < sum(self.aggregate.values()):
+            return
+        self.aggregate = sizes
+        self.aggregate_estimate = aggregator.estimated_size()
+        self.spilled_bytes = aggregator.spilled.bytes_written if aggregator.spilled is not None else 0
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>"))
+        )
+        self.top_allocations = [
+            {
+                "location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "bytes": stat.size,
+                "blocks": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[: self.top]
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Profile of the run
+        :return: Traced peak overall and per phase, structures of the largest aggregate with its estimate
+            used by MAX_MEMORY_MB, bytes spilled to disk and the top allocating lines
+        """
+        return {
+            "traced_peak_bytes": max([tracemalloc.get_traced_memory()[1], *self.phase_peaks.values()]),
+            "phase_peak_bytes": self.phase_peaks,
+            "aggregate_bytes": self.aggregate,
+            "aggregate_estimated_bytes": self.aggregate_estimate,
+            "spilled_bytes": self.spilled_bytes,
+            "top_allocations": self.top_allocations,
+        }
+
+    def stop(self) -> None:
+        """
+        Stop tracing
+        :return: None
+        """
+        tracemalloc.stop()
@@ -0,0 +1,138 @@
+"""
+Run metrics: parse quality, throughput and resources of a single log_analyzer run
+"""
+
+import os
+import pathlib
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator
+
+from .aggregation import LogAggregator
+from .memory import MemoryProfile
+
+PHASES = ("discover", "parse", "aggregate", "render")
+METRIC_PREFIX = "log_analyzer_last_run"
+
+
+def peak_rss_bytes(who: int = resource.RUSAGE_SELF) -> int:
+    """
+    Peak resident set size
+    :param who: resource.RUSAGE_SELF for this process, resource.RUSAGE_CHILDREN for the largest finished child
+    :return: Peak RSS in bytes
+    """
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RunMetrics:
+    """
+    Counters and per-phase wall time of a run
+    """
+
+    def __init__(self, mode: str = "daily"):
+        self.mode = mode
+        self.lines_read = 0
+        self.lines_failed = 0
+        self.bytes_read = 0
+        self.phase_seconds: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.started = time.time()
+        # set by --profile-memory
+        self.memory_profile: MemoryProfile | None = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Measure wall time of a run phase, repeated phases are summed up
+        :param name: Phase name
+        :return: Context manager
+        """
+        start = time.perf_counter()
+        profile: ContextManager = self.memory_profile.phase(name) if self.memory_profile is not None else nullcontext()
+        try:
+            with profile:
+                yield
+        finally:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def observe_aggregate(self, aggregator: LogAggregator) -> None:
+        """
+        Account aggregate right after parsing in memory profile, nothing is done without --profile-memory
+        :param aggregator: Aggregate
+        :return: None
+        """
+        if self.memory_profile is not None:
+            self.memory_profile.observe_aggregate(aggregator)
+
+    def add_parsed(self, lines_read: int, lines_failed: int, bytes_read: int) -> None:
+        """
+        Account parsed log
+        :param lines_read: Number of lines read
+        :param lines_failed: Number of lines failed to parse
+        :param bytes_read: Number of bytes read from disk
+        :return: None
+        """
+        self.lines_read += lines_read
+        self.lines_failed += lines_failed
+        self.bytes_read += bytes_read
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Summary of the run
+        :return: Dictionary with metrics
+        """
+        parse_seconds = self.phase_seconds.get("parse", 0.0)
+        return {
+            "mode": self.mode,
+            "lines_read": self.lines_read,
+            "lines_failed": self.lines_failed,
+            "bytes_read": self.bytes_read,
+            "lines_per_second": round(self.lines_read / parse_seconds, 1) if parse_seconds else 0.0,
+            "phase_seconds": {name: round(seconds, 6) for name, seconds in self.phase_seconds.items()},
+            "wall_seconds": round(time.time() - self.started, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "workers_peak_rss_bytes": peak_rss_bytes(resource.RUSAGE_CHILDREN),
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Render metrics in Prometheus text exposition format
+        :return: Text for node_exporter textfile collector
+        """
+        summary = self.as_dict()
+        label = f'mode="{self.mode}"'
+        gauges = [
+            ("lines_read", "Lines read from logs", summary["lines_read"]),
+            ("lines_failed", "Lines failed to parse", summary["lines_failed"]),
+            ("bytes_read", "Bytes read from disk", summary["bytes_read"]),
+            ("lines_per_second", "Parse throughput", summary["lines_per_second"]),
+            ("wall_seconds", "Wall time of the run", summary["wall_seconds"]),
+            ("peak_rss_bytes", "Peak resident memory of the main process", summary["peak_rss_bytes"]),
+            ("workers_peak_rss_bytes", "Peak resident memory of parse workers", summary["workers_peak_rss_bytes"]),
+            ("timestamp_seconds", "Time the run finished", round(time.time(), 3)),
+        ]
+        lines = []
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            lines.append(f"{METRIC_PREFIX}_{name}{{{label}}} {value}")
+        lines.append(f"# HELP {METRIC_PREFIX}_phase_seconds Wall time per phase")
+        lines.append(f"# TYPE {METRIC_PREFIX}_phase_seconds gauge")
+        for name, seconds in summary["phase_seconds"].items():
+            lines.append(f'{METRIC_PREFIX}_phase_seconds{{{label},phase="{name}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, metrics_file: pathlib.Path) -> None:
+        """
+        Atomically write metrics file, so the collector never reads a partial one
+        :param metrics_file: Path to .prom file
+        :return: None
+        """
+        os.makedirs(metrics_file.parent, exist_ok=True)
+        tmp_file = metrics_file.with_name(metrics_file.name + ".tmp")
+        with open(tmp_file, "w", encoding="UTF-8") as file:
+            file.write(self.to_prometheus())
+        os.replace(tmp_file, metrics_file)
@@ -0,0 +1,81 @@
+"""
+URL normalization: collapse URLs differing only in query string or ids into templates
+"""
+
+import re
+from typing import Dict, List, Sequence
+
+NUMBER_SEGMENT_RE = re.compile(rb"(?<=/)\d+(?=[/?]|$)")
+UUID_SEGMENT_RE = re.compile(rb"(?<=/)[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}(?=[/?]|$)")
+
+
+class UrlNormalizer:
+    """
+    Compiled URL normalization rules applied in order:
+    strip query string, custom templates (the first matching one wins), numeric and UUID path segments.
+    Results are cached, since the same raw URLs repeat over and over in a log
+    """
+
+    def __init__(
+        self,
+        strip_query: bool = True,
+        replace_ids: bool = True,
+        templates: Sequence[Sequence[str]] = (),
+        cache_size: int = 100_000,
+    ):
+        self.strip_query = strip_query
+        self.replace_ids = replace_ids
+        self.templates = [(re.compile(pattern.encode()), replacement.encode()) for pattern, replacement in templates]
+        self.cache_size = cache_size
+        self._cache: Dict[bytes, bytes] = {}
+
+    @classmethod
+    def from_config(cls, normalization_config: Dict | None) -> "UrlNormalizer | None":
+        """
+        Create normalizer from URL_NORMALIZATION config section
+        :param normalization_config: Dictionary with STRIP_QUERY, REPLACE_IDS and TEMPLATES keys
+        :return: Normalizer, None if normalization is not configured
+        :raises ValueError: A pattern of TEMPLATES does not compile
+        """
+        if not normalization_config:
+            return None
+        templates: List[Sequence[str]] = normalization_config.get("TEMPLATES", [])
+        try:
+            return cls(
+                strip_query=normalization_config.get("STRIP_QUERY", True),
+                replace_ids=normalization_config.get("REPLACE_IDS", True),
+                templates=templates,
+            )
+        except re.error as e:
+            pattern = e.pattern.decode() if isinstance(e.pattern, bytes) else e.pattern
+            raise ValueError(f"Invalid URL_NORMALIZATION.TEMPLATES pattern '{pattern}': {e}") from e
+
+    def __call__(self, url: bytes) -> bytes:
+        normalized = self._cache.get(url)
+        if normalized is None:
+            normalized = self.normalize(url)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[url] = normalized
+        return normalized
+
+    def normalize(self, url: bytes) -> bytes:
+        """
+        Apply normalization rules without cache
+        :param url: Raw URL
+        :return: Normalized URL
+        """
+        if self.strip_query:
+            url = url.partition(b"?")[0]
+        for pattern, replacement in self.templates:
+            normalized, replaced = pattern.subn(replacement, url, count=1)
+            if replaced:
+                return normalized
+        if self.replace_ids:
+            url = NUMBER_SEGMENT_RE.sub(b"{id}", url)
+            url = UUID_SEGMENT_RE.sub(b"{uuid}", url)
+        return url
+
+    def __getstate__(self) -> Dict:
+        # workers build their own cache
+        return dict(self.__dict__, _cache={})
@@ -0,0 +1,184 @@
+"""
+Staged reading of log files: every stage runs in its own thread and passes items to the next one
+through a bounded queue, so disk reads and decompression (both release the GIL) overlap with parsing
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, Generic, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+PIPELINE_DEPTH = 4
+# how often a stage blocked on a full queue checks whether the pipeline is closed
+PUT_TIMEOUT = 0.1
+
+_END = object()
+
+
+class _Failure:
+    """
+    Exception raised by a stage, re-raised in the consuming thread
+    """
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class Stage(Generic[T]):
+    """
+    Iterator over items produced by a thread. Time is accounted on both sides of the queue:
+    `work` -- producing items (including waiting for the previous stage), `blocked` -- waiting for free space
+    in the queue (the consumer is slower), `consumer_idle` -- consumer waiting for items (this stage is slower),
+    `consumer_work` -- consumer time between items
+    """
+
+    def __init__(self, name: str, items: Iterable[T], depth: int = PIPELINE_DEPTH, source: "Stage | None" = None):
+        self.name = name
+        # the previous stage, waiting for its items is not accounted as work of this stage
+        self.source = source
+        self.work = 0.0
+        self.blocked = 0.0
+        self.consumer_idle = 0.0
+        self.consumer_work = 0.0
+        self.items_count = 0
+        self._items = iter(items)
+        self._queue: queue.Queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._returned_at: float | None = None
+        self._thread = threading.Thread(target=self._run, name=f"log-{name}", daemon=True)
+        self._thread.start()
+
+    def _put(self, item: Any) -> bool:
+        """
+        Put item into the queue unless the pipeline is closed
+        :param item: Item, end marker or failure
+        :return: False if the pipeline is closed
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        """
+        Thread: move items from the source to the queue
+        :return: None
+        """
+        items = self._items
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                produced = time.perf_counter()
+                self.work += produced - start
+                if not self._put(item):
+                    return
+                self.blocked += time.perf_counter() - produced
+            self._put(_END)
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            self._put(_Failure(e))
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    def __iter__(self) -> Iterator[T]:
+        return self
+
+    def __next__(self) -> T:
+        start = time.perf_counter()
+        if self._returned_at is not None:
+            self.consumer_work += start - self._returned_at
+        item = self._queue.get()
+        self.consumer_idle += time.perf_counter() - start
+        if item is _END:
+            self._returned_at = None
+            self._queue.put(_END)
+            raise StopIteration
+        if isinstance(item, _Failure):
+            self._returned_at = None
+            self._queue.put(item)
+            raise item.error
+        self.items_count += 1
+        self._returned_at = time.perf_counter()
+        return item  # type: ignore[no-any-return]
+
+    def close(self) -> None:
+        """
+        Stop the thread, e.g. when the consumer failed and won't read the rest
+        :return: None
+        """
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=PUT_TIMEOUT)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+
+class Pipeline:
+    """
+    Chain of stages ending in the thread that creates the pipeline
+    """
+
+    def __init__(self, depth: int = PIPELINE_DEPTH):
+        self.depth = depth
+        self.stages: List[Stage] = []
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def stage(self, name: str, items: Iterable[T]) -> Stage[T]:
+        """
+        Run iteration over items in a new thread
+        :param name: Stage name for stats
+        :param items: Items, usually a generator reading from the previous stage
+        :return: Iterator over the items
+        """
+        stage = Stage(name, items, self.depth, self.stages[-1] if self.stages else None)
+        self.stages.append(stage)
+        return stage
+
+    def close(self) -> None:
+        """
+        Stop all stages
+        :return: None
+        """
+        for stage in reversed(self.stages):
+            stage.close()
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def stats(self, consumer: str = "parse") -> Dict[str, Dict[str, float]]:
+        """
+        Utilization of every stage: the share of wall time it was busy. The stage with the highest utilization
+        is the bottleneck; a stage waiting for the next one has `blocked_seconds`
+        :param consumer: Name of the stage run by the thread that created the pipeline
+        :return: Stage name to busy seconds, blocked seconds and utilization
+        """
+        wall = (self.finished or time.perf_counter()) - self.started
+        stats = {}
+        for stage in self.stages:
+            busy = stage.work - (stage.source.consumer_idle if stage.source is not None else 0.0)
+            stats[stage.name] = {"busy_seconds": busy, "blocked_seconds": stage.blocked}
+        if self.stages:
+            stats[consumer] = {"busy_seconds": self.stages[-1].consumer_work, "blocked_seconds": 0.0}
+        for stage_stats in stats.values():
+            stage_stats["utilization"] = stage_stats["busy_seconds"] / wall if wall > 0 else 0.0
+            for key, value in stage_stats.items():
+                stage_stats[key] = round(value, 3)
+        return stats
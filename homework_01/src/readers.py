@@ -0,0 +1,267 @@
+"""
+Bulk readers of log files: large binary chunks split into byte lines
+"""
+
+import mmap
+import os
+import shutil
+import subprocess
+import zlib
+from typing import Iterable, Iterator, List, Tuple
+
+from .pipeline import Pipeline
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# external decompressors tried for "auto" gzip pipe, the first one found on PATH is used
+GZIP_PIPES = ("pigz", "zcat")
+
+
+def find_gzip_pipe(gzip_pipe: str | None) -> str | None:
+    """
+    Resolve external decompressor command
+    :param gzip_pipe: None to use builtin zlib, "auto" to pick the first of GZIP_PIPES found on PATH,
+        or a command name/path
+    :return: Path to decompressor executable, None to use builtin zlib
+    """
+    if not gzip_pipe:
+        return None
+    candidates = GZIP_PIPES if gzip_pipe == "auto" else (gzip_pipe,)
+    for candidate in candidates:
+        path = shutil.which(candidate)
+        if path:
+            return path
+    return None
+
+
+def gunzip_chunks(compressed_chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decompress gzip stream with zlib. Multi-member streams (e.g. concatenated logs) are supported
+    :param compressed_chunks: Chunks of gzip file
+    :return: Iterator over decompressed chunks
+    """
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    for compressed in compressed_chunks:
+        while compressed:
+            chunk = decompressor.decompress(compressed)
+            if chunk:
+                yield chunk
+            if not decompressor.eof:
+                break
+            # next gzip member starts right after the end of the current one
+            compressed = decompressor.unused_data
+            decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def iter_gzip_chunks(log_file: os.PathLike[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Decompress gzip file with zlib in large chunks
+    :param log_file: Path to gzip file
+    :param chunk_size: Size of compressed chunks to read
+    :return: Iterator over decompressed chunks
+    """
+    return gunzip_chunks(iter_file_chunks(log_file, chunk_size=chunk_size))
+
+
+def iter_pipe_chunks(log_file: os.PathLike[str], command: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Decompress gzip file with an external decompressor
+    :param log_file: Path to gzip file
+    :param command: Path to decompressor executable accepting `-dc <file>`
+    :param chunk_size: Size of decompressed chunks to read
+    :return: Iterator over decompressed chunks
+    """
+    with subprocess.Popen([command, "-dc", os.fspath(log_file)], stdout=subprocess.PIPE) as process:
+        assert process.stdout is not None
+        while True:
+            chunk = process.stdout.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    if process.returncode:
+        raise OSError(f"{command} failed to decompress {log_file} with exit code {process.returncode}")
+
+
+def iter_file_chunks(
+    log_file: os.PathLike[str], start: int = 0, end: int | None = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Read [start, end) byte range of plain file in large chunks
+    :param log_file: Path to file
+    :param start: Offset to start reading from
+    :param end: Offset to stop reading at, end of file if None
+    :param chunk_size: Size of chunks to read
+    :return: Iterator over chunks
+    """
+    with open(log_file, "rb") as file:
+        file.seek(start)
+        while end is None or start < end:
+            chunk = file.read(chunk_size if end is None else min(chunk_size, end - start))
+            if not chunk:
+                break
+            start += len(chunk)
+            yield chunk
+
+
+def iter_mmap_line_blocks(
+    log_file: os.PathLike[str], start: int = 0, end: int | None = None, block_size: int = CHUNK_SIZE
+) -> Iterator[List[bytes]]:
+    """
+    Memory-map plain file and split [start, end) byte range into blocks of lines. Pages of already
+    parsed blocks are released, so resident memory stays bounded by the block size however large the file is
+    :param log_file: Path to file
+    :param start: Offset of the first line
+    :param end: Offset right after the last line, end of file if None
+    :param block_size: Approximate size of a block in bytes
+    :return: Iterator over blocks of lines (without line separators)
+    """
+    with open(log_file, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        end = file_size if end is None else min(end, file_size)
+        if start >= end:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            can_advise = hasattr(mapped, "madvise")
+            if can_advise:
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            released = start - start % mmap.PAGESIZE
+            while start < end:
+                block_end = min(start + block_size, end)
+                if block_end < end:
+                    newline = mapped.rfind(b"\n", start, block_end)
+                    if newline < 0:
+                        # a line longer than the block: extend the block up to the end of this line
+                        newline = mapped.find(b"\n", block_end, end)
+                    block_end = end if newline < 0 else newline + 1
+                lines = mapped[start:block_end].split(b"\n")
+                if not lines[-1]:
+                    lines.pop()
+                yield lines
+                start = block_end
+                release_end = start - start % mmap.PAGESIZE
+                if can_advise and release_end > released:
+                    mapped.madvise(mmap.MADV_DONTNEED, released, release_end - released)
+                    released = release_end
+
+
+def iter_line_blocks(chunks: Iterable[bytes]) -> Iterator[List[bytes]]:
+    """
+    Split chunks into lines, a line spanning chunks boundary is glued together
+    :param chunks: Chunks of a file
+    :return: Iterator over blocks of lines (without line separators) of a chunk
+    """
+    tail = b""
+    for chunk in chunks:
+        lines = (tail + chunk if tail else chunk).split(b"\n")
+        tail = lines.pop()
+        if lines:
+            yield lines
+    if tail:
+        yield [tail]
+
+
+def iter_log_line_blocks(
+    log_file: os.PathLike[str], gzip_pipe: str | None = None, use_mmap: bool = True
+) -> Iterator[List[bytes]]:
+    """
+    Read plain or gzip compressed log file as blocks of byte lines
+    :param log_file: Path to log file
+    :param gzip_pipe: External decompressor setting, see find_gzip_pipe
+    :param use_mmap: Memory-map plain files instead of reading them in chunks
+    :return: Iterator over blocks of lines
+    """
+    if os.fspath(log_file).endswith(".gz"):
+        command = find_gzip_pipe(gzip_pipe)
+        chunks = iter_pipe_chunks(log_file, command) if command else iter_gzip_chunks(log_file)
+    elif use_mmap:
+        return iter_mmap_line_blocks(log_file)
+    else:
+        chunks = iter_file_chunks(log_file)
+    return iter_line_blocks(chunks)
+
+
+def skip_bytes(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """
+    Drop the first bytes of a chunked stream
+    :param chunks: Chunks of a stream
+    :param size: Number of bytes to drop
+    :return: Iterator over the rest of chunks
+    """
+    for chunk in chunks:
+        if size >= len(chunk):
+            size -= len(chunk)
+            continue
+        yield chunk[size:] if size else chunk
+        size = 0
+
+
+def iter_mmap_line_blocks_from(log_file: os.PathLike[str], offset: int = 0) -> Iterator[Tuple[int, List[bytes]]]:
+    """
+    Same as iter_mmap_line_blocks, every block comes with the offset right after it
+    :param log_file: Path to file
+    :param offset: Offset of the first line
+    :return: Iterator over (offset after the block, block of lines)
+    """
+    file_size = os.path.getsize(log_file)
+    for lines in iter_mmap_line_blocks(log_file, offset):
+        # every line but the last one of the file is followed by a separator
+        offset = min(offset + sum(map(len, lines)) + len(lines), file_size)
+        yield offset, lines
+
+
+def iter_log_line_blocks_from(
+    log_file: os.PathLike[str],
+    offset: int = 0,
+    gzip_pipe: str | None = None,
+    use_mmap: bool = True,
+    pipeline: Pipeline | None = None,
+) -> Iterator[Tuple[int, List[bytes]]]:
+    """
+    Same as iter_log_line_blocks starting from a line offset, every block comes with the offset right after it.
+    Offsets of gzip files are offsets in decompressed data: gzip has no restart points, so the file is decompressed
+    from the start and data before the offset is dropped unparsed
+    :param log_file: Path to log file
+    :param offset: Offset of the first line to read
+    :param gzip_pipe: External decompressor setting, see find_gzip_pipe
+    :param use_mmap: Memory-map plain files instead of reading them in chunks
+    :param pipeline: Pipeline to run reading ("read" stage) and decompression with line splitting ("decompress"
+        stage) in threads, everything runs in the calling thread if not set. Memory-mapped files are never staged:
+        page faults are taken while holding the GIL, so a reading thread can't overlap with parsing
+    :return: Iterator over (offset after the block, block of lines)
+    """
+    if not os.fspath(log_file).endswith(".gz"):
+        if use_mmap:
+            return iter_mmap_line_blocks_from(log_file, offset)
+        blocks = iter_line_blocks_from(iter_file_chunks(log_file, offset), offset)
+        return blocks if pipeline is None else pipeline.stage("read", blocks)
+    command = find_gzip_pipe(gzip_pipe)
+    if command:
+        # the external decompressor is a stage of its own, the thread reads its output
+        chunks = iter_pipe_chunks(log_file, command)
+    elif pipeline is None:
+        chunks = iter_gzip_chunks(log_file)
+    else:
+        chunks = gunzip_chunks(pipeline.stage("read", iter_file_chunks(log_file)))
+    blocks = iter_line_blocks_from(skip_bytes(chunks, offset), offset)
+    return blocks if pipeline is None else pipeline.stage("decompress", blocks)
+
+
+def iter_line_blocks_from(chunks: Iterable[bytes], offset: int = 0) -> Iterator[Tuple[int, List[bytes]]]:
+    """
+    Same as iter_line_blocks, every block comes with the offset right after it
+    :param chunks: Chunks of a file
+    :param offset: Offset of the first chunk
+    :return: Iterator over (offset after the block, block of lines)
+    """
+    tail = b""
+    for chunk in chunks:
+        lines = (tail + chunk if tail else chunk).split(b"\n")
+        tail = lines.pop()
+        offset += len(chunk)
+        if lines:
+            yield offset - len(tail), lines
+    if tail:
+        yield offset, [tail]
@@ -0,0 +1,151 @@
+"""
+Vectorized report columns over NumPy arrays. NumPy is an optional dependency:
+without it create_log_stats computes the same columns with the pure Python loop.
+The aggregate itself keeps request times in per-URL lists of UrlStats, arrays are built only while the report
+is computed: total times of all URLs and the times of the selected URLs
+"""
+
+import itertools
+import math
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from .aggregation import MEAN_TIE_TOLERANCE, LogAggregator, UrlStats, encode_url
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+# x * 10**ndigits is off by at most 2**-53 relative, values that close to a .5 tie are rounded by round() itself
+TIE_TOLERANCE = 2.0**-50
+EXACT_LIMIT = 2.0**52
+# below it the fixed cost of building arrays outweighs the vectorized work, the Python loop is as fast or faster
+AUTO_MIN_URLS = 1000
+
+
+def numpy_available() -> bool:
+    """
+    Check NumPy can be imported
+    :return: True if the vectorized engine can be used
+    """
+    return np is not None
+
+
+def round_array(
+    values: Any, ndigits: int = 3, exact: Callable[[int], float] | None = None, tolerance: float = TIE_TOLERANCE
+) -> List[float]:
+    """
+    Round every value exactly as built-in round(value, ndigits) does. rint(x * 10**ndigits) / 10**ndigits is
+    the correctly rounded result unless the scaled value is within the multiplication error of a tie
+    (or too large to have a fraction), so only those rare values go through round()
+    :param values: Float array
+    :param ndigits: Number of decimal digits
+    :param exact: Exact value by index if values only approximate it, used for values close to a tie
+    :param tolerance: Relative distance to a tie to round with round(), at least the multiplication error
+    :return: List of rounded floats
+    """
+    scale = 10.0**ndigits
+    with np.errstate(over="ignore", invalid="ignore"):
+        scaled = values * scale
+        rounded: List[float] = (np.rint(scaled) / scale).tolist()
+        magnitude = np.abs(scaled)
+        tie_distance = np.abs(scaled - np.floor(scaled) - 0.5)
+        # negated comparisons also catch NaN and infinity
+        risky = ~(tie_distance > magnitude * tolerance) | ~(magnitude < EXACT_LIMIT)
+    for i in np.flatnonzero(risky).tolist():
+        rounded[i] = round(exact(i) if exact is not None else float(values[i]), ndigits)
+    return rounded
+
+
+def grouped_stats(times: Sequence[Sequence[float]]) -> Tuple[Any, Any, Any]:
+    """
+    Counts, maximums and medians of request time lists, the same as len, max and statistics.median of every list.
+    The lists are copied into a temporary contiguous array with an array of list numbers and reduced by groups
+    at once: maximums with reduceat, medians by offsets after one sort by (number, time)
+    :param times: Request times of every URL
+    :return: Arrays of counts, maximums and medians, 0 for empty lists
+    """
+    lengths = np.fromiter(map(len, times), dtype=np.int64, count=len(times))
+    values = np.fromiter(itertools.chain.from_iterable(times), dtype=np.float64, count=int(lengths.sum()))
+    starts = np.cumsum(lengths) - lengths
+    filled = lengths > 0
+    maxes = np.zeros(len(times))
+    medians = np.zeros(len(times))
+    if not filled.any():
+        return lengths, maxes, medians
+    maxes[filled] = np.maximum.reduceat(values, starts[filled])
+    codes = np.repeat(np.arange(len(times)), lengths)
+    values = values[np.lexsort((values, codes))]
+    lower = values[(starts + (lengths - 1) // 2)[filled]]
+    upper = values[(starts + lengths // 2)[filled]]
+    medians[filled] = (lower + upper) / 2
+    return lengths, maxes, medians
+
+
+def top_order(time_sums: Any, urls: List[Any], report_size: int) -> List[int]:
+    """
+    Indices of URLs with the largest total request time, in the same order as get_top_urls selects them.
+    Only URLs not below the report_size-th largest total (found with argpartition) are sorted
+    :param time_sums: Total time of every URL
+    :param urls: URLs in the same order
+    :param report_size: The max number of URLs to select
+    :return: Indices in descending order of total time, URLs with the same total time in URL order
+    """
+    size = min(max(report_size, 0), len(time_sums))
+    if not size:
+        return []
+    if size < len(time_sums):
+        # URLs tied with the last selected one compete for the remaining places by URL too
+        last = np.argpartition(-time_sums, size - 1)[size - 1]
+        candidates = np.flatnonzero(time_sums >= time_sums[last])
+    else:
+        candidates = np.arange(len(time_sums))
+    order = candidates[np.argsort(-time_sums[candidates], kind="stable")]
+    sums = time_sums[order]
+    selected: List[int] = order.tolist()
+    equal = sums[1:] == sums[:-1]
+    if equal.any():
+        edges = np.diff(np.concatenate(([False], equal, [False])).astype(np.int8))
+        for start, end in zip(np.flatnonzero(edges == 1).tolist(), (np.flatnonzero(edges == -1) + 1).tolist()):
+            selected[start:end] = sorted(selected[start:end], key=lambda i: encode_url(urls[i]))
+    return selected[:size]
+
+
+def report_columns(log_data: LogAggregator, report_size: int) -> Tuple[List[UrlStats], Dict[str, List]]:
+    """
+    Select URLs with the largest total request time and compute rounded report columns for them.
+    Sums are the correctly rounded UrlStats.time_sum rather than np.add.reduceat, which sums in a different order,
+    so the columns are identical to the ones computed per URL with Python floats
+    :param log_data: Aggregate of parsed data
+    :param report_size: The max number of URLs to select
+    :return: Stats of selected URLs in descending order of total time and report columns in the same order
+    """
+    # no per-URL tuples: allocating millions of containers triggers full garbage collections of the aggregate
+    urls = list(log_data.urls)
+    all_stats = list(log_data.urls.values())
+    time_sums = np.fromiter(map(attrgetter("time_sum"), all_stats), dtype=np.float64, count=len(all_stats))
+    total_time = math.fsum(time_sums.tolist())
+    selected = top_order(time_sums, urls, report_size)
+    stats = [all_stats[i] for i in selected]
+    time_sums = time_sums[selected]
+    times = list(map(attrgetter("times"), stats))
+    if None not in times:
+        counts, time_maxes, time_meds = grouped_stats(times)
+    else:
+        counts = np.fromiter(map(attrgetter("count"), stats), dtype=np.int64, count=len(stats))
+        time_maxes = np.fromiter(map(attrgetter("time_max"), stats), dtype=np.float64, count=len(stats))
+        time_meds = np.fromiter(map(attrgetter("time_med"), stats), dtype=np.float64, count=len(stats))
+    time_avgs = np.divide(time_sums, counts, out=np.zeros(len(stats)), where=counts > 0)
+    return stats, {
+        "url": [
+            url.decode("UTF-8", "replace") if isinstance(url, bytes) else url for url in map(urls.__getitem__, selected)
+        ],
+        "count": counts.tolist(),
+        "time_avg": round_array(time_avgs, exact=lambda i: stats[i].time_avg, tolerance=MEAN_TIE_TOLERANCE),
+        "time_max": round_array(time_maxes),
+        "time_sum": round_array(time_sums),
+        "time_med": round_array(time_meds),
+        "time_perc": round_array(100 * time_sums / total_time),
+        "count_perc": round_array(100 * counts / log_data.total_count),
+    }
@@ -0,0 +1,179 @@
+"""
+Tests for aggregation.py
+"""
+
+import io
+import random
+from statistics import median
+
+import pytest
+
+from src.aggregation import LogAggregator, QuantileSketch, UrlStats
+
+
+def test_quantile_sketch_accuracy():
+    """
+    Test sketch quantiles are within relative accuracy
+    :return:
+    """
+    rnd = random.Random(42)
+    values = [rnd.lognormvariate(-2, 1) for _ in range(10_001)]
+    sketch = QuantileSketch(0.01)
+    for value in values:
+        sketch.add(value)
+    ordered = sorted(values)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert sketch.quantile(q) == pytest.approx(ordered[int(q * (len(values) - 1))], rel=0.01)
+
+
+def test_quantile_sketch_merge():
+    """
+    Test merged sketch is the same as a sketch built from all values
+    :return:
+    """
+    values = [i / 1000 for i in range(1000)]
+    whole, left, right = QuantileSketch(0.02), QuantileSketch(0.02), QuantileSketch(0.02)
+    for value in values:
+        whole.add(value)
+    for value in values[:300]:
+        left.add(value)
+    for value in values[300:]:
+        right.add(value)
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.buckets == whole.buckets
+    assert left.quantile(0.5) == whole.quantile(0.5)
+    with pytest.raises(ValueError):
+        left.merge(QuantileSketch(0.01))
+
+
+@pytest.mark.parametrize("relative_accuracy", [None, 0.01])
+def test_log_aggregator(relative_accuracy):
+    """
+    Test aggregator keeps exact count, sum and max
+    :return:
+    """
+    aggregator = LogAggregator(relative_accuracy)
+    times = [0.1, 0.5, 0.2, 0.0, 1.5]
+    for request_time in times:
+        aggregator.add("/api", request_time)
+    aggregator.add("/other", 0.3)
+    stats = aggregator.urls["/api"]
+    assert stats.count == len(times)
+    assert stats.time_sum == pytest.approx(sum(times))
+    assert stats.time_max == max(times)
+    assert stats.time_med == pytest.approx(median(times), rel=0.01)
+    assert aggregator.total_count == len(times) + 1
+    assert list(aggregator.urls) == ["/api", "/other"]
+
+
+def test_log_aggregator_to_sketch():
+    """
+    Test request times replaced by sketches give the same stats as an aggregate built with sketches
+    :return:
+    """
+    random_times = random.Random(7)
+    exact, approximate = LogAggregator(histogram=True, time_bucket=5), LogAggregator(0.01, True, 5)
+    for _ in range(5000):
+        url, request_time = f"/api/{random_times.randrange(50)}", random_times.randrange(3000) / 1000
+        exact.add(url, request_time, 3)
+        approximate.add(url, request_time, 3)
+    exact.lines_count = approximate.lines_count = 5000
+
+    converted = exact.to_sketch(0.01)
+    assert converted.relative_accuracy == 0.01
+    assert converted.same_settings(approximate)
+    assert (converted.lines_count, converted.total_count) == (5000, 5000)
+    for url, stats in approximate.urls.items():
+        converted_stats = converted.urls[url]
+        assert converted_stats.count == stats.count
+        assert converted_stats.time_sum == pytest.approx(stats.time_sum)
+        assert converted_stats.time_max == stats.time_max
+        assert converted_stats.sketch.buckets == stats.sketch.buckets
+        assert converted_stats.histogram == stats.histogram
+        assert converted_stats.timeline == stats.timeline
+    assert approximate.to_sketch(0.01) is approximate
+
+
+@pytest.mark.parametrize("histogram", [False, True])
+@pytest.mark.parametrize("relative_accuracy", [None, 0.01])
+def test_log_aggregator_dump_load(relative_accuracy, histogram):
+    """
+    Test binary serialization roundtrip
+    :return:
+    """
+    aggregator = LogAggregator(relative_accuracy, histogram, 5 if histogram else 0, "[null, [true, true, []]]")
+    for i in range(500):
+        aggregator.add(f"/api/{i % 13}/ы", (i % 17) / 10, i % 288)
+    aggregator.lines_count, aggregator.failed_line_count = 510, 10
+    buffer = io.BytesIO()
+    aggregator.dump(buffer)
+    buffer.seek(0)
+
+    restored = LogAggregator.load(buffer)
+    assert restored.relative_accuracy == relative_accuracy
+    assert restored.histogram == histogram
+    assert restored.time_bucket == aggregator.time_bucket
+    assert restored.url_settings == aggregator.url_settings
+    assert restored.to_dict() == aggregator.to_dict()
+    with pytest.raises(ValueError):
+        LogAggregator.load(io.BytesIO(b"garbage"))
+
+
+@pytest.mark.parametrize("relative_accuracy", [None, 0.01])
+def test_log_aggregator_spill(tmp_path, relative_accuracy):
+    """
+    Test URL stats spilled to disk above the memory limit are merged back into the same stats
+    :return:
+    """
+    whole = LogAggregator(relative_accuracy, True, 5)
+    spilled = LogAggregator(relative_accuracy, True, 5)
+    spilled.memory_limit, spilled.spill_dir = 20_000, str(tmp_path)
+    for i in range(3000):
+        url, request_time = f"/api/{i * 7 % 101}/" if i % 3 else f"/bytes/{i}/".encode(), (i % 17) / 10
+        whole.add(url, request_time, i % 288)
+        spilled.add(url, request_time, i % 288)
+        if i % 100 == 0:
+            spilled.check_memory()
+    spilled.check_memory()
+    assert spilled.spilled is not None and len(spilled.spilled.runs) > 1
+    assert spilled.estimated_size() <= 20_000
+    assert len(spilled) == len(whole)
+    expected = whole.to_dict()
+    assert spilled.to_dict() == expected
+    # merging again gives the same stats: stats kept in memory are not changed by a merge
+    assert spilled.to_dict() == expected
+
+    buffer = io.BytesIO()
+    spilled.dump(buffer)
+    buffer.seek(0)
+    assert LogAggregator.load(buffer).to_dict() == expected
+
+    merged = LogAggregator(relative_accuracy, True, 5)
+    merged.merge(spilled)
+    assert merged.to_dict() == expected
+    spilled.spilled.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_latency_histogram_quantiles():
+    """
+    Test histogram percentiles are within a bucket of exact ones and merged histograms add up
+    :return:
+    """
+    rnd = random.Random(42)
+    values = [rnd.lognormvariate(-2, 1) for _ in range(10_001)]
+    whole, left, right = UrlStats(histogram=True), UrlStats(histogram=True), UrlStats(histogram=True)
+    for i, value in enumerate(values):
+        whole.add(value)
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+    assert left.histogram == whole.histogram
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        # 4 buckets per doubling: geometric middle of a bucket is within 2**(1/8) of any value in it
+        assert whole.time_quantile(q) == pytest.approx(ordered[int(q * (len(values) - 1))], rel=0.1)
+    assert whole.time_quantile(1.0) <= whole.time_max
+    assert UrlStats(histogram=True).time_quantile(0.99) == 0.0
+    with pytest.raises(ValueError):
+        whole.merge(UrlStats())
@@ -0,0 +1,114 @@
+"""
+Tests for backfill of rotated logs without reports
+"""
+
+import gzip
+import json
+import sys
+import tracemalloc
+
+import pytest
+
+from src.log_analyzer import config, find_backlog, main, run_backfill
+from tests.test_parse_logs import make_log_lines
+
+
+def test_run_backfill(tmp_path, capsys):
+    """
+    Test every rotated log without a report is processed and summarized
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    report_dir.mkdir()
+    lines = "".join(make_log_lines(100))
+    (log_dir / "nginx-access-ui.log-20261001").write_text(lines, encoding="UTF-8")
+    with gzip.open(log_dir / "nginx-access-ui.log-20261002.gz", "wt", encoding="UTF-8") as file:
+        file.write(lines)
+    (log_dir / "nginx-access-ui.log-20261003").write_text(lines, encoding="UTF-8")
+    (log_dir / "nginx-access-ui.log-2026100").write_text(lines, encoding="UTF-8")
+    (log_dir / "nginx-access-ui.log").write_text(lines, encoding="UTF-8")
+    (report_dir / "report-2026.10.03.html").write_text("done", encoding="UTF-8")
+
+    backlog = find_backlog(log_dir, report_dir)
+    assert [log_date for _, log_date in backlog] == ["2026.10.01", "2026.10.02"]
+
+    updated_config = dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir))
+    results = run_backfill(updated_config, workers=2)
+    assert sorted(result.log_date for result in results) == ["2026.10.01", "2026.10.02"]
+    assert all(result.lines_read == 100 and result.lines_failed == 0 for result in results)
+    for log_date in ("2026.10.01", "2026.10.02"):
+        assert (report_dir / f"report-{log_date}.html").exists()
+        assert (report_dir / f"report-{log_date}.agg.gz").exists()
+    assert (report_dir / "report-2026.10.03.html").read_text(encoding="UTF-8") == "done"
+    summary = capsys.readouterr().out
+    assert "nginx-access-ui.log-20261002.gz" in summary
+    assert "total" in summary
+    assert find_backlog(log_dir, report_dir) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_backfill_failed_file(tmp_path, workers):
+    """
+    Test a log file that fails to process doesn't stop the backfill of the others
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    report_dir.mkdir()
+    lines = "".join(make_log_lines(100))
+    (log_dir / "nginx-access-ui.log-20261001").write_text(lines, encoding="UTF-8")
+    (log_dir / "nginx-access-ui.log-20261002").write_text(lines, encoding="UTF-8")
+    # the day aggregate of the first log can't be written
+    (report_dir / "report-2026.10.01.agg.gz").mkdir()
+
+    updated_config = dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir))
+    results = run_backfill(updated_config, workers=workers)
+    assert [result.log_date for result in results] == ["2026.10.02"]
+    assert (report_dir / "report-2026.10.02.html").exists()
+    assert [log_date for _, log_date in find_backlog(log_dir, report_dir)] == ["2026.10.01"]
+
+
+def test_run_backfill_deleted_report(tmp_path):
+    """
+    Test a report deleted after it was generated is generated again
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    report_dir.mkdir()
+    (log_dir / "nginx-access-ui.log-20261001").write_text("".join(make_log_lines(100)), encoding="UTF-8")
+    updated_config = dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir))
+    assert [result.log_date for result in run_backfill(updated_config)] == ["2026.10.01"]
+    assert run_backfill(updated_config) == []
+
+    (report_dir / "report-2026.10.01.html").unlink()
+    assert [result.log_date for result in run_backfill(updated_config)] == ["2026.10.01"]
+    assert (report_dir / "report-2026.10.01.html").exists()
+
+
+def test_main_mode(tmp_path, monkeypatch):
+    """
+    Test the run dispatched by main is the one its metrics are labeled with, memory is traced during the run
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    (log_dir / "nginx-access-ui.log-20261001").write_text("".join(make_log_lines(100)), encoding="UTF-8")
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"LOG_DIR": str(log_dir), "REPORT_DIR": str(report_dir)}), encoding="UTF-8")
+    argv = [
+        "log_analyzer",
+        "-c",
+        str(config_file),
+        "--range",
+        "2026.10.01:2026.10.01",
+        "--backfill",
+        "--profile-memory",
+    ]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    main(config)
+    assert (report_dir / "report-2026.10.01.html").exists()
+    assert 'mode="backfill"' in (report_dir / "log_analyzer.prom").read_text(encoding="UTF-8")
+    assert not tracemalloc.is_tracing()
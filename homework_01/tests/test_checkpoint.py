@@ -0,0 +1,185 @@
+"""
+Tests for incremental parsing with checkpoints
+"""
+
+import gzip
+import os
+
+import pytest
+
+import src.log_analyzer
+from src.aggregation import LogAggregator
+from src.checkpoint import (
+    Checkpoint,
+    ParseCheckpoint,
+    load_checkpoint,
+    load_parse_checkpoint,
+    save_checkpoint,
+    save_parse_checkpoint,
+)
+from src.log_analyzer import (
+    ParseProgress,
+    ParseSettings,
+    config,
+    create_log_stats,
+    parse_log_tail,
+    parse_logs,
+    run_incremental,
+)
+from src.readers import iter_log_line_blocks_from
+from tests.test_parse_logs import make_log_lines
+
+
+def test_parse_log_tail(tmp_path):
+    """
+    Test appended lines are parsed incrementally, unterminated line is left for the next run
+    :return:
+    """
+    lines = make_log_lines(300)
+    log_file = tmp_path / "nginx-access-ui.log"
+    log_file.write_text("".join(lines[:100]) + lines[100][:20], encoding="UTF-8")
+
+    aggregator = LogAggregator()
+    offset = parse_log_tail(log_file, 0, aggregator)
+    assert offset == len("".join(lines[:100]).encode())
+    assert aggregator.lines_count == 100
+
+    log_file.write_text("".join(lines), encoding="UTF-8")
+    offset = parse_log_tail(log_file, offset, aggregator)
+    assert offset == log_file.stat().st_size
+    assert create_log_stats(aggregator, 100) == create_log_stats(parse_logs(log_file), 100)
+
+
+def test_run_incremental_rotation(tmp_path, monkeypatch):
+    """
+    Test lines appended before the rotation are parsed from the rotated log into the report of its date
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    log_file = log_dir / "nginx-access-ui.log"
+    lines = make_log_lines(20)
+    log_file.write_text("".join(lines[:10]), encoding="UTF-8")
+    updated_config = dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir))
+    reports = {}
+    monkeypatch.setattr(
+        src.log_analyzer,
+        "render_report",
+        lambda _, log_date, aggregator, __: reports.update({log_date: aggregator.lines_count}),
+    )
+    run_incremental(updated_config)
+    checkpoint_file = report_dir / ".incremental-checkpoint"
+    checkpoint = load_checkpoint(checkpoint_file)
+    checkpoint.log_date = "2026.10.17"
+    save_checkpoint(checkpoint_file, checkpoint)
+
+    with open(log_file, "a", encoding="UTF-8") as file:
+        file.write("".join(lines[10:15]))
+    os.rename(log_file, log_dir / "nginx-access-ui.log-20261017")
+    log_file.write_text("".join(lines[15:]), encoding="UTF-8")
+    run_incremental(updated_config)
+    assert reports.pop("2026.10.17") == 15
+    assert list(reports.values()) == [5]
+    assert load_checkpoint(checkpoint_file).inode == log_file.stat().st_ino
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    """
+    Test checkpoint is restored with the same aggregate
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log"
+    log_file.write_text("".join(make_log_lines(50)), encoding="UTF-8")
+    aggregator = parse_logs(log_file, settings=ParseSettings(relative_accuracy=0.01))
+    checkpoint_file = tmp_path / "reports" / "checkpoint"
+    save_checkpoint(
+        checkpoint_file,
+        Checkpoint(str(log_file), log_file.stat().st_ino, log_file.stat().st_size, "2017.06.30", aggregator),
+    )
+
+    checkpoint = load_checkpoint(checkpoint_file)
+    assert checkpoint is not None
+    assert checkpoint.matches(log_file, 0.01)
+    assert not checkpoint.matches(log_file, None)
+    assert not checkpoint.matches(log_file, 0.01, url_settings="[null, [true, true, []]]")
+    assert create_log_stats(checkpoint.aggregator, 100) == create_log_stats(aggregator, 100)
+    assert load_checkpoint(tmp_path / "missing.json") is None
+
+
+@pytest.mark.parametrize("suffix,workers,use_mmap", [("", 1, True), ("", 1, False), (".gz", 1, True), ("", 2, True)])
+def test_parse_logs_resume(tmp_path, suffix, workers, use_mmap):
+    """
+    Test parsing resumes from a checkpoint left by a killed run and the checkpoint is removed once the log is parsed
+    :return:
+    """
+    lines = make_log_lines(1000)
+    log_file = tmp_path / f"nginx-access-ui.log-20170630{suffix}"
+    data = "".join(lines).encode()
+    log_file.write_bytes(gzip.compress(data) if suffix else data)
+    head_file = tmp_path / "head.log"
+    head_file.write_text("".join(lines[:400]), encoding="UTF-8")
+    settings = ParseSettings(use_mmap=use_mmap, checkpoint_interval=3600)
+    head = parse_logs(head_file, settings=settings)
+    # the URL shows the aggregate was taken from the checkpoint, not parsed again
+    head.add(b"/resumed", 1.0)
+    checkpoint_file = tmp_path / "reports" / ".parse-checkpoint"
+    save_parse_checkpoint(
+        checkpoint_file,
+        ParseCheckpoint(
+            str(log_file),
+            *ParseCheckpoint.file_identity(log_file),
+            settings.checkpoint_key(),
+            offset=head_file.stat().st_size,
+            aggregator=head,
+        ),
+    )
+
+    resumed = parse_logs(log_file, workers, settings, checkpoint_file)
+    full = parse_logs(log_file, settings=settings)
+    assert b"/resumed" in resumed.urls
+    assert resumed.lines_count == full.lines_count == 1000
+    assert resumed.total_count == full.total_count + 1
+    del resumed.urls[b"/resumed"]
+    resumed.total_count -= 1
+    resumed.total_time -= 1.0
+    assert create_log_stats(resumed, 100) == create_log_stats(full, 100)
+    assert not checkpoint_file.exists()
+
+
+def test_parse_progress(tmp_path):
+    """
+    Test checkpoints are saved and only resumed for the same unchanged file and settings
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(make_log_lines(100)), encoding="UTF-8")
+    checkpoint_file = tmp_path / ".parse-checkpoint"
+    settings = ParseSettings(checkpoint_interval=1e-9)
+    aggregator = parse_logs(log_file, settings=settings)
+    ParseProgress(log_file, checkpoint_file, settings)(123, aggregator)
+    checkpoint = load_parse_checkpoint(checkpoint_file)
+    assert checkpoint is not None and checkpoint.offset == 123
+    assert checkpoint.aggregator.lines_count == 100
+
+    offset, resumed = ParseProgress(log_file, checkpoint_file, settings).resume()
+    assert offset == 123 and resumed is not None
+    assert ParseProgress(log_file, checkpoint_file, ParseSettings(relative_accuracy=0.01)).resume() == (0, None)
+    with open(log_file, "a", encoding="UTF-8") as file:
+        file.write(make_log_lines(1)[0])
+    assert ParseProgress(log_file, checkpoint_file, settings).resume() == (0, None)
+
+
+@pytest.mark.parametrize("suffix,use_mmap", [("", True), ("", False), (".gz", True)])
+def test_iter_log_line_blocks_from(tmp_path, suffix, use_mmap):
+    """
+    Test reading from a line offset, blocks end at the reported offsets
+    :return:
+    """
+    lines = make_log_lines(100)
+    log_file = tmp_path / f"nginx-access-ui.log-20170630{suffix}"
+    data = "".join(lines).encode()
+    log_file.write_bytes(gzip.compress(data) if suffix else data)
+    offset = len("".join(lines[:30]).encode())
+    blocks = list(iter_log_line_blocks_from(log_file, offset, use_mmap=use_mmap))
+    assert blocks[-1][0] == len(data)
+    assert [line for _, block in blocks for line in block] == [line.rstrip("\n").encode() for line in lines[30:]]
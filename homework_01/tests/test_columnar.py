@@ -0,0 +1,126 @@
+"""
+Tests for columnar export of parsed log records
+"""
+
+import io
+
+import pytest
+
+from src.columnar import ColumnarWriter, iter_columnar_batches, read_columnar_header
+from src.log_analyzer import (
+    ParseSettings,
+    config,
+    create_log_stats,
+    export_columnar,
+    parse_columnar,
+    parse_logs,
+    parse_time_local,
+    run_columnar_report,
+)
+from src.normalize import UrlNormalizer
+from tests.test_parse_logs import make_log_lines
+
+
+def test_columnar_round_trip():
+    """
+    Test records survive writing in several batches with growing dictionaries
+    :return:
+    """
+    file = io.BytesIO()
+    writer = ColumnarWriter(file, "2017.06.29", batch_size=3)
+    records = [
+        (1498697422 + i, 180, f"/url/{i % 4}".encode(), 200 + i % 2, i * 10, i / 7, f"10.0.0.{i % 3}".encode())
+        for i in range(10)
+    ]
+    for record in records:
+        writer.add(*record)
+    writer.flush()
+
+    file.seek(0)
+    assert read_columnar_header(file) == "2017.06.29"
+    actual = []
+    for batch in iter_columnar_batches(file):
+        assert len(batch) <= 3
+        columns = batch.columns
+        for i in range(len(batch)):
+            actual.append(
+                (
+                    columns["timestamp"][i],
+                    columns["utc_offset"][i],
+                    batch.urls[columns["url"][i]],
+                    columns["status"][i],
+                    columns["body_bytes_sent"][i],
+                    columns["request_time"][i],
+                    batch.remote_addrs[columns["remote_addr"][i]],
+                )
+            )
+    assert actual == records
+
+
+def test_columnar_truncated():
+    """
+    Test truncated file is rejected instead of being read partially
+    :return:
+    """
+    file = io.BytesIO()
+    writer = ColumnarWriter(file, "2017.06.29")
+    writer.add(1498697422, 180, b"/url", 200, 10, 0.5, b"10.0.0.1")
+    writer.flush()
+    truncated = io.BytesIO(file.getvalue()[:-4])
+    read_columnar_header(truncated)
+    with pytest.raises(ValueError):
+        list(iter_columnar_batches(truncated))
+    with pytest.raises(ValueError):
+        read_columnar_header(io.BytesIO(b"LCOL"))
+
+
+def test_parse_time_local():
+    """
+    Test $time_local is converted to epoch seconds and UTC offset
+    :return:
+    """
+    assert parse_time_local(b"29/Jun/2017:03:50:22 +0300") == (1498697422, 180)
+    assert parse_time_local(b"29/Jun/2017:00:50:22 +0000") == (1498697422, 0)
+    with pytest.raises(ValueError):
+        parse_time_local(b"29/Jun/2017")
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        ParseSettings(),
+        ParseSettings(time_bucket=5, histogram=True),
+        ParseSettings(normalizer=UrlNormalizer(templates=[["^/api/v2/banner/.*$", "/api/v2/banner/*"]])),
+    ],
+)
+def test_parse_columnar_same_stats(tmp_path, settings):
+    """
+    Test report stats from columnar file are the same as from the raw log
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(make_log_lines(500)) + "broken line\n", encoding="UTF-8")
+    columnar_file = tmp_path / "export" / "log.col"
+    assert export_columnar(log_file, columnar_file, "2017.06.30", settings) == (501, 1)
+
+    log_date, log_data = parse_columnar(columnar_file, settings)
+    assert log_date == "2017.06.30"
+    assert log_data.lines_count == 500
+    expected = parse_logs(log_file, 1, settings)
+    percentiles = [95] if settings.histogram else []
+    assert create_log_stats(log_data, 1000, percentiles) == create_log_stats(expected, 1000, percentiles)
+
+
+def test_run_columnar_report(tmp_path):
+    """
+    Test report is generated from columnar file
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(make_log_lines(100)), encoding="UTF-8")
+    columnar_file = tmp_path / "log.col"
+    export_columnar(log_file, columnar_file, "2017.06.30")
+    report_dir = tmp_path / "reports"
+    run_columnar_report(dict(config, REPORT_DIR=str(report_dir)), columnar_file)
+    assert (report_dir / "report-2017.06.30.html").exists()
+    assert (report_dir / "report-2017.06.30.agg.gz").exists()
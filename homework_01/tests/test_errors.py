@@ -0,0 +1,67 @@
+"""
+Tests for accounting of failed log lines
+"""
+
+import json
+
+from src.errors import MAX_SAMPLE_LINE, ParseErrors
+from src.log_analyzer import ParseSettings, classify_failed_line, parse_logs
+from tests.test_parse_logs import make_log_lines
+
+
+def test_parse_errors_reservoir():
+    """
+    Test failed lines are counted by kind and only a bounded sample is kept
+    :return:
+    """
+    errors = ParseErrors(sample_size=5, seed=1)
+    for i in range(10000):
+        errors.add("empty" if i % 4 else "bad_request_time", b"x" * (i % 3000))
+    assert errors.count == 10000
+    assert errors.kinds == {"bad_request_time": 2500, "empty": 7500}
+    assert len(errors.sample) == 5
+    assert all(len(line) <= MAX_SAMPLE_LINE for _, line in errors.sample)
+
+    other = ParseErrors(sample_size=5, seed=2)
+    other.add("unsupported_request", "GET")
+    errors.merge(other)
+    assert errors.count == 10001
+    assert errors.kinds["unsupported_request"] == 1
+    assert len(errors.sample) == 5
+
+    small = ParseErrors(sample_size=5)
+    small.add("empty", b"")
+    small.merge(other)
+    assert sorted(small.sample) == [("empty", ""), ("unsupported_request", "GET")]
+    small.clear()
+    assert not small and small.sample == []
+
+
+def test_classify_failed_line():
+    """
+    Test failure kinds of unparseable lines
+    :return:
+    """
+    assert classify_failed_line(b"  ") == "empty"
+    assert classify_failed_line(b'1.1.1.1 -  - [29/Jun/2017:03:50:22 +0300] "0" 400 166 0.000') == "unsupported_request"
+    assert classify_failed_line('1.1.1.1 "GET /api HTTP/1.1" 200 927 -') == "bad_request_time"
+
+
+def test_parse_logs_reports_errors_once(tmp_path, capsys):
+    """
+    Test failed lines are written as a single record with a sample, in single and multi process runs
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    lines = make_log_lines(1000)
+    lines[::10] = ["broken line\n"] * 100
+    log_file.write_text("".join(lines), encoding="UTF-8")
+
+    for workers in (1, 3):
+        capsys.readouterr()
+        log_data = parse_logs(log_file, workers, ParseSettings(error_sample_size=3))
+        assert log_data.failed_line_count == 100
+        records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        (record,) = [record for record in records if record["level"] == "error"]
+        assert record["kinds"] == {"unsupported_request": 100}
+        assert record["sample"] == [{"kind": "unsupported_request", "line": "broken line"}] * 3
@@ -0,0 +1,36 @@
+"""
+Tests for synthetic log generator used by benchmarks
+"""
+
+from collections import Counter
+
+from benchmarks.generate_log import generate_log_lines, write_log
+from src.log_analyzer import parse_logs
+
+
+def test_generate_log_lines_deterministic():
+    """
+    Test the same arguments give the same lines and URL popularity follows the skew
+    :return:
+    """
+    lines = list(generate_log_lines(2000, urls=50, skew=1.5, seed=7))
+    assert lines == list(generate_log_lines(2000, urls=50, skew=1.5, seed=7))
+    assert lines != list(generate_log_lines(2000, urls=50, skew=1.5, seed=8))
+    assert len(lines) == 2000
+    popularity = Counter(line.split('"')[1] for line in lines).most_common()
+    assert popularity[0][0] == "GET /api/v2/banner/0 HTTP/1.1"
+    assert popularity[0][1] > 10 * popularity[-1][1]
+
+
+def test_write_log_malformed(tmp_path):
+    """
+    Test malformed lines are written at the configured rate in plain and gzip logs
+    :return:
+    """
+    for name in ("nginx-access-ui.log-20170630", "nginx-access-ui.log-20170630.gz"):
+        log_file = tmp_path / name
+        write_log(log_file, 5000, urls=100, malformed_rate=0.1)
+        log_data = parse_logs(log_file)
+        assert log_data.lines_count == 5000
+        assert 400 < log_data.failed_line_count < 600
+        assert len(log_data) == 100
@@ -0,0 +1,160 @@
+"""
+Tests for logs in custom nginx log_format
+"""
+
+import json
+import pickle
+import sys
+
+import pytest
+
+from benchmarks.generate_log import generate_log_lines
+from src.log_analyzer import ParseSettings, config, create_log_stats, main, parse_logs
+from src.log_format import LogFormat, split_log_format
+
+UI_SHORT = (
+    '$remote_addr  $remote_user $http_x_real_ip [$time_local] "$request" '
+    '$status $body_bytes_sent "$http_referer" '
+    '"$http_user_agent" "$http_x_forwarded_for" "$http_X_REQUEST_ID" "$http_X_RB_USER" '
+    "$request_time"
+)
+VHOST = '$host $remote_addr [$time_iso8601] $request_uri $status ${request_time}s "$http_user_agent"'
+
+
+def test_split_log_format():
+    """
+    Test format is split into literals and variables, braces and case of variables are normalized
+    :return:
+    """
+    assert split_log_format('[$time_local] "${request}"$REQUEST_TIME') == [
+        ("literal", "["),
+        ("variable", "time_local"),
+        ("literal", '] "'),
+        ("variable", "request"),
+        ("literal", '"'),
+        ("variable", "request_time"),
+    ]
+
+
+def test_log_format_captures_needed_fields_only():
+    """
+    Test only URL, request time and, for time buckets, time are captured
+    :return:
+    """
+    assert LogFormat(UI_SHORT).regex.groups == 2
+    assert LogFormat(UI_SHORT, time_of_day=True).regex.groups == 3
+
+    log_format = LogFormat(VHOST, time_of_day=True)
+    line = b'example.com 1.2.3.4 [2017-06-29T03:50:22+03:00] /api/1/?a=b 200 0.133s "Lynx 2.8"\n'
+    assert log_format.parse(line) == (b"/api/1/?a=b", 0.133, b"03:50")
+    assert log_format.parse(b"example.com 1.2.3.4 [2017-06-29T03:50:22+03:00] /api/1/ 200 -s\n")[0] is None
+
+
+def test_log_format_invalid():
+    """
+    Test format without fields the report needs is rejected
+    :return:
+    """
+    with pytest.raises(ValueError, match="request_uri"):
+        LogFormat("$remote_addr $request_time")
+    with pytest.raises(ValueError, match="request_time"):
+        LogFormat('"$request" $status')
+    with pytest.raises(ValueError, match="time_local"):
+        LogFormat('"$request" $request_time', time_of_day=True)
+    with pytest.raises(ValueError, match="LOG_FORMAT"):
+        ParseSettings.from_config({"LOG_FORMAT": "$request_uri"})
+
+
+def test_parse_settings_invalid():
+    """
+    Test every invalid setting is rejected with a message naming it
+    :return:
+    """
+    with pytest.raises(ValueError, match="MEDIAN_ACCURACY"):
+        ParseSettings.from_config({"MEDIAN": "approximate", "MEDIAN_ACCURACY": 1.5})
+    with pytest.raises(ValueError, match="MEDIAN_ACCURACY"):
+        ParseSettings.from_config({"MEDIAN_ACCURACY": "high"})
+    with pytest.raises(ValueError, match=r"URL_NORMALIZATION\.TEMPLATES pattern '\^/api/\('"):
+        ParseSettings.from_config({"URL_NORMALIZATION": {"TEMPLATES": [["^/api/(", "/api/"]]}})
+
+
+def test_main_invalid_config(tmp_path, monkeypatch):
+    """
+    Test the run stops without a report on an invalid regex in URL normalization templates
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    (log_dir / "nginx-access-ui.log-20261001").write_text("", encoding="UTF-8")
+    config_file = tmp_path / "config.json"
+    config_file.write_text(
+        json.dumps(
+            {
+                "LOG_DIR": str(log_dir),
+                "REPORT_DIR": str(report_dir),
+                "URL_NORMALIZATION": {"TEMPLATES": [["^/api/(", "/api/"]]},
+            }
+        ),
+        encoding="UTF-8",
+    )
+    monkeypatch.setattr(sys, "argv", ["log_analyzer", "-c", str(config_file)])
+
+    # update_config changes the config passed in
+    main(dict(config))
+    assert not report_dir.exists()
+
+
+def test_log_format_classify():
+    """
+    Test failed lines are classified like the default parser does
+    :return:
+    """
+    log_format = LogFormat(UI_SHORT)
+    assert log_format.classify(b"\n") == "empty"
+    assert log_format.classify(b"truncated line\n") == "format_mismatch"
+    assert log_format.classify(b'1.1.1.1 -  - [29/Jun/2017:03:50:22 +0300] "0" 400 0 "-" "-" "-" "-" "-" 0.0\n') == (
+        "unsupported_request"
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_logs_ui_short_format(tmp_path, workers):
+    """
+    Test ui_short given as LOG_FORMAT gives the same stats, timelines and failed line counts as the default parser
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(generate_log_lines(5000, urls=50, malformed_rate=0.05)), encoding="UTF-8")
+    config = {"TIME_BUCKET_MINUTES": 60}
+    default = parse_logs(log_file, workers, ParseSettings.from_config(config))
+    settings = ParseSettings.from_config({**config, "LOG_FORMAT": UI_SHORT})
+    # settings are sent to parse workers
+    assert pickle.loads(pickle.dumps(settings)).log_format.regex.pattern == settings.log_format.regex.pattern
+    custom = parse_logs(log_file, workers, settings)
+
+    assert (custom.lines_count, custom.failed_line_count) == (default.lines_count, default.failed_line_count)
+    assert create_log_stats(custom, 100) == create_log_stats(default, 100)
+    assert {url: stats.timeline for url, stats in custom.items()} == {
+        url: stats.timeline for url, stats in default.items()
+    }
+
+
+def test_parse_logs_vhost_format(tmp_path):
+    """
+    Test log in a format with request time in the middle of the line
+    :return:
+    """
+    log_file = tmp_path / "access.log"
+    log_file.write_text(
+        'a.com 1.2.3.4 [2017-06-29T03:50:22+03:00] /api/1/ 200 0.100s "-"\n'
+        'b.com 1.2.3.4 [2017-06-29T03:51:22+03:00] /api/1/ 200 0.300s "Lynx"\n'
+        'b.com 1.2.3.4 [2017-06-29T03:52:22+03:00] /api/2/ 200 1.000s "Lynx"\n'
+        "broken\n",
+        encoding="UTF-8",
+    )
+    log_data = parse_logs(log_file, 1, ParseSettings.from_config({"LOG_FORMAT": VHOST}))
+    assert (log_data.lines_count, log_data.failed_line_count) == (4, 1)
+    assert [(row["url"], row["count"], row["time_med"]) for row in create_log_stats(log_data, 10)] == [
+        ("/api/2/", 1, 1.0),
+        ("/api/1/", 2, 0.2),
+    ]
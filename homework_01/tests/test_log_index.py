@@ -0,0 +1,104 @@
+"""
+Tests for the index of rotated log files
+"""
+
+import os
+
+import pytest
+
+from src import log_index as log_index_module
+from src.log_analyzer import config, get_log_file_and_date, open_log_index
+from src.log_index import LogIndex, parse_log_name
+
+
+def test_parse_log_name():
+    """
+    Test only rotated logs with a valid date are recognized
+    :return:
+    """
+    assert parse_log_name("nginx-access-ui.log-20170630") == "2017.06.30"
+    assert parse_log_name("nginx-access-ui.log-20170630.gz") == "2017.06.30"
+    assert parse_log_name("nginx-access-ui.log-2017063") is None
+    assert parse_log_name("nginx-access-ui.log-20171332") is None
+    assert parse_log_name("nginx-access-ui.log-20170630.bz2") is None
+    assert parse_log_name("nginx-access-ui.log") is None
+
+
+@pytest.fixture(name="log_dir")
+def fixture_log_dir(tmp_path):
+    """
+    Log folder with a few rotated logs, their folder mtime is in the past
+    """
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    for name in (
+        "nginx-access-ui.log-20170629.gz",
+        "nginx-access-ui.log-20170630.gz",
+        "nginx-access-ui.log-20170630",
+        "nginx-access-ui.log-2017070",
+        "nginx-access-ui.log",
+    ):
+        (log_dir / name).write_text("line\n", encoding="UTF-8")
+    os.utime(log_dir, (1_000_000_000, 1_000_000_000))
+    return log_dir
+
+
+def test_log_index_lookup(log_dir, tmp_path):
+    """
+    Test lookups of the latest, a specific date and unprocessed logs, and index persistence
+    :return:
+    """
+    index_file = tmp_path / "index.json"
+    log_index = LogIndex.load(log_dir, index_file)
+    assert log_index.refresh() == ["nginx-access-ui.log-2017070"]
+    assert log_index.path(log_index.latest()) == log_dir / "nginx-access-ui.log-20170630"
+    assert log_index.get("2017.06.29").name == "nginx-access-ui.log-20170629.gz"
+    assert log_index.get("2017.07.01") is None
+    log_index.mark_processed("2017.06.29")
+    assert [entry.log_date for entry in log_index.unprocessed()] == ["2017.06.30"]
+    log_index.save()
+
+    loaded = LogIndex.load(log_dir, index_file)
+    assert loaded.entries == log_index.entries
+    assert LogIndex.load(log_dir / "other", index_file).entries == {}
+
+
+def test_log_index_refresh_changed_only(log_dir, tmp_path, monkeypatch):
+    """
+    Test the folder is not listed while it is unchanged and only new files are stat'ed
+    :return:
+    """
+    log_index = LogIndex(log_dir, tmp_path / "index.json")
+    log_index.refresh()
+    log_index.mark_processed("2017.06.30")
+
+    def fail_scandir(path):
+        raise AssertionError(f"{path} is listed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(log_index_module.os, "scandir", fail_scandir)
+        assert log_index.refresh() == []
+
+    (log_dir / "nginx-access-ui.log-20170701").write_text("line\n", encoding="UTF-8")
+    (log_dir / "nginx-access-ui.log-20170629.gz").unlink()
+    log_index.refresh()
+    assert [entry.log_date for entry in log_index.unprocessed()] == ["2017.07.01"]
+    assert log_index.get("2017.06.29") is None
+    assert log_index.get("2017.06.30").processed
+
+
+def test_get_log_file_and_date(log_dir, tmp_path):
+    """
+    Test the latest log is found by date with and without a persistent index
+    :return:
+    """
+    expected = (log_dir / "nginx-access-ui.log-20170630", "2017.06.30")
+    assert get_log_file_and_date(log_dir) == expected
+    report_dir = tmp_path / "reports"
+    report_dir.mkdir()
+    (report_dir / "report-2017.06.29.html").write_text("done", encoding="UTF-8")
+    log_index = open_log_index(dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir)))
+    assert get_log_file_and_date(log_dir, log_index) == expected
+    assert [entry.log_date for entry in log_index.unprocessed()] == ["2017.06.30"]
+    assert (report_dir / ".log-index.json").exists()
+    assert get_log_file_and_date(tmp_path / "missing")[1] == ""
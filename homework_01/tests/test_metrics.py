@@ -0,0 +1,62 @@
+"""
+Tests for metrics.py
+"""
+
+from src.aggregation import LogAggregator
+from src.memory import MemoryProfile, aggregate_memory
+from src.metrics import RunMetrics
+
+
+def test_run_metrics(tmp_path):
+    """
+    Test summary and Prometheus textfile of a run
+    :return:
+    """
+    metrics = RunMetrics("daily")
+    with metrics.phase("parse"):
+        metrics.add_parsed(lines_read=100, lines_failed=3, bytes_read=2048)
+    metrics.add_parsed(lines_read=50, lines_failed=0, bytes_read=1024)
+
+    summary = metrics.as_dict()
+    assert summary["lines_read"] == 150
+    assert summary["lines_failed"] == 3
+    assert summary["bytes_read"] == 3072
+    assert summary["phase_seconds"]["parse"] > 0
+    assert summary["lines_per_second"] > 0
+    assert summary["peak_rss_bytes"] > 0
+
+    metrics_file = tmp_path / "metrics" / "log_analyzer.prom"
+    metrics.write_prometheus(metrics_file)
+    content = metrics_file.read_text(encoding="UTF-8")
+    assert 'log_analyzer_last_run_lines_failed{mode="daily"} 3\n' in content
+    assert 'log_analyzer_last_run_phase_seconds{mode="daily",phase="render"} 0.0\n' in content
+    assert not (tmp_path / "metrics" / "log_analyzer.prom.tmp").exists()
+
+
+def test_memory_profile():
+    """
+    Test memory profile accounts phase peaks and breaks down the aggregate
+    :return:
+    """
+    aggregator = LogAggregator(None, True, 5)
+    for i in range(1000):
+        aggregator.add(f"/api/{i % 50}/".encode(), i / 1000, i % 288)
+    sizes = aggregate_memory(aggregator)
+    assert all(sizes[part] > 0 for part in ("urls", "url_stats", "times", "histograms", "timelines"))
+    assert sizes["sketches"] == 0
+
+    metrics = RunMetrics("daily")
+    metrics.memory_profile = MemoryProfile(top=3)
+    try:
+        with metrics.phase("parse"):
+            data = [bytes(1000) for _ in range(1000)]
+        metrics.observe_aggregate(aggregator)
+        summary = metrics.memory_profile.summary()
+    finally:
+        metrics.memory_profile.stop()
+    del data
+    assert summary["phase_peak_bytes"]["parse"] >= 1_000_000
+    assert summary["traced_peak_bytes"] >= summary["phase_peak_bytes"]["parse"]
+    assert summary["aggregate_bytes"] == sizes
+    assert summary["aggregate_estimated_bytes"] == aggregator.estimated_size()
+    assert len(summary["top_allocations"]) == 3
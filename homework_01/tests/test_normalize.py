@@ -0,0 +1,54 @@
+"""
+Tests for normalize.py
+"""
+
+import pickle
+
+from src.log_analyzer import ParseSettings, create_log_stats, parse_logs
+from src.normalize import UrlNormalizer
+from tests.test_parse_logs import make_log_lines
+
+
+def test_url_normalizer_default_rules():
+    """
+    Test query string is stripped, numeric and UUID segments are replaced
+    :return:
+    """
+    normalizer = UrlNormalizer()
+    assert normalizer(b"/api/v2/banner/12345") == b"/api/v2/banner/{id}"
+    assert normalizer(b"/api/v2/group/7786679/statistic/sites/?date_type=day") == b"/api/v2/group/{id}/statistic/sites/"
+    assert normalizer(b"/api/1/campaigns/?id=1") == b"/api/{id}/campaigns/"
+    assert normalizer(b"/export/3fa85f64-5717-4562-b3fc-2c963f66afa6/file") == b"/export/{uuid}/file"
+    assert normalizer(b"/api/v2/banner12/") == b"/api/v2/banner12/"
+
+
+def test_url_normalizer_templates():
+    """
+    Test the first matching custom template wins over default rules
+    :return:
+    """
+    normalizer = UrlNormalizer.from_config(
+        {
+            "STRIP_QUERY": False,
+            "TEMPLATES": [[r"^/api/v2/banner/\d+/statistic/", "/api/v2/banner/{banner_id}/statistic/"]],
+        }
+    )
+    assert normalizer is not None
+    assert normalizer(b"/api/v2/banner/1/statistic/?date=1") == b"/api/v2/banner/{banner_id}/statistic/?date=1"
+    assert normalizer(b"/api/v2/banner/1?x=2") == b"/api/v2/banner/{id}?x=2"
+    assert UrlNormalizer.from_config(None) is None
+    assert pickle.loads(pickle.dumps(normalizer))(b"/api/v2/banner/1") == b"/api/v2/banner/{id}"
+
+
+def test_parse_logs_normalized(tmp_path):
+    """
+    Test URLs are normalized before aggregation
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(make_log_lines(500)), encoding="UTF-8")
+    settings = ParseSettings(normalizer=UrlNormalizer())
+    for workers in (1, 2):
+        log_stats = create_log_stats(parse_logs(log_file, workers, settings), 100)
+        assert [row["url"] for row in log_stats] == ["/api/v2/banner/{id}"]
+        assert log_stats[0]["count"] == 500
@@ -0,0 +1,181 @@
+"""
+Tests for log file parsing in log_analyzer.py
+"""
+
+import gzip
+
+import pytest
+
+from benchmarks.generate_log import generate_log_lines
+from src.log_analyzer import ParseSettings, create_log_stats, parse_logs, split_file_ranges
+from src.readers import find_gzip_pipe, iter_gzip_chunks, iter_line_blocks, iter_log_line_blocks, iter_mmap_line_blocks
+
+LOG_LINE = (
+    '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] "GET {url} HTTP/1.1" 200 927 "-" '
+    '"Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5" "-" "1498697422-2190034393-4708-9752759" '
+    '"dc7161be3" {request_time}\n'
+)
+
+
+def make_log_lines(count: int = 1000) -> list:
+    """
+    Generate log lines with a few distinct URLs
+    :param count: Number of lines
+    :return: List of log lines
+    """
+    return [
+        LOG_LINE.format(url=f"/api/v2/banner/{i % 37}", request_time=f"{(i % 113) / 100:.3f}") for i in range(count)
+    ]
+
+
+@pytest.fixture(name="plain_log")
+def fixture_plain_log(tmp_path):
+    """
+    Plain text log file
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(make_log_lines()), encoding="UTF-8")
+    return log_file
+
+
+@pytest.fixture(name="gz_log")
+def fixture_gz_log(tmp_path):
+    """
+    Gzip compressed log file
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630.gz"
+    with gzip.open(log_file, "wt", encoding="UTF-8") as file:
+        file.write("".join(make_log_lines()))
+    return log_file
+
+
+def test_split_file_ranges(plain_log):
+    """
+    Test byte ranges cover the whole file and are aligned to lines
+    :return:
+    """
+    content = plain_log.read_bytes()
+    ranges = split_file_ranges(plain_log, 7)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(content)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert content[start - 1 : start] == b"\n"
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parse_logs_parallel_plain(plain_log, workers):
+    """
+    Test parallel parsing gives the same aggregate as single-process one
+    :return:
+    """
+    expected = create_log_stats(parse_logs(plain_log), 1000)
+    actual = create_log_stats(parse_logs(plain_log, workers), 1000)
+    assert expected == actual
+
+
+def test_parse_logs_parallel_gz(gz_log, plain_log):
+    """
+    Test parallel parsing of gzip log
+    :return:
+    """
+    expected = create_log_stats(parse_logs(plain_log), 1000)
+    assert expected == create_log_stats(parse_logs(gz_log), 1000)
+    assert expected == create_log_stats(parse_logs(gz_log, 3), 1000)
+
+
+def test_parse_logs_approximate_median(plain_log):
+    """
+    Test approximate medians stay within configured accuracy
+    :return:
+    """
+    exact = create_log_stats(parse_logs(plain_log), 1000)
+    approximate = create_log_stats(parse_logs(plain_log, 2, ParseSettings(relative_accuracy=0.01)), 1000)
+    assert [row["url"] for row in exact] == [row["url"] for row in approximate]
+    for exact_row, approximate_row in zip(exact, approximate):
+        assert exact_row["time_sum"] == approximate_row["time_sum"]
+        assert exact_row["count"] == approximate_row["count"]
+        assert float(approximate_row["time_med"]) == pytest.approx(float(exact_row["time_med"]), rel=0.02, abs=0.011)
+
+
+def test_parse_logs_gzip_pipe(gz_log, plain_log):
+    """
+    Test gzip log decompressed by an external decompressor
+    :return:
+    """
+    if find_gzip_pipe("auto") is None:
+        pytest.skip("No external gzip decompressor on PATH")
+    expected = create_log_stats(parse_logs(plain_log), 1000)
+    assert expected == create_log_stats(parse_logs(gz_log, settings=ParseSettings(gzip_pipe="auto")), 1000)
+
+
+def test_iter_log_line_blocks_multi_member(tmp_path):
+    """
+    Test concatenated gzip members are read as one log, lines spanning chunks are glued
+    :return:
+    """
+    lines = make_log_lines(100)
+    log_file = tmp_path / "nginx-access-ui.log-20170630.gz"
+    log_file.write_bytes(gzip.compress("".join(lines[:40]).encode()) + gzip.compress("".join(lines[40:]).encode()))
+    read_lines = [line for block in iter_line_blocks(iter_gzip_chunks(log_file, 100)) for line in block]
+    assert read_lines == [line.rstrip("\n").encode() for line in lines]
+    assert [line for block in iter_log_line_blocks(log_file) for line in block] == read_lines
+
+
+@pytest.mark.parametrize("block_size", [64, 1000, 1 << 20])
+def test_iter_mmap_line_blocks(plain_log, block_size):
+    """
+    Test memory-mapped file is split into the same lines as the file content
+    :return:
+    """
+    content = plain_log.read_bytes()
+    lines = [line for block in iter_mmap_line_blocks(plain_log, block_size=block_size) for line in block]
+    assert lines == content.split(b"\n")[:-1]
+    start, end = split_file_ranges(plain_log, 3)[1]
+    lines = [line for block in iter_mmap_line_blocks(plain_log, start, end, block_size) for line in block]
+    assert lines == content[start:end].split(b"\n")[:-1]
+
+
+def test_parse_logs_without_mmap(plain_log):
+    """
+    Test chunked reading gives the same report as memory-mapped one
+    :return:
+    """
+    expected = create_log_stats(parse_logs(plain_log), 1000)
+    assert expected == create_log_stats(parse_logs(plain_log, settings=ParseSettings(use_mmap=False)), 1000)
+    assert expected == create_log_stats(parse_logs(plain_log, 2, ParseSettings(use_mmap=False)), 1000)
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz"])
+def test_parse_logs_parallel_generated(tmp_path, suffix):
+    """
+    Test parallel parsing of a realistic log gives the same report as single-process one: sums don't depend
+    on how the log is split, ties are in URL order
+    :return:
+    """
+    data = "".join(generate_log_lines(50_000, urls=5000)).encode()
+    log_file = tmp_path / f"nginx-access-ui.log-20170630{suffix}"
+    log_file.write_bytes(gzip.compress(data) if suffix else data)
+    log_data = parse_logs(log_file)
+    expected = create_log_stats(log_data, 1000, engine="python")
+    assert expected == create_log_stats(log_data, 1000, engine="numpy")
+    for settings in (ParseSettings(), ParseSettings(max_memory_mb=0.5, spill_dir=str(tmp_path))):
+        assert create_log_stats(parse_logs(log_file, 3, settings), 1000, engine="python") == expected
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_logs_memory_limit(tmp_path, workers):
+    """
+    Test URL stats spilled to disk above MAX_MEMORY_MB give the same report
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log-20170630"
+    log_file.write_text("".join(generate_log_lines(30_000, urls=3000)), encoding="UTF-8")
+    expected = create_log_stats(parse_logs(log_file, workers), 100)
+    settings = ParseSettings(use_mmap=False, max_memory_mb=0.2, spill_dir=str(tmp_path / "spill"))
+    (tmp_path / "spill").mkdir()
+    log_data = parse_logs(log_file, workers, settings)
+    assert log_data.spilled is not None and len(log_data.spilled.runs) > 1
+    assert create_log_stats(log_data, 100) == expected
+    log_data.spilled.close()
+    assert not list((tmp_path / "spill").iterdir())
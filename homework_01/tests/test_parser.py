@@ -2,7 +2,7 @@
 Tests for log_analyzer.py
 """
 
-from src.log_analyzer import parse_log_line, update_config
+from src.log_analyzer import parse_log_line, parse_log_record, parse_time_bucket, update_config
 
 
 def test_update_config():
@@ -39,3 +39,45 @@ def test_parse_log_line():
     expected_request_time = 0.116
     assert expected_url == url
     assert expected_request_time == request_time
+
+
+def test_parse_log_record():
+    """
+    Test full log line parsing
+    :return:
+    """
+    log_line = (
+        '1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] "GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" '
+        '"Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5" "-" "1498697422-2190034393-4708-9752759" '
+        '"dc7161be3" 0.390\n'
+    )
+
+    record = parse_log_record(log_line)
+    assert record is not None
+    assert record["remote_addr"] == "1.196.116.32"
+    assert record["time_local"] == "29/Jun/2017:03:50:22 +0300"
+    assert record["url"] == "/api/v2/banner/25019354"
+    assert record["status"] == "200"
+    assert record["body_bytes_sent"] == "927"
+    assert record["request_time"] == "0.390"
+    assert parse_log_line(log_line) == ("/api/v2/banner/25019354", 0.39)
+
+
+def test_parse_log_line_malformed():
+    """
+    Test malformed log line is reported as failed
+    :return:
+    """
+    log_line = '1.126.153.80 -  - [29/Jun/2017:03:50:24 +0300] "0" 400 166 "-" "-" "-" "-" "-" 0.001'
+    assert parse_log_line(log_line) == (None, None)
+    assert parse_log_line("garbage") == (None, None)
+
+
+def test_parse_time_bucket():
+    """
+    Test HH:MM of $time_local is converted to a bucket number within the day
+    :return:
+    """
+    assert parse_time_bucket(b"03:50", 5) == (3 * 60 + 50) // 5
+    assert parse_time_bucket(b"03:50", 60) == 3
+    assert parse_time_bucket(b"", 5) is None
@@ -0,0 +1,64 @@
+"""
+Tests for staged reading of log files
+"""
+
+import gzip
+import itertools
+
+import pytest
+
+from src.log_analyzer import ParseSettings, create_log_stats, parse_logs
+from src.pipeline import Pipeline
+from tests.test_parse_logs import make_log_lines
+
+
+def test_pipeline_stages():
+    """
+    Test items pass through chained stages in order and every stage gets stats
+    :return:
+    """
+    with Pipeline(depth=2) as pipeline:
+        numbers = pipeline.stage("read", range(1000))
+        squares = pipeline.stage("square", (number * number for number in numbers))
+        assert list(squares) == [number * number for number in range(1000)]
+        assert list(squares) == []
+    stats = pipeline.stats()
+    assert list(stats) == ["read", "square", "parse"]
+    assert all(0 <= stage["utilization"] <= 1 for stage in stats.values())
+
+
+def test_pipeline_failure_and_close():
+    """
+    Test exception of a stage is raised in the consumer, and an endless stage is stopped on close
+    :return:
+    """
+
+    def broken():
+        yield 1
+        raise ValueError("broken")
+
+    with Pipeline() as pipeline:
+        stage = pipeline.stage("broken", broken())
+        assert next(stage) == 1
+        with pytest.raises(ValueError, match="broken"):
+            next(stage)
+
+    with Pipeline(depth=1) as pipeline:
+        endless = pipeline.stage("endless", itertools.count())
+        assert next(endless) == 0
+    assert not any(stage._thread.is_alive() for stage in pipeline.stages)  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize("suffix,workers,use_mmap", [(".gz", 1, True), (".gz", 2, True), ("", 1, False)])
+def test_parse_logs_pipeline(tmp_path, suffix, workers, use_mmap):
+    """
+    Test parsing with and without pipeline gives the same aggregate
+    :return:
+    """
+    data = "".join(make_log_lines(3000)).encode()
+    log_file = tmp_path / f"nginx-access-ui.log-20170630{suffix}"
+    log_file.write_bytes(gzip.compress(data) if suffix else data)
+    staged = parse_logs(log_file, workers, ParseSettings(use_mmap=use_mmap, pipeline=True))
+    plain = parse_logs(log_file, workers, ParseSettings(use_mmap=use_mmap))
+    assert staged.lines_count == plain.lines_count == 3000
+    assert create_log_stats(staged, 100) == create_log_stats(plain, 100)
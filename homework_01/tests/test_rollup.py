@@ -0,0 +1,76 @@
+"""
+Tests for multi-day reports from saved day aggregates
+"""
+
+import datetime
+import gzip
+
+from src.aggregation import LogAggregator
+from src.log_analyzer import (
+    config,
+    create_log_stats,
+    load_day_aggregate,
+    parse_date_range,
+    parse_logs,
+    run_range,
+    save_day_aggregate,
+)
+from tests.test_parse_logs import make_log_lines
+
+
+def test_parse_date_range():
+    """
+    Test range argument parsing
+    :return:
+    """
+    assert parse_date_range("2026.10.01:2026.10.14") == (datetime.date(2026, 10, 1), datetime.date(2026, 10, 14))
+
+
+def test_run_range(tmp_path):
+    """
+    Test range report merges saved aggregates and parses only days without one
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    lines = make_log_lines(300)
+    (log_dir / "nginx-access-ui.log-20261001").write_text("".join(lines[:100]), encoding="UTF-8")
+    with gzip.open(log_dir / "nginx-access-ui.log-20261002.gz", "wt", encoding="UTF-8") as file:
+        file.write("".join(lines[100:200]))
+    # the day was parsed before and its log is gone
+    day_log = tmp_path / "day.log"
+    day_log.write_text("".join(lines[200:]), encoding="UTF-8")
+    save_day_aggregate(report_dir, "2026.10.03", parse_logs(day_log), 0.01)
+
+    updated_config = dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir))
+    run_range(updated_config, parse_date_range("2026.10.01:2026.10.04"))
+
+    assert (report_dir / "report-2026.10.01-2026.10.04.html").exists()
+    aggregator = LogAggregator(0.01)
+    for log_date in ("2026.10.01", "2026.10.02", "2026.10.03"):
+        day_aggregator = load_day_aggregate(report_dir, log_date)
+        assert day_aggregator is not None
+        # request times are not saved even with exact medians
+        assert day_aggregator.relative_accuracy == 0.01
+        aggregator.merge(day_aggregator)
+    day_log.write_text("".join(lines), encoding="UTF-8")
+    assert create_log_stats(aggregator, 100) == create_log_stats(parse_logs(day_log).to_sketch(0.01), 100)
+
+
+def test_run_range_url_settings(tmp_path):
+    """
+    Test saved day aggregate built with other URL normalization is not merged but parsed again
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    (log_dir / "nginx-access-ui.log-20261001").write_text("".join(make_log_lines(100)), encoding="UTF-8")
+    updated_config = dict(config, LOG_DIR=str(log_dir), REPORT_DIR=str(report_dir))
+    run_range(updated_config, parse_date_range("2026.10.01:2026.10.01"))
+    assert len(load_day_aggregate(report_dir, "2026.10.01")) == 37
+
+    normalized_config = dict(updated_config, URL_NORMALIZATION={"REPLACE_IDS": True})
+    run_range(normalized_config, parse_date_range("2026.10.01:2026.10.01"))
+    day_aggregator = load_day_aggregate(report_dir, "2026.10.01")
+    assert day_aggregator.url_settings
+    assert list(day_aggregator.urls) == [b"/api/v2/banner/{id}"]
@@ -0,0 +1,296 @@
+"""
+Tests for report statistics in log_analyzer.py
+"""
+
+import json
+import shutil
+import subprocess
+from random import Random
+from statistics import mean, median
+
+import pytest
+
+from src.aggregation import LogAggregator
+from src.log_analyzer import create_log_stats, generate_report, parse_byte_lines, save_time_series
+from src.vectorized import grouped_stats, round_array, top_order
+
+
+def test_create_log_stats_top_k():
+    """
+    Test only the slowest URLs are reported, ties are ordered by URL
+    :return:
+    """
+    aggregator = LogAggregator()
+    for url, request_time in [("/a", 1.0), ("/b", 3.0), ("/c", 1.0), ("/d", 2.0), ("/b", 0.5), ("/e", 1.0)]:
+        aggregator.add(url, request_time)
+
+    log_stats = create_log_stats(aggregator, 4)
+    assert [row["url"] for row in log_stats] == ["/b", "/d", "/a", "/c"]
+    assert log_stats[0] == {
+        "count": 2,
+        "time_avg": 1.75,
+        "time_max": 3.0,
+        "time_sum": 3.5,
+        "url": "/b",
+        "time_med": 1.75,
+        "time_perc": 41.176,
+        "count_perc": 33.333,
+    }
+    assert create_log_stats(aggregator, 0) == []
+    assert create_log_stats(LogAggregator(), 10) == []
+
+
+def test_create_log_stats_percentiles():
+    """
+    Test percentile and histogram columns are reported when histograms are collected
+    :return:
+    """
+    aggregator = LogAggregator(histogram=True)
+    for i in range(1, 101):
+        aggregator.add("/api", i / 100)
+
+    (row,) = create_log_stats(aggregator, 10, [50, 99.9])
+    assert row["time_p50"] == pytest.approx(0.5, rel=0.1)
+    assert row["time_p99.9"] == pytest.approx(1.0, rel=0.1)
+    assert sum(row["time_hist"]) == 100
+    assert "time_hist" not in create_log_stats(LogAggregator(), 10)
+
+
+@pytest.mark.parametrize("relative_accuracy", [None, 0.01])
+def test_create_log_stats_engines(relative_accuracy):
+    """
+    Test vectorized stats are identical to the ones computed per URL, including rounding of ties
+    :return:
+    """
+    pytest.importorskip("numpy")
+    random = Random(17)
+    aggregator = LogAggregator(relative_accuracy)
+    for _ in range(20000):
+        aggregator.add(f"/api/{random.randrange(3000)}".encode(), random.randrange(5000) / 1000)
+    aggregator.add("/ünicode".encode(), 0.0005)
+    aggregator.add(b"/broken\xff", 2.675)
+
+    for report_size in (0, 10, 5000):
+        expected = create_log_stats(aggregator, report_size, engine="python")
+        assert create_log_stats(aggregator, report_size, engine="numpy") == expected
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_create_log_stats_exact_mean(engine):
+    """
+    Test average request time with exact medians is rounded from statistics.mean, as before the aggregator
+    :return:
+    """
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    random = Random(5)
+    aggregator = LogAggregator()
+    # fsum of these times divided by their count is 0.9005000000000001, the exact mean is 0.9005
+    for request_time in (2.971, 0.165, 0.346, 0.544, 0.695, 0.682):
+        aggregator.add(b"/tie", request_time)
+    for _ in range(20000):
+        aggregator.add(f"/api/{random.randrange(500)}".encode(), random.randrange(3000) / 1000)
+
+    log_stats = create_log_stats(aggregator, 1000, engine=engine)
+    assert {row["url"]: row["time_avg"] for row in log_stats}["/tie"] == 0.9
+    for row in log_stats:
+        assert row["time_avg"] == round(mean(aggregator.urls[row["url"].encode()].times), 3)
+
+
+def test_top_order_ties():
+    """
+    Test URLs tied at the report boundary are selected in URL order, as get_top_urls does
+    :return:
+    """
+    np = pytest.importorskip("numpy")
+    urls = [f"/url{i}".encode() for i in (5, 3, 9, 1, 7, 0, 8, 2, 6, 4)]
+    time_sums = np.array([1.0, 2.0, 1.0, 1.0, 3.0, 1.0, 1.0, 0.5, 1.0, 1.0])
+    assert [urls[i] for i in top_order(time_sums, urls, 4)] == [b"/url7", b"/url3", b"/url0", b"/url1"]
+    assert top_order(time_sums, urls, 10) == top_order(time_sums, urls, 100)
+    assert top_order(time_sums, urls, 0) == []
+
+    times = [[0.3, 0.1, 0.2], [1.5], [0.4, 0.2, 0.9, 0.1]]
+    counts, maxes, medians = grouped_stats(times)
+    assert counts.tolist() == [3, 1, 4]
+    assert maxes.tolist() == [0.3, 1.5, 0.9]
+    assert medians.tolist() == [median(value) for value in times]
+
+
+def test_round_array():
+    """
+    Test vectorized rounding gives the same floats as round()
+    :return:
+    """
+    np = pytest.importorskip("numpy")
+    random = Random(3)
+    values = [random.uniform(-10, 10) for _ in range(10000)]
+    values += [i / 2000 for i in range(-2000, 2000)] + [2.675, 1.0005, 1e300, -0.0001, float("inf")]
+    assert round_array(np.array(values)) == [round(value, 3) for value in values]
+
+
+def test_time_trend(tmp_path):
+    """
+    Test average request time per time bucket is reported and saved as time series
+    :return:
+    """
+    line = '1.1.1.1 -  - [29/Jun/2017:{time} +0300] "GET /api HTTP/1.1" 200 927 "-" "-" "-" "-" "-" {request_time}'
+    lines = [
+        line.format(time="00:01:00", request_time="0.100").encode(),
+        line.format(time="00:04:59", request_time="0.300").encode(),
+        line.format(time="23:59:59", request_time="1.000").encode(),
+    ]
+    aggregator = parse_byte_lines(lines, LogAggregator(time_bucket=5))
+
+    (row,) = create_log_stats(aggregator, 10)
+    assert len(row["time_trend"]) == 288
+    assert row["time_trend"][0] == 0.2
+    assert row["time_trend"][287] == 1.0
+    assert sum(row["time_trend"]) == 1.2
+
+    save_time_series(tmp_path, "2017.06.29", aggregator, 10)
+    time_series = json.loads((tmp_path / "report-2017.06.29.timeseries.json").read_text(encoding="UTF-8"))
+    assert time_series == {
+        "time_bucket": 5,
+        "urls": {"/api": {"bucket": [0, 287], "count": [2, 1], "time_sum": [0.4, 1.0]}},
+    }
+
+
+def read_report_table(report_file) -> object:
+    """
+    Extract JSON table embedded into report
+    :param report_file: Path to report
+    :return: Parsed table
+    """
+    content = report_file.read_text(encoding="UTF-8")
+    assert "$table_json" not in content
+    start = content.index("var table = toRows(") + len("var table = toRows(")
+    end = content.index(");", start)
+    return json.loads(content[start:end])
+
+
+@pytest.mark.parametrize("report_format", ["rows", "columnar"])
+def test_generate_report(tmp_path, report_format):
+    """
+    Test stats are embedded into report as JSON with numbers as numbers
+    :return:
+    """
+    aggregator = LogAggregator()
+    for url, request_time in [("/a?x=</script>", 1.0), ("/b", 3.0), ("/a?x=</script>", 0.5)]:
+        aggregator.add(url, request_time)
+    log_stats = create_log_stats(aggregator, 10)
+
+    generate_report(tmp_path, "2017.06.30", log_stats, report_format)
+    report_file = tmp_path / "report-2017.06.30.html"
+    assert '</script>"' not in report_file.read_text(encoding="UTF-8")
+    table = read_report_table(report_file)
+    if report_format == "columnar":
+        assert table["columns"] == list(log_stats[0])
+        table = [dict(zip(table["columns"], values)) for values in zip(*table["data"].values())]
+    assert table == log_stats
+
+
+def test_generate_paged_report(tmp_path):
+    """
+    Test paged report embeds only table description, rows are split into page scripts
+    :return:
+    """
+    aggregator = LogAggregator()
+    for i in range(5):
+        aggregator.add(f"/url{i}", float(i))
+    log_stats = create_log_stats(aggregator, 10)
+
+    (tmp_path / "report-2017.06.30.pages").mkdir()
+    (tmp_path / "report-2017.06.30.pages" / "page-00009.js").write_text("stale")
+    generate_report(tmp_path, "2017.06.30", log_stats, "paged", page_size=2)
+    content = (tmp_path / "report-2017.06.30.html").read_text(encoding="UTF-8")
+    start = content.index("var report = ") + len("var report = ")
+    report = json.loads(content[start : content.index(";\n", start)])
+    assert report["total"] == 5
+    assert report["pages"] == [f"report-2017.06.30.pages/page-0000{i}.js" for i in range(3)]
+    assert sorted(path.name for path in (tmp_path / "report-2017.06.30.pages").iterdir()) == [
+        "page-00000.js",
+        "page-00001.js",
+        "page-00002.js",
+    ]
+
+    rows = []
+    for number, page in enumerate(report["pages"]):
+        script = (tmp_path / page).read_text(encoding="UTF-8")
+        assert script.startswith(f"reportPage({number},")
+        rows.extend(json.loads(script[len(f"reportPage({number},") : -len(");\n")]))
+    assert [dict(zip(report["columns"], row)) for row in rows] == log_stats
+
+
+# runs the script of a paged report with a minimal DOM: page scripts are loaded asynchronously in reverse order,
+# a click on the header cell of a column sorts by it, then the first rendered row is printed
+PAGED_REPORT_HARNESS = r"""
+const fs = require("fs"), path = require("path"), vm = require("vm");
+const [reportFile, column] = process.argv.slice(1);
+let delay = 100;
+function element(tag) {
+  return {
+    tag, children: [], style: {}, _text: "",
+    appendChild(child) {
+      this.children.push(child);
+      if (child.tag == "script") {
+        setTimeout(() => vm.runInContext(fs.readFileSync(path.join(path.dirname(reportFile), child.src), "utf8"), sandbox),
+                   delay--);
+      }
+      return child;
+    },
+    get textContent() { return this._text; },
+    set textContent(value) { this._text = value; if (value === "") this.children = []; },
+  };
+}
+const nodes = {
+  ".report-viewport": Object.assign(element("div"), {scrollTop: 0, clientHeight: 330, addEventListener() {}}),
+  ".report-table-header-row": element("tr"),
+  ".report-table-body": element("tbody"),
+};
+const sandbox = {
+  document: {
+    querySelector: (selector) => nodes[selector],
+    createElement: element,
+    createDocumentFragment: () => element("fragment"),
+    body: element("body"),
+  },
+  requestAnimationFrame: (callback) => setTimeout(callback, 0),
+  addEventListener() {},
+};
+sandbox.window = sandbox;
+vm.createContext(sandbox);
+const html = fs.readFileSync(reportFile, "utf8");
+vm.runInContext(html.slice(html.indexOf("!function() {"), html.lastIndexOf("}()") + 3), sandbox);
+const header = nodes[".report-table-header-row"].children;
+header.find((cell) => cell.textContent == column).onclick();
+setTimeout(() => {
+  const rows = nodes[".report-table-body"].children[0].children.filter((row) => row.className == "report-table-body-row");
+  const cells = rows[0].children.map((cell) => cell.children.length ? cell.children[0].textContent : cell.textContent);
+  console.log(JSON.stringify(header.map((cell, i) => [cell.textContent, cells[i]])));
+}, 500);
+"""
+
+
+def test_paged_report_sort(tmp_path):
+    """
+    Test sorting of a paged report waits for every page, pages arriving in any order
+    :return:
+    """
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("No node on PATH")
+    aggregator = LogAggregator()
+    for i in range(60):
+        for _ in range(i + 1):
+            aggregator.add(f"/url{i}", (60 - i) / (i + 1))
+    generate_report(tmp_path, "2017.06.30", create_log_stats(aggregator, 100), "paged", page_size=2)
+    result = subprocess.run(
+        [node, "-e", PAGED_REPORT_HARNESS, str(tmp_path / "report-2017.06.30.html"), "count"],
+        capture_output=True,
+        check=True,
+        text=True,
+        timeout=30,
+    )
+    first_row = dict(json.loads(result.stdout))
+    assert first_row["count"] == 60
+    assert first_row["url"] == "/url59"
@@ -0,0 +1,148 @@
+"""
+Tests for following the live log in watch mode
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import src.log_analyzer
+from src.checkpoint import load_checkpoint
+from src.follow import LogFollower, PollingWatcher, create_watcher
+from src.log_analyzer import config, run_watch
+from src.memory import MemoryProfile
+from src.metrics import RunMetrics
+from tests.test_parse_logs import make_log_lines
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    """
+    Wait until condition is true
+    :param condition: Callable without arguments
+    :param timeout: Max time to wait in seconds
+    :return: Last condition value
+    """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_log_follower(tmp_path):
+    """
+    Test follower reads only complete lines and notices rotation
+    :return:
+    """
+    log_file = tmp_path / "nginx-access-ui.log"
+    log_file.write_bytes(b"line 1\nline 2\nline")
+    follower = LogFollower(log_file, chunk_size=4)
+    assert [line for block in follower.read_line_blocks() for line in block] == [b"line 1", b"line 2"]
+    assert follower.offset == len(b"line 1\nline 2\n")
+    with open(log_file, "ab") as file:
+        file.write(b" 3\n")
+    assert [line for block in follower.read_line_blocks() for line in block] == [b"line 3"]
+    assert not follower.rotated()
+
+    os.rename(log_file, tmp_path / "nginx-access-ui.log-20261018")
+    assert follower.rotated()
+    log_file.write_bytes(b"new\n")
+    assert follower.rotated()
+    follower.close()
+
+
+def test_watcher_wakes_up_on_write(tmp_path):
+    """
+    Test inotify watcher (or polling fallback) returns when the log is written
+    :return:
+    """
+    watcher = create_watcher(tmp_path, poll_interval=5.0)
+    (tmp_path / "nginx-access-ui.log").write_bytes(b"line\n")
+    start = time.monotonic()
+    if isinstance(watcher, PollingWatcher):
+        assert not watcher.wait(0.01)
+    else:
+        assert watcher.wait(5.0)
+        assert time.monotonic() - start < 5.0
+    watcher.close()
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_run_watch(tmp_path, use_inotify):
+    """
+    Test daemon parses appended lines, finalizes rotated log and follows the new one
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    log_file = log_dir / "nginx-access-ui.log"
+    lines = make_log_lines(20)
+    log_file.write_text("".join(lines[:10]), encoding="UTF-8")
+    updated_config = dict(
+        config,
+        LOG_DIR=str(log_dir),
+        REPORT_DIR=str(report_dir),
+        WATCH_REPORT_INTERVAL=0.05,
+        WATCH_POLL_INTERVAL=0.01,
+        WATCH_INOTIFY=use_inotify,
+    )
+    checkpoint_file = report_dir / ".incremental-checkpoint"
+    stop, metrics = threading.Event(), RunMetrics("watch")
+    daemon = threading.Thread(target=run_watch, args=(updated_config, metrics, stop))
+    daemon.start()
+    try:
+        assert wait_for(lambda: getattr(load_checkpoint(checkpoint_file), "offset", 0) == log_file.stat().st_size)
+
+        with open(log_file, "a", encoding="UTF-8") as file:
+            file.write("".join(lines[10:15]))
+        os.rename(log_file, log_dir / "nginx-access-ui.log-20261018")
+        log_file.write_text("".join(lines[15:]), encoding="UTF-8")
+        new_inode = log_file.stat().st_ino
+        assert wait_for(
+            lambda: getattr(load_checkpoint(checkpoint_file), "inode", None) == new_inode
+            and load_checkpoint(checkpoint_file).aggregator.lines_count == 5  # type: ignore[union-attr]
+        )
+    finally:
+        stop.set()
+        daemon.join(10)
+    assert not daemon.is_alive()
+    # lines appended right before the rotation are parsed from the rotated file
+    assert metrics.lines_read == 20
+    assert list(report_dir.glob("report-*.html"))
+
+
+def test_run_watch_memory_profile(tmp_path, monkeypatch):
+    """
+    Test every memory profile written with a watch report breaks down the aggregate
+    :return:
+    """
+    log_dir, report_dir = tmp_path / "log", tmp_path / "reports"
+    log_dir.mkdir()
+    (log_dir / "nginx-access-ui.log").write_text("".join(make_log_lines(20)), encoding="UTF-8")
+    updated_config = dict(
+        config,
+        LOG_DIR=str(log_dir),
+        REPORT_DIR=str(report_dir),
+        WATCH_REPORT_INTERVAL=0.05,
+        WATCH_POLL_INTERVAL=0.01,
+        WATCH_INOTIFY=False,
+    )
+    profiles = []
+    monkeypatch.setattr(
+        src.log_analyzer, "emit_run_metrics", lambda _, metrics: profiles.append(metrics.memory_profile.summary())
+    )
+    stop, metrics = threading.Event(), RunMetrics("watch")
+    metrics.memory_profile = MemoryProfile(top=3)
+    daemon = threading.Thread(target=run_watch, args=(updated_config, metrics, stop))
+    daemon.start()
+    try:
+        assert wait_for(lambda: len(profiles) >= 2)
+    finally:
+        stop.set()
+        daemon.join(10)
+        metrics.memory_profile.stop()
+    assert not daemon.is_alive()
+    for profile in profiles:
+        assert profile["aggregate_bytes"]
+        assert profile["aggregate_estimated_bytes"] > 0